@@ -0,0 +1,58 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark for the event graph DAG: times graph construction and the
+parent queries used when post-processing event graphs, for random DAGs of
+increasing size (average out-degree 2, edges only to nearby later nodes, like
+the get/put chains in an event log).
+"""
+
+import os, sys, time, random, resource
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cncframework.events.dag import DAG
+
+def build(n, window=100):
+    g = DAG()
+    g.add_node(0)
+    for i in xrange(1, n):
+        g.add_node_with_parents(i, [random.randint(max(0, i-window), i-1) for _ in (0, 1)])
+    return g
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return time.time() - start, result
+
+def main():
+    arg_parser = ArgumentParser(description="Time DAG operations on graphs of 10^MIN to 10^MAX nodes.")
+    arg_parser.add_argument('--min', type=int, default=3, help="smallest graph size exponent (default: %(default)s)")
+    arg_parser.add_argument('--max', type=int, default=7, help="largest graph size exponent (default: %(default)s)")
+    arg_parser.add_argument('--queries', type=int, default=1000, help="number of nodes to query/remove (default: %(default)s)")
+    args = arg_parser.parse_args()
+    random.seed(42)
+
+    print "%9s %9s %12s %12s %12s %12s %9s" % ("nodes", "build(s)", "parents(us)",
+            "in_degree(s)", "remove(us)", "rev_bfs(s)", "rss(MB)")
+    for exp in range(args.min, args.max + 1):
+        n = 10 ** exp
+        t_build, g = timed(lambda: build(n))
+        sample = random.sample(xrange(1, n), min(args.queries, n - 1))
+        # parent queries on a sample of nodes (per query)
+        t_parents, _ = timed(lambda: [g.parents(i) for i in sample])
+        # in-degree of every node (what a Kahn-style traversal needs)
+        t_indeg, _ = timed(lambda: [g.in_degree(i) for i in g])
+        # reverse search from the last node, as in EventGraph.post_process
+        t_bfs, _ = timed(lambda: g.bfs(n - 1, reverse=True))
+        # node removal (per removal)
+        t_remove, _ = timed(lambda: [g.remove_node(i) for i in sample])
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss >> 10
+        print "%9d %9.2f %12.1f %12.3f %12.1f %12.3f %9d" % (n, t_build,
+                1e6 * t_parents / len(sample), t_indeg,
+                1e6 * t_remove / len(sample), t_bfs, rss)
+        sys.stdout.flush()
+        g = None # free the graph before building the next one
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import os, sys, hashlib, tempfile, zlib
+import cPickle as pickle
+
+from jinja2 import FileSystemBytecodeCache
+
+
+##################################################
+# CACHE LOCATION AND KEYS
+
+def defaultCacheDir():
+    """Cache root used by the translator tools.
+       Can be overridden by setting UCNC_CACHE_DIR."""
+    cacheDir = os.environ.get("UCNC_CACHE_DIR")
+    if not cacheDir:
+        xdgCache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        cacheDir = os.path.join(xdgCache, "ucnc_t")
+    return cacheDir
+
+def contentDigest(*parts):
+    """SHA-1 digest over a sequence of strings. Each part is
+       length-prefixed so that the boundaries between parts matter."""
+    h = hashlib.sha1()
+    for p in parts:
+        h.update("{0}:".format(len(p)))
+        h.update(p)
+    return h.hexdigest()
+
+def fileDigest(*paths):
+    """Digest over the contents of the given files (in order)."""
+    def readAll(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    return contentDigest(*map(readAll, paths))
+
+def moduleDigest(*modules):
+    """Digest over the source of the given Python modules. Used to invalidate
+       cached objects when the code defining them changes."""
+    def sourcePath(m):
+        path = m.__file__
+        return path[:-1] if path.endswith((".pyc", ".pyo")) else path
+    return fileDigest(*map(sourcePath, modules))
+
+def writeAtomic(path, data):
+    """Write data to path via a temp file and rename, so that concurrent
+       readers never see a partially-written file."""
+    dirName = os.path.dirname(path)
+    if not os.path.isdir(dirName):
+        os.makedirs(dirName)
+    fd, tmpPath = tempfile.mkstemp(dir=dirName, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmpPath, path)
+    except:
+        # don't leave the temp file behind in the cache
+        try:
+            os.unlink(tmpPath)
+        except OSError:
+            pass
+        raise
+
+
+##################################################
+# PERSISTENT OBJECT CACHE
+
+class ObjectCache(object):
+    """Size-capped on-disk cache of pickled (and compressed) Python objects.
+       Entries are evicted least-recently-used first once the total size of
+       the cache directory exceeds maxBytes."""
+
+    suffix = ".pickle.z"
+
+    def __init__(self, cacheDir, maxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+
+    def entryPath(self, key):
+        return os.path.join(self.cacheDir, key + self.suffix)
+
+    def load(self, key):
+        """Return the object stored under key, or None on a cache miss."""
+        path = self.entryPath(key)
+        try:
+            with open(path, 'rb') as f:
+                obj = pickle.loads(zlib.decompress(f.read()))
+        except Exception:
+            # missing, truncated or stale entries are all just misses
+            return None
+        # mark as recently used for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return obj
+
+    def store(self, key, obj):
+        """Store obj under key. Failing to write the cache is not an error."""
+        data = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+        if len(data) > self.maxBytes:
+            return
+        try:
+            writeAtomic(self.entryPath(key), data)
+        except (IOError, OSError) as e:
+            print >>sys.stderr, "WARNING! Could not write cache entry:", e
+            return
+        self.evict()
+
+    def entries(self):
+        """List (mtime, size, path) for all entries in the cache."""
+        result = []
+        try:
+            names = os.listdir(self.cacheDir)
+        except OSError:
+            return result
+        for name in names:
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.cacheDir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue # evicted by someone else
+            result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache fits in maxBytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+##################################################
+# COMPILED TEMPLATE CACHE
+
+class TemplateCache(FileSystemBytecodeCache):
+    """On-disk cache of compiled Jinja template bytecode.
+       Jinja checks each entry against a checksum of the template source,
+       so entries for edited templates are simply recompiled and replaced.
+       Unlike the stock FileSystemBytecodeCache, entries are written atomically
+       (several translators may share the cache), and unreadable entries or
+       an unwritable cache directory just fall back to compiling."""
+
+    def __init__(self, cacheDir):
+        FileSystemBytecodeCache.__init__(self, cacheDir, "%s.jinja")
+
+    def load_bytecode(self, bucket):
+        try:
+            FileSystemBytecodeCache.load_bytecode(self, bucket)
+        except Exception:
+            bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        try:
+            writeAtomic(self._get_cache_filename(bucket), bucket.bytecode_to_string())
+        except (IOError, OSError) as e:
+            print >>sys.stderr, "WARNING! Could not write cache entry:", e
@@ -0,0 +1,136 @@
+import math
+from collections import defaultdict
+from counter import Counter
+from cncframework.events.dag import DAG
+from cncframework.events.logs import EventReader
+from cncframework.events.binlog import BinaryLog
+from cncframework.events.stalls import parse_tag
+import cncframework.events.styles as styles
+import cncframework.events.actions as actions
+
+def bucket_function(expr):
+    """
+    Compile a bucket key expression into a function of (collection, tag),
+    for AggregateGraph. The expression can use c (the collection name) and
+    t (the tag, as a tuple of ints), e.g. "t[0] // 16" for blocks of rows.
+    Raises ValueError if the expression doesn't compile, and the function
+    raises ValueError if it fails for a tag (e.g. one that isn't all ints,
+    which is kept as a string).
+    """
+    try:
+        fn = eval("lambda c, t: (%s)" % expr, {})
+    except SyntaxError as e:
+        raise ValueError("Invalid bucket expression {0!r}: {1}".format(expr, e.msg))
+    def bucket(c, t):
+        try:
+            return fn(c, t)
+        except Exception as e:
+            raise ValueError("Bucket expression {0!r} failed for {1} @ {2!r}: {3}".format(
+                    expr, c, t, e))
+    return bucket
+
+
+class AggregateGraph(DAG):
+    '''
+    Collection-level graph of a CnC event log: one node per step or item
+    collection, with the number of instances (and the total running time of
+    the steps, for logs with times), and one edge per kind of dependence,
+    with the number of instance edges it stands for.
+
+    With a bucket function (collection, tag) -> key, the instances of each
+    collection are split into a node per key instead (e.g. per tile row), to
+    show more of the shape of the run. Instances whose key is None go in
+    the collection's node.
+
+    The graph is built in one pass over the log, and its size only depends
+    on the number of collections (and buckets), so it works for logs that
+    are far too big for an EventGraph. As in EventGraph, the events of each
+    worker are assumed to be serialized.
+    '''
+    def __init__(self, event_log, prescribe=True, bucket=None):
+        super(AggregateGraph, self).__init__()
+        self.prescribe = prescribe
+        self.bucket = bucket
+        # (kind, collection, bucket) -> node id, and the reverse
+        self._ids = {}
+        self.keys = {0: ("step", "init", None)}
+        # node id -> number of instances
+        self.counts = Counter()
+        # node id -> total running time of its steps
+        self.times = Counter()
+        # (node id, node id) -> number of instance edges
+        self.edge_counts = Counter()
+        # worker -> node of the step it's running (init to start with)
+        self._running = defaultdict(int)
+        # worker -> item nodes of the GET-DEPs for the next step it prescribes
+        self._gets = defaultdict(list)
+        # (label, tag) -> (node id, time) of running steps, for logs with times
+        self._started = {}
+        self.add_node(0)
+        self.set_property(0, "label", "init")
+        self.set_property(0, "color", styles.color('step'))
+        self.counts[0] = 1
+        if not isinstance(event_log, (EventReader, BinaryLog)):
+            event_log = EventReader(event_log)
+        for action, label, tag, time, worker in event_log:
+            self.add_event(action, label, tag, worker, time)
+        self.post_process()
+
+    def node_id(self, kind, label, tag):
+        """Return the node for an instance (kind is "step" or "item")."""
+        key = self.bucket(label, parse_tag(tag)) if self.bucket else None
+        ident = (kind, label, key)
+        node = self._ids.get(ident)
+        if node is None:
+            node = self._ids[ident] = len(self._ids) + 1
+            self.keys[node] = ident
+            self.add_node(node)
+            if kind == "item":
+                self.set_property(node, "shape", styles.shape('item'))
+                self.set_property(node, "color", styles.color('item', label))
+            else:
+                self.set_property(node, "color", styles.color('step'))
+        return node
+
+    def add_event(self, action, label, tag, worker=None, time=None):
+        """Add a parsed event to the graph (see EventGraph.add_event)."""
+        if action == actions.PRESCRIBED:
+            node = self.node_id("step", label, tag)
+            for item in self._gets.pop(worker, ()):
+                self.edge_counts[(item, node)] += 1
+            if self.prescribe:
+                self.edge_counts[(self._running[worker], node)] += 1
+        elif action == actions.RUNNING:
+            node = self.node_id("step", label, tag)
+            self.counts[node] += 1
+            self._running[worker] = node
+            if time is not None:
+                self._started[(label, tag)] = (node, time)
+        elif action == actions.DONE:
+            started = self._started.pop((label, tag), None)
+            if started is not None:
+                self.times[started[0]] += time - started[1]
+        elif action == actions.GET_DEP:
+            self._gets[worker].append(self.node_id("item", label, tag))
+        elif action == actions.PUT:
+            node = self.node_id("item", label, tag)
+            self.counts[node] += 1
+            self.edge_counts[(self._running[worker], node)] += 1
+
+    def post_process(self):
+        """Add the edges, and label the nodes and edges with their counts."""
+        for (fr, to), count in self.edge_counts.iteritems():
+            self.add_child(fr, to)
+            self.set_edge_property(fr, to, "label", count)
+            self.set_edge_property(fr, to, "penwidth", "%.1f" % (1 + math.log10(count)))
+            if self.keys[fr][0] == self.keys[to][0] == "step":
+                self.set_edge_property(fr, to, "style", styles.style("prescribe"))
+        for node in self:
+            if node == 0:
+                continue
+            kind, label, key = self.keys[node]
+            lines = [label if key is None else "%s [%s]" % (label, key)]
+            lines.append("%d %ss" % (self.counts[node], "put" if kind == "item" else "step"))
+            if node in self.times:
+                lines.append("%.1f us" % (self.times[node] / 1000.0))
+            self.set_property(node, "label", "\\n".join(lines))
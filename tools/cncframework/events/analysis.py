@@ -0,0 +1,212 @@
+from array import array
+from cncframework.events.compact import CompactDAG
+
+class LevelAnalysis(object):
+    """
+    Level-synchronous (Kahn-style) analysis of an event DAG.
+
+    The graph is processed one topological level at a time: level 0 holds
+    the nodes without parents, and each node is in the level after its
+    deepest parent. So the number of levels is the length of the longest
+    path (in nodes), and the size of each level is how many nodes could run
+    in parallel at that point (the parallelism profile).
+
+    Works on the CSR arrays of a CompactDAG (other DAGs are frozen first),
+    without recursion, so very deep graphs (e.g. wavefronts) are fine.
+    """
+    def __init__(self, dag):
+        if not isinstance(dag, CompactDAG):
+            dag = dag.freeze()
+        self.dag = dag
+        n = len(dag)
+        child_offsets, children = dag.csr()
+        parent_offsets, _ = dag.csr(reverse=True)
+        # remaining in-degree of each row
+        pending = array('i', [0]) * n
+        for row in xrange(n):
+            pending[row] = parent_offsets[row+1] - parent_offsets[row]
+        # rows in level order, and where each level starts in that order
+        self.order = array('i')
+        self.level_offsets = array('i', [0])
+        # level of each row
+        self.levels = array('i', [0]) * n
+        frontier = [row for row in xrange(n) if pending[row] == 0]
+        depth = 0
+        while frontier:
+            self.order.extend(frontier)
+            self.level_offsets.append(len(self.order))
+            next_frontier = []
+            for row in frontier:
+                self.levels[row] = depth
+                for k in xrange(child_offsets[row], child_offsets[row+1]):
+                    child = children[k]
+                    pending[child] -= 1
+                    if pending[child] == 0:
+                        next_frontier.append(child)
+            frontier = next_frontier
+            depth += 1
+        if len(self.order) != n:
+            raise ValueError("Graph has a cycle ({0} nodes not reachable in "
+                    "topological order)".format(n - len(self.order)))
+
+    @property
+    def depth(self):
+        """Number of levels (i.e. nodes on the longest path)."""
+        return len(self.level_offsets) - 1
+
+    def level(self, node):
+        """Return the level of a node."""
+        return self.levels[self.dag.row(node)]
+
+    def level_nodes(self, level):
+        """Return the list of nodes in a level."""
+        rows = self.order[self.level_offsets[level]:self.level_offsets[level+1]]
+        return [self.dag.node(row) for row in rows]
+
+    def topsort(self):
+        """Return a list of all the nodes in (level-by-level) topological order."""
+        return [self.dag.node(row) for row in self.order]
+
+    def profile(self):
+        """Return the parallelism profile: the number of nodes in each level."""
+        offsets = self.level_offsets
+        return [offsets[i+1] - offsets[i] for i in xrange(self.depth)]
+
+    def average_parallelism(self):
+        """Return the average number of nodes per level."""
+        return len(self.dag) / float(self.depth) if self.depth else 0.0
+
+    def longest_path(self, weight=None):
+        """
+        Return (length, [nodes]) for a longest path through the graph.
+
+        Each node counts as 1 by default, or weight(node) if a weight function
+        is given (e.g. step durations), making it the critical path length.
+        """
+        dag = self.dag
+        n = len(dag)
+        if not n:
+            return 0, []
+        parent_offsets, parents = dag.csr(reverse=True)
+        # longest path ending at each row, and the row before it on that path
+        dist = array('d', [0.0]) * n
+        prev = array('i', [-1]) * n
+        for row in self.order:
+            best, best_parent = 0.0, -1
+            for k in xrange(parent_offsets[row], parent_offsets[row+1]):
+                p = parents[k]
+                if dist[p] > best or best_parent < 0:
+                    best, best_parent = dist[p], p
+            dist[row] = best + (weight(dag.node(row)) if weight else 1)
+            prev[row] = best_parent
+        # walk back from the end of the longest path
+        row = max(xrange(n), key=dist.__getitem__)
+        length = dist[row]
+        path = []
+        while row >= 0:
+            path.append(dag.node(row))
+            row = prev[row]
+        path.reverse()
+        return (int(length) if not weight else length), path
+
+    def critical_path(self, weight=None):
+        """Return the nodes on a longest path through the graph (see longest_path)."""
+        return self.longest_path(weight)[1]
+
+    def schedule(self, weight=None):
+        """
+        Return the (start, finish) times of each row in a greedy schedule
+        with unlimited processors, where each node starts as soon as all its
+        parents finish and runs for weight(node) (1 by default).
+        """
+        dag = self.dag
+        n = len(dag)
+        parent_offsets, parents = dag.csr(reverse=True)
+        start = array('d', [0.0]) * n
+        finish = array('d', [0.0]) * n
+        for row in self.order:
+            t = 0.0
+            for k in xrange(parent_offsets[row], parent_offsets[row+1]):
+                if finish[parents[k]] > t:
+                    t = finish[parents[k]]
+            start[row] = t
+            finish[row] = t + (weight(dag.node(row)) if weight else 1)
+        return start, finish
+
+    def parallelism_histogram(self, weight=None, buckets=20):
+        """
+        Return the parallelism over time: the span of the schedule (see
+        schedule) is split into equal buckets, and each one gets the average
+        number of nodes running during it. Returns (bucket width, [averages]).
+        """
+        start, finish = self.schedule(weight)
+        span = max(finish) if len(finish) else 0.0
+        if span <= 0:
+            return 0.0, []
+        width = span / buckets
+        busy = [0.0] * buckets
+        for row in xrange(len(start)):
+            s, f = start[row], finish[row]
+            b = min(int(s / width), buckets - 1)
+            while s < f:
+                end = max(s, min(f, (b + 1) * width))
+                busy[b] += end - s
+                s = end
+                b += 1
+                if b >= buckets:
+                    break
+        return width, [t / width for t in busy]
+
+
+def step_cost(graph, timed=None):
+    """
+    Return (timed, cost) for a frozen event graph: cost(node) is a step's
+    running time if the log had times (the _duration property), and 1 per
+    step otherwise; items cost nothing. Give timed=False to count steps
+    even if there are times.
+    """
+    if timed is None:
+        timed = any(graph.has_property(n, '_duration') for n in graph)
+    if timed:
+        return True, lambda n: graph.property(n, '_duration', 0)
+    return False, lambda n: 1 if graph.property(n, '_kind') == "step" else 0
+
+
+class WorkSpan(object):
+    """
+    Work/span analysis of an event graph (a frozen EventGraph, see
+    EventGraph.freeze).
+
+    Steps cost their running time, or 1 each (see step_cost). The work is
+    the total cost, the span is the cost of the critical path, and the
+    average parallelism (work / span) is the most speedup any runtime could
+    get from the graph. (timed is passed on to step_cost.)
+    """
+    def __init__(self, graph, timed=None):
+        self.analysis = LevelAnalysis(graph)
+        self.graph = graph = self.analysis.dag
+        self.timed, self.cost = step_cost(graph, timed)
+        self.work = sum(self.cost(n) for n in graph)
+        self.span, self.critical_path = self.analysis.longest_path(self.cost)
+
+    @property
+    def parallelism(self):
+        return self.work / float(self.span) if self.span else 0.0
+
+    def histogram(self, buckets=20):
+        """Return the parallelism over time (see LevelAnalysis.parallelism_histogram)."""
+        return self.analysis.parallelism_histogram(self.cost, buckets)
+
+    def critical_collections(self):
+        """
+        Return [(collection, steps, cost)] for the step collections on the
+        critical path, in decreasing order of cost.
+        """
+        totals = {}
+        for n in self.critical_path:
+            if self.graph.property(n, '_kind') == "step":
+                name = self.graph.property(n, '_collection')
+                steps, cost = totals.get(name, (0, 0))
+                totals[name] = (steps + 1, cost + self.cost(n))
+        return sorted(((name, steps, cost) for name, (steps, cost) in totals.iteritems()),
+                      key=lambda x: (-x[2], x[0]))
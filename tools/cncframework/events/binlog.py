@@ -0,0 +1,148 @@
+import sys, os, re, glob, mmap, struct, heapq
+from cncframework.events.logs import Event
+
+# Reader for the binary event logs written with CNC_DEBUG_BINLOG (see
+# _cncBinLog in the generated cnc_common.c): one file per worker thread,
+# each a header with the collection names, followed by fixed-size records.
+# The profiles written with CNC_PROFILE use the same file layout (see
+# profile.py), with their own magic, suffix and records.
+
+MAGIC = "CNCBLOG\0"
+SUFFIX = "bin"
+VERSION = 1
+
+# time, collection id, worker, type, tag length, tag (padded to the max length)
+RECORD_FORMAT = "<QIHBB%dq"
+
+# magic, version, record size, max tag length, worker, run id, name count, header size
+_header = struct.Struct("<8sIIIIQII")
+
+# event type codes (keep in sync with cnc_common.h)
+ACTIONS = {1: 'PUT', 2: 'GET-DEP', 3: 'PRESCRIBED', 4: 'RUNNING', 5: 'DONE'}
+
+def _has_magic(path, magic=MAGIC):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(magic)) == magic
+    except IOError:
+        return False
+
+def binary_log_files(path, suffix=SUFFIX, magic=MAGIC):
+    """
+    Return the per-worker files of a binary log, given the log prefix or
+    the path of any of the files.
+    """
+    end = re.escape("." + suffix) + "$"
+    match = re.match(r'(.*)\.\d+' + end, path)
+    prefix = match.group(1) if match else path
+    pattern = re.compile(re.escape(prefix) + r'\.\d+' + end)
+    paths = [p for p in glob.glob(prefix + ".*." + suffix) if pattern.match(p) and _has_magic(p, magic)]
+    if not paths and _has_magic(path, magic):
+        # a single (renamed) file
+        paths = [path]
+    return sorted(paths)
+
+def is_binary_log(path):
+    """Return whether path is a binary log (or the prefix of one)."""
+    return bool(binary_log_files(path))
+
+
+class _WorkerLog(object):
+    """One (memory-mapped) per-worker file of a binary log."""
+    def __init__(self, path, magic=MAGIC, record_format=RECORD_FORMAT):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(_header.size)
+            if len(header) < _header.size:
+                raise IOError("Truncated binary log header: " + path)
+            (_, version, self.record_size, self.tag_max, self.worker,
+             self.run_id, name_count, self.header_size) = _header.unpack(header)
+            if header[:len(magic)] != magic or version != VERSION:
+                raise IOError("Not a (version {0}) CnC binary log: {1}".format(VERSION, path))
+            names = f.read(self.header_size - _header.size).split("\0")
+            self.names = names[:name_count]
+            size = os.fstat(f.fileno()).st_size
+            # (a killed run can leave a partial record at the end)
+            self.count = (size - self.header_size) // self.record_size
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.count > 0 else None
+        self.record = struct.Struct(record_format % self.tag_max)
+        assert self.record.size == self.record_size, "Unexpected record size in " + path
+
+    def records(self):
+        """Yield the (unpacked) records, in order."""
+        unpack = self.record.unpack_from
+        data, offset, size = self.data, self.header_size, self.record_size
+        for _ in xrange(self.count):
+            yield unpack(data, offset)
+            offset += size
+
+    def __iter__(self):
+        """Yield (time, worker, Event) for each record, in order."""
+        names = self.names
+        for record in self.records():
+            time, coll, worker, action, tag_length = record[:5]
+            tag = ", ".join(map(str, record[5:5+tag_length])) or "0"
+            yield time, worker, Event(ACTIONS.get(action, str(action)), names[coll], tag, time, worker)
+
+    def close(self):
+        if self.data:
+            self.data.close()
+
+
+def open_worker_logs(path, suffix=SUFFIX, magic=MAGIC, record_format=RECORD_FORMAT):
+    """
+    Open the per-worker files of a binary log, given the log prefix or the
+    path of any of the files.
+
+    Only the files from the most recent run are used (older files could be
+    left over from a run with more workers).
+    """
+    paths = binary_log_files(path, suffix, magic)
+    if not paths:
+        raise IOError("No binary log files found for: " + path)
+    workers = [_WorkerLog(p, magic, record_format) for p in paths]
+    run_id = max(w.run_id for w in workers)
+    stale = [w for w in workers if w.run_id != run_id]
+    if stale:
+        print >>sys.stderr, "Warning: ignoring binary log files from an older run: %s" % (
+                ", ".join(w.path for w in stale))
+        for w in stale:
+            w.close()
+    return [w for w in workers if w.run_id == run_id]
+
+
+class BinaryLog(object):
+    """
+    Iterate over the events of a binary log, merged from all the per-worker
+    files in time order (see open_worker_logs).
+
+    Counts of the events read so far are kept in line_count and event_count,
+    as in EventReader.
+    """
+    def __init__(self, path):
+        self.workers = open_worker_logs(path)
+        self.line_count = 0
+        self.event_count = 0
+
+    def __len__(self):
+        """Return the number of events in the log."""
+        return sum(w.count for w in self.workers)
+
+    def __iter__(self):
+        count = self.event_count
+        try:
+            for _, _, event in heapq.merge(*self.workers):
+                count += 1
+                yield event
+        finally:
+            self.line_count = self.event_count = count
+
+    def close(self):
+        for w in self.workers:
+            w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
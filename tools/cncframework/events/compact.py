@@ -0,0 +1,253 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from cncframework.events.dag import DAG
+
+class _Column(object):
+    """
+    Column of interned attribute values, one row per node (or edge).
+
+    Each row holds an index into the table of distinct values, or -1 if the
+    row doesn't have the attribute. Good for attributes with few distinct
+    values, like colors, shapes and styles.
+    """
+    def __init__(self, values):
+        self.values = []
+        self.codes = array('i', [-1]) * len(values)
+        index = {}
+        for row, value in enumerate(values):
+            if value is not None:
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(self.values)
+                    self.values.append(value)
+                self.codes[row] = code
+
+    def has(self, row):
+        return self.codes[row] >= 0
+
+    def get(self, row, default=None):
+        code = self.codes[row]
+        return self.values[code] if code >= 0 else default
+
+
+class _StringColumn(object):
+    """
+    Column of mostly-distinct strings (like node labels), packed into a
+    single string buffer, with each row's value given by its offsets.
+    """
+    def __init__(self, values):
+        self.present = array('b', [0]) * len(values)
+        self.offsets = array('i', [0])
+        parts = []
+        end = 0
+        for row, value in enumerate(values):
+            if value is not None:
+                self.present[row] = 1
+                parts.append(value)
+                end += len(value)
+            self.offsets.append(end)
+        self.buffer = "".join(parts)
+
+    def has(self, row):
+        return self.present[row] == 1
+
+    def get(self, row, default=None):
+        if not self.present[row]:
+            return default
+        return self.buffer[self.offsets[row]:self.offsets[row+1]]
+
+
+def _make_column(values):
+    """Pick the column representation that suits the values."""
+    present = [v for v in values if v is not None]
+    if all(type(v) is str for v in present) and len(set(present)) > len(values) // 2:
+        return _StringColumn(values)
+    return _Column(values)
+
+
+class CompactDAG(DAG):
+    """
+    Frozen, array-backed form of a DAG, for analyzing big graphs.
+
+    Nodes are integers, and the edges are stored as CSR (compressed sparse
+    row) arrays of children and of parents. Node and edge properties are
+    stored as columns, so the per-node cost is tens of bytes rather than
+    hundreds. The read-only part of the DAG API works as before (children,
+    parents, properties, bfs, topsort, critical_path_length, dump_graph_dot,
+    etc.), and the methods that would change the graph raise TypeError.
+    Children and parents are returned as arrays, in increasing order.
+
+    Create one with DAG.freeze (or CompactDAG.from_dag).
+    """
+    def __init__(self, ids, child_offsets, children, parent_offsets, parents,
+                 node_columns=None, edge_columns=None):
+        # sorted node ids; node i's edges are children[child_offsets[i]:child_offsets[i+1]]
+        self._ids = ids
+        self._child_offsets = child_offsets
+        self._children = children
+        self._parent_offsets = parent_offsets
+        self._parents = parents
+        # property name -> column (edge rows follow the order of children)
+        self._node_columns = node_columns or {}
+        self._edge_columns = edge_columns or {}
+        # when the ids are just 0..n-1, a node is its own row
+        self._dense = not ids or (ids[0] == 0 and ids[-1] == len(ids) - 1)
+
+    @classmethod
+    def from_dag(cls, dag, extra_columns=None):
+        """
+        Build a CompactDAG from any DAG with integer node ids.
+
+        extra_columns can map additional property names to functions that
+        compute the property value for a node.
+        """
+        nodes = sorted(dag)
+        if not all(isinstance(n, (int, long)) for n in nodes):
+            raise TypeError("CompactDAG requires integer node ids")
+        ids = array('i', nodes)
+        child_offsets, children = array('i', [0]), array('i')
+        parent_offsets, parents = array('i', [0]), array('i')
+        node_values = defaultdict(lambda: [None] * len(ids))
+        edge_values = defaultdict(list)
+        for row, n in enumerate(ids):
+            kids = sorted(dag.children(n))
+            for c in kids:
+                props = dag.edge_properties(n, c)
+                for k in props:
+                    values = edge_values[k]
+                    values.extend([None] * (len(children) - len(values)))
+                    values.append(props[k])
+                children.append(c)
+            child_offsets.append(len(children))
+            parents.extend(sorted(dag.iter_parents(n)))
+            parent_offsets.append(len(parents))
+            for k, v in dag.properties(n).iteritems():
+                node_values[k][row] = v
+            for k, fn in (extra_columns or {}).iteritems():
+                node_values[k][row] = fn(n)
+        for values in edge_values.itervalues():
+            values.extend([None] * (len(children) - len(values)))
+        return cls(ids, child_offsets, children, parent_offsets, parents,
+                   {k: _make_column(v) for k, v in node_values.iteritems()},
+                   {k: _make_column(v) for k, v in edge_values.iteritems()})
+
+    def _row(self, node):
+        """Return the row of the arrays for a node."""
+        if self._dense:
+            if 0 <= node < len(self._ids):
+                return node
+        else:
+            row = bisect_left(self._ids, node)
+            if row < len(self._ids) and self._ids[row] == node:
+                return row
+        raise KeyError(node)
+
+    def _edge_row(self, fr, to):
+        """Return the row of the edge columns for an edge, or -1 if there's no such edge."""
+        row = self._row(fr)
+        lo, hi = self._child_offsets[row], self._child_offsets[row+1]
+        k = bisect_left(self._children, to, lo, hi)
+        return k if k < hi and self._children[k] == to else -1
+
+    def __contains__(self, arg):
+        try:
+            self._row(arg)
+            return True
+        except (KeyError, TypeError):
+            return False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __str__(self):
+        return str({n: list(self.children(n)) for n in self})
+
+    def edge_count(self):
+        """Return the number of edges in the graph."""
+        return len(self._children)
+
+    def transpose(self):
+        """Return the transpose (reversed edges) of the graph, without properties."""
+        return CompactDAG(self._ids, self._parent_offsets, self._parents,
+                          self._child_offsets, self._children)
+
+    def row(self, node):
+        """Return the row (0..n-1) of a node, as used by the arrays in csr()."""
+        return self._row(node)
+
+    def node(self, row):
+        """Return the node at a row."""
+        return self._ids[row]
+
+    def csr(self, reverse=False):
+        """
+        Return the CSR arrays (offsets, neighbors) for the children of each
+        row (or the parents, if reverse is True), with the neighbors given
+        as rows. Row r's neighbors are neighbors[offsets[r]:offsets[r+1]].
+        """
+        offsets, neighbors = ((self._parent_offsets, self._parents) if reverse
+                              else (self._child_offsets, self._children))
+        if not self._dense:
+            rows = {n: r for r, n in enumerate(self._ids)}
+            neighbors = array('i', (rows[n] for n in neighbors))
+        return offsets, neighbors
+
+    def children(self, node):
+        row = self._row(node)
+        return self._children[self._child_offsets[row]:self._child_offsets[row+1]]
+
+    def parents(self, node):
+        row = self._row(node)
+        return set(self._parents[self._parent_offsets[row]:self._parent_offsets[row+1]])
+
+    def iter_parents(self, node):
+        row = self._row(node)
+        return iter(self._parents[self._parent_offsets[row]:self._parent_offsets[row+1]])
+
+    def in_degree(self, node):
+        row = self._row(node)
+        return self._parent_offsets[row+1] - self._parent_offsets[row]
+
+    def out_degree(self, node):
+        row = self._row(node)
+        return self._child_offsets[row+1] - self._child_offsets[row]
+
+    def has_property(self, node, prop):
+        column = self._node_columns.get(prop)
+        return column is not None and column.has(self._row(node))
+
+    def property(self, node, prop, default = None):
+        column = self._node_columns.get(prop)
+        value = column and column.get(self._row(node))
+        return value if value else default
+
+    def properties(self, node):
+        """Return a dict of all the properties of a node (a copy, since the graph is read-only)."""
+        row = self._row(node)
+        return {k: c.get(row) for k, c in self._node_columns.iteritems() if c.has(row)}
+
+    def edge_property(self, fr, to, prop, default=None):
+        column = self._edge_columns.get(prop)
+        row = self._edge_row(fr, to)
+        if column is None or row < 0:
+            return default
+        return column.get(row, default)
+
+    def edge_properties(self, fr, to):
+        row = self._edge_row(fr, to)
+        if row < 0:
+            return {}
+        return {k: c.get(row) for k, c in self._edge_columns.iteritems() if c.has(row)}
+
+    def freeze(self):
+        return self
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("CompactDAG is read-only")
+
+    add_node = add_child = remove_child = remove_all_children = remove_node = _read_only
+    set_property = set_edge_property = set_edge_properties = _read_only
@@ -1,4 +1,5 @@
 from collections import deque
+import hashlib
 
 class DAG(object):
     """Directed Acyclic Graph"""
@@ -7,10 +8,21 @@ class DAG(object):
         Init the graph.
 
         If nodes is given, it should be a mapping {node_id: {children}}
+        (children that aren't keys of the mapping are added as nodes)
         """
         self._nodes = nodes if nodes else {}
         self._properties = {n: {} for n in nodes} if nodes else {}
         self._eproperties = {}
+        # reverse adjacency index: node -> set of parents
+        # (kept in sync with _nodes by all the methods that change edges)
+        self._parents = {n: set() for n in self._nodes}
+        for n, children in self._nodes.items():
+            for c in children:
+                self._parents.setdefault(c, set()).add(n)
+        for c in self._parents:
+            if c not in self._nodes:
+                self._nodes[c] = set()
+                self._properties[c] = {}
 
     def __contains__(self, arg):
         """Test existence of a node in the graph."""
@@ -25,42 +37,32 @@ class DAG(object):
         return self._nodes.__iter__()
 
     def __eq__(self, other):
-        """Equality between graphs, True if self is likely isomorphic to other. """
-        if len(self) != len(other):
-            return False
-        selfsort = self.topsort()
-        othersort = other.topsort()
-        # make sure each layer is the same size
-        selflayers = self.dist_layers(selfsort[0])
-        otherlayers = other.dist_layers(othersort[0])
-        if len(selflayers) != len(otherlayers):
-            return False
-        for layer in selflayers:
-            if layer not in otherlayers or len(selflayers[layer]) != len(otherlayers[layer]):
-                return False
-        # same number of leaves
-        if len(self.collect_leaves(selfsort[0])) != len(other.collect_leaves(othersort[0])):
-            return False
-        # same critical path length
-        if self.critical_path_length() != other.critical_path_length():
-            return False
-        return True
+        """
+        Equality between graphs, True if self is likely isomorphic to other
+        (with the same node labels, see fingerprint): they have the same
+        numbers of nodes and edges, and the same (SHA-1) fingerprint.
+        """
+        return (len(self) == len(other) and self.edge_count() == other.edge_count()
+                and self.fingerprint() == other.fingerprint())
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         """Return string representation of DAG."""
         return str(self._nodes)
 
+    def edge_count(self):
+        """Return the number of edges in the graph."""
+        return sum(len(children) for children in self._nodes.itervalues())
+
     def transpose(self):
         """Return the transpose (reversed edges) of the graph as a new DAG."""
-        p = {n: set() for n in self}
-        for n in self._nodes:
-            for c in self.children(n):
-                p[c].add(n)
-        return DAG(p)
+        return DAG({n: set(p) for n, p in self._parents.iteritems()})
 
     def in_degree(self, node):
         """The number of parents of some node."""
-        return len(self.parents(node))
+        return len(self._parents[node])
 
     def out_degree(self, node):
         """The number of children of some node."""
@@ -94,7 +96,7 @@ class DAG(object):
 
     def edge_property(self, fr, to, prop, default=None):
         """Return property prop of edge from fr to to."""
-        return self._eproperties[(fr,to)].get(prop, default)
+        return self._eproperties.get((fr,to), {}).get(prop, default)
 
     def edge_properties(self, fr, to):
         """Return a reference to a dict of the properties of the edge from fr to to."""
@@ -124,8 +126,10 @@ class DAG(object):
             parents = self.parents(node)
         for parent in self.parents(node):
             self.remove_child(parent, node)
+        self.remove_all_children(node)
 
         del self._nodes[node]
+        del self._parents[node]
         del self._properties[node]
 
     def contract(self, node, parent):
@@ -151,6 +155,7 @@ class DAG(object):
         """Add node to graph if it's not already there."""
         if node not in self:
             self._nodes[node] = set()
+            self._parents[node] = set()
             self._properties[node] = {}
 
     def add_node_with_children(self, node, children):
@@ -180,9 +185,9 @@ class DAG(object):
     def add_child(self, node, child):
         """Add some child to some node; create child node if it does not exist."""
         if child in self:
+            # (edge property dicts are created on demand, to save memory)
             self._nodes[node].add(child)
-            if (node,child) not in self._eproperties:
-                self._eproperties[(node,child)] = {}
+            self._parents[child].add(node)
         else:
             self.add_node_with_parents(child, [node])
 
@@ -193,9 +198,12 @@ class DAG(object):
     def remove_child(self, node, child):
         """Remove child from set of children of node."""
         self._nodes[node].discard(child)
+        self._parents[child].discard(node)
 
     def remove_all_children(self, node):
         """Remove all children of node."""
+        for child in self._nodes[node]:
+            self._parents[child].discard(node)
         self._nodes[node] = set()
 
     def remove_all_parents(self, node):
@@ -211,32 +219,36 @@ class DAG(object):
         """
         Return the set of parents of some node.
 
-        Use transpose and children instead if parents is called repeatedly.
+        The result is a copy, so it's safe to change the graph while iterating
+        over it. Use iter_parents to avoid copying.
         """
-        parents = set()
-        for p in self:
-            if node in self.children(p):
-                parents.add(p)
-        return parents
+        return set(self._parents[node])
 
-    def bfs(self, start_node = None, visitor = lambda x: x):
+    def iter_parents(self, node):
+        """Return an iterator over the parents of some node."""
+        return iter(self._parents[node])
+
+    def bfs(self, start_node = None, visitor = lambda x: x, reverse = False):
         """
         Perform a breadth-first search starting at start_node along parent -> children edges.
 
         Call visitor(node) on each visited node in traversal order.
         If start_node not given, visit all nodes.
+        If reverse is True, travel along child -> parent edges instead.
         Return a mapping of {visited nodes : distance from start}
         """
+        neighbors = self.iter_parents if reverse else self.children
         distances = {} # track visited nodes
-        while len(distances) < len(self._nodes):
+        unvisited = iter(self) # (visited nodes only get added, so one pass is enough)
+        while len(distances) < len(self):
             break_first = bool(start_node)
             if not break_first:
-                start_node = list(set(self._nodes).difference(set(distances.keys())))[0]
+                start_node = next(n for n in unvisited if n not in distances)
             distances[start_node] = 0
             que = deque([start_node])
             while len(que) > 0:
                 current_id = que.popleft()
-                for child_id in self.children(current_id):
+                for child_id in neighbors(current_id):
                     if child_id not in distances:
                         que.append(child_id)
                         distances[child_id] = distances[current_id] + 1
@@ -264,19 +276,30 @@ class DAG(object):
         Perform a depth-first search starting at start_node.
 
         Travel along edges connecting parents to children and call
-        visitor(node) on each visited node.
+        visitor(node) on each visited node (after visiting its children).
         If start_node not given, visit all nodes.
         """
         history = set()
         def visit(node):
-            if node not in history:
-                history.add(node)
-                for child in self.children(node):
-                    visit(child)
-                visitor(node) # callback comes here
+            # iterative, so deep graphs don't hit the recursion limit
+            if node in history:
+                return
+            history.add(node)
+            stack = [(node, iter(self.children(node)))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child not in history:
+                        history.add(child)
+                        stack.append((child, iter(self.children(child))))
+                        break
+                else:
+                    stack.pop()
+                    visitor(node) # callback comes here
         if not start_node:
-            while len(history) < len(self._nodes):
-                visit(list(set(self._nodes).difference(history))[0])
+            unvisited = iter(self)
+            while len(history) < len(self):
+                visit(next(n for n in unvisited if n not in history))
         else:
             visit(start_node)
 
@@ -316,14 +339,59 @@ class DAG(object):
         return leafs
 
     def critical_path_length(self):
-        """Return length of the longest path in the graph."""
-        nodes = self.topsort()
-        tpose = self.transpose()
+        """
+        Return length of the longest path in the graph (counted in nodes).
+
+        See cncframework.events.analysis for more detailed path analysis.
+        """
         pl = {}
-        for n in nodes:
+        for n in self.topsort():
             # path work at node is work done at the node plus the maximum work on an incoming path
-            pl[n] = 1 + max([0]+[pl.get(p, 0) for p in tpose.children(n)])
-        return pl[nodes[-1]]
+            pl[n] = 1 + max([0]+[pl.get(p, 0) for p in self.iter_parents(n)])
+        return max(pl.itervalues()) if pl else 0
+
+    def wl_labels(self, label=None, rounds=3):
+        """
+        Return a mapping {node: hash} of Weisfeiler-Lehman labels.
+
+        Each node starts with the hash of label(node) (by default its
+        _collection property, as in frozen event graphs, so other graphs are
+        compared on their structure alone), and each round then hashes each
+        node's label with the sorted labels of its parents and its children.
+        After k rounds, two nodes have the same label if (barring hash
+        collisions) their k-hop neighborhoods look the same. The hashes are
+        SHA-1 digests of canonical reprs (see wl_hash), so they're the same
+        from run to run and machine to machine.
+        """
+        if label is None:
+            label = lambda n: self.property(n, '_collection', '')
+        labels = {n: wl_hash(label(n)) for n in self}
+        for _ in xrange(rounds):
+            labels = {n: wl_hash((h, tuple(sorted(labels[p] for p in self.iter_parents(n))),
+                                  tuple(sorted(labels[c] for c in self.children(n)))))
+                      for n, h in labels.iteritems()}
+        return labels
+
+    def fingerprint(self, label=None, rounds=3):
+        """
+        Return a canonical fingerprint of the graph (as a hex string), from
+        its Weisfeiler-Lehman labels (see wl_labels).
+
+        Isomorphic graphs always have the same fingerprint, and graphs with
+        the same fingerprint are very likely isomorphic (WL hashing can't
+        tell some regular graphs apart). Fingerprints are stable, so they
+        can be compared across runs and machines.
+        """
+        return wl_fingerprint(self.wl_labels(label, rounds))
+
+    def freeze(self):
+        """
+        Return a compact, read-only copy of the graph (see CompactDAG).
+
+        Node ids must be integers.
+        """
+        from cncframework.events.compact import CompactDAG
+        return CompactDAG.from_dag(self)
 
     def dump_graph_dot(self, name='DAG', **kwargs):
         """
@@ -346,3 +414,19 @@ class DAG(object):
         opts = '\n'.join(["%s=%s" % (k,v) for (k,v) in kwargs.items()])
         output = 'digraph "%s" {\n%s\n%s}\n' % (name, opts, '\n'.join(output))
         return output
+
+
+def wl_hash(value):
+    """
+    Return a stable hash of a label (or a tuple of labels) for wl_labels:
+    the SHA-1 digest of its repr, which (unlike hash()) doesn't depend on
+    the Python build or hash randomization.
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return hashlib.sha1(repr(value)).digest()
+
+
+def wl_fingerprint(labels):
+    """Return the fingerprint of a graph from its WL labels (see DAG.fingerprint)."""
+    return hashlib.sha1("".join(sorted(labels.itervalues()))).hexdigest()
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from counter import Counter
+from cncframework.events.dag import wl_fingerprint
+from cncframework.events.analysis import WorkSpan
+
+class CollectionDiff(object):
+    """Counts for one step or item collection in the two graphs of a GraphDiff."""
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        # instances in each graph
+        self.before = self.after = 0
+        # instances with no match (by one-round WL label) in the other graph
+        self.unmatched_before = self.unmatched_after = 0
+        # total cost of the steps (see analysis.step_cost)
+        self.cost_before = self.cost_after = 0
+
+    @property
+    def change(self):
+        return self.after - self.before
+
+    @property
+    def changed(self):
+        """Whether anything about the collection is different."""
+        return (self.before != self.after or self.unmatched_before or self.unmatched_after
+                or self.cost_before != self.cost_after)
+
+
+class GraphDiff(object):
+    """
+    Differences between the event graphs of two runs (frozen EventGraphs),
+    e.g. before and after a change to the spec or tuning.
+
+    The graphs are compared by their Weisfeiler-Lehman labels (see
+    DAG.wl_labels): if the fingerprints match, the graphs have the same
+    shape, and otherwise the instances of each collection whose one-round
+    labels (their collection and those of their neighbors) have no match in
+    the other graph show where the shape changed. (Later rounds would pull
+    in every node near a hub like the init step.) Instance
+    edges are matched by the labels (collection and tag) of their ends,
+    and counted by the pair of collections they join. The work, span and
+    critical path come from WorkSpan, in running times if both logs had
+    times, and in steps otherwise.
+    """
+    def __init__(self, before, after, rounds=3, examples=5):
+        self.before, self.after = before, after
+        self.examples = examples
+        self.fingerprints = tuple(wl_fingerprint(g.wl_labels(rounds=rounds))
+                                  for g in (before, after))
+        labels = before.wl_labels(rounds=1), after.wl_labels(rounds=1)
+        timed = all(any(g.has_property(n, '_duration') for n in g) for g in (before, after))
+        self.work_span = WorkSpan(before, timed), WorkSpan(after, timed)
+        self.timed = timed
+        self.collections = {}
+        self._compare_nodes(labels)
+        self._compare_edges()
+
+    @property
+    def same_shape(self):
+        return self.fingerprints[0] == self.fingerprints[1]
+
+    def _collection(self, graph, node):
+        key = (graph.property(node, '_kind'), graph.property(node, '_collection', ''))
+        diff = self.collections.get(key)
+        if diff is None:
+            diff = self.collections[key] = CollectionDiff(*key)
+        return diff
+
+    def _compare_nodes(self, labels):
+        counts = []
+        for side, (graph, ws) in enumerate(zip((self.before, self.after), self.work_span)):
+            count = Counter()
+            for node in graph:
+                diff = self._collection(graph, node)
+                if side == 0:
+                    diff.before += 1
+                    diff.cost_before += ws.cost(node)
+                else:
+                    diff.after += 1
+                    diff.cost_after += ws.cost(node)
+                # (the WL labels include the collection, so they're per collection)
+                count[(diff.kind, diff.name, labels[side][node])] += 1
+            counts.append(count)
+        for key, n in counts[0].iteritems():
+            self.collections[key[:2]].unmatched_before += max(0, n - counts[1][key])
+        for key, n in counts[1].iteritems():
+            self.collections[key[:2]].unmatched_after += max(0, n - counts[0][key])
+
+    def _edges(self, graph):
+        """Return the set of (from label, to label) edges of a graph, and the collections of the labels."""
+        offsets, children = graph.csr()
+        labels = [graph.property(graph.node(row), 'label', str(graph.node(row)))
+                  for row in xrange(len(graph))]
+        names = {}
+        for row, label in enumerate(labels):
+            names[label] = graph.property(graph.node(row), '_collection', '')
+        edges = set()
+        for row in xrange(len(graph)):
+            for k in xrange(offsets[row], offsets[row+1]):
+                edges.add((labels[row], labels[children[k]]))
+        return edges, names
+
+    def _compare_edges(self):
+        before, names = self._edges(self.before)
+        after, after_names = self._edges(self.after)
+        names.update(after_names)
+        # (from collection, to collection) -> [removed, added] edges, and
+        # a few examples of each ("-" or "+", from label, to label)
+        self.edges = defaultdict(lambda: [0, 0])
+        self.edge_examples = defaultdict(list)
+        for side, edges in ((0, before - after), (1, after - before)):
+            for fr, to in sorted(edges):
+                key = (names[fr], names[to])
+                self.edges[key][side] += 1
+                if self.edges[key][side] <= self.examples:
+                    self.edge_examples[key].append(("-+"[side], fr, to))
+        self.edge_counts = len(before), len(after)
+
+    def changed_collections(self):
+        """Return the CollectionDiffs that changed, steps first, by name."""
+        return sorted((d for d in self.collections.itervalues() if d.changed),
+                      key=lambda d: (d.kind != "step", d.name))
+
+    def critical_path_shift(self):
+        """
+        Return [(collection, (steps, cost) before, (steps, cost) after)] for
+        the step collections on either critical path, by decreasing cost after.
+        """
+        paths = [{name: (steps, cost) for name, steps, cost in ws.critical_collections()}
+                 for ws in self.work_span]
+        names = set(paths[0]).union(paths[1])
+        rows = [(name, paths[0].get(name, (0, 0)), paths[1].get(name, (0, 0))) for name in names]
+        return sorted(rows, key=lambda r: (-r[2][1], -r[1][1], r[0]))
@@ -0,0 +1,218 @@
+import sqlite3
+import cncframework.events.actions as actions
+
+# Tables of an indexed event log. Positions in the log (seq) are used as
+# the ids of events, and steps and items refer to the events that made them.
+_SCHEMA = """
+CREATE TABLE events (
+    seq INTEGER PRIMARY KEY,    -- position in the log (from 1)
+    action TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    time INTEGER,               -- ns (binary logs only)
+    worker INTEGER,             -- (binary logs only)
+    parent INTEGER              -- seq of the RUNNING of the step that did a PUT or
+                                -- PRESCRIBED, or of the PRESCRIBED a GET-DEP is for
+);
+CREATE TABLE deps (
+    step_collection TEXT NOT NULL,
+    step_tag TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE TABLE steps (
+    collection TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    prescribed INTEGER,         -- seq of its (first) PRESCRIBED
+    running INTEGER,            -- seq of its (last) RUNNING
+    done INTEGER,               -- seq of its DONE
+    parent INTEGER              -- seq of the RUNNING of the step that prescribed it
+);
+CREATE TABLE items (
+    collection TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    put INTEGER NOT NULL,       -- seq of its PUT
+    producer INTEGER            -- seq of the RUNNING of the step that put it
+);
+"""
+
+# Built once the events are in, since it's much faster to index a full table
+# than to keep the indices up to date while inserting.
+_DERIVED = """
+INSERT INTO steps
+    SELECT collection, tag,
+           MIN(CASE WHEN action = 'PRESCRIBED' THEN seq END),
+           MAX(CASE WHEN action = 'RUNNING' THEN seq END),
+           MAX(CASE WHEN action = 'DONE' THEN seq END),
+           MIN(CASE WHEN action = 'PRESCRIBED' THEN parent END)
+    FROM events WHERE action IN ('PRESCRIBED', 'RUNNING', 'DONE')
+    GROUP BY collection, tag;
+INSERT INTO items
+    SELECT collection, tag, seq, parent FROM events WHERE action = 'PUT';
+INSERT INTO deps
+    SELECT p.collection, p.tag, g.collection, g.tag
+    FROM events g JOIN events p ON p.seq = g.parent
+    WHERE g.action = 'GET-DEP';
+CREATE INDEX events_by_tag ON events (collection, tag);
+CREATE INDEX deps_by_step ON deps (step_collection, step_tag);
+CREATE INDEX deps_by_item ON deps (collection, tag);
+CREATE UNIQUE INDEX steps_by_tag ON steps (collection, tag);
+CREATE INDEX items_by_tag ON items (collection, tag);
+"""
+
+# Made last, so a database whose indexing was cut short (by an error or
+# Ctrl-C) isn't taken for a complete one (see is_indexed).
+_COMPLETE = "CREATE TABLE indexed (event_count INTEGER NOT NULL)"
+
+def normalize_tag(tag):
+    """Format a tag the way the logs do ("3,4" -> "3, 4")."""
+    return ", ".join(part.strip() for part in tag.split(","))
+
+def parse_instance(spec):
+    """Split an instance like "data:3,4" (or "data @ 3, 4") into (collection, tag)."""
+    for sep in (" @ ", "@", ":"):
+        collection, found, tag = spec.partition(sep)
+        if found:
+            return collection.strip(), normalize_tag(tag)
+    raise ValueError("Expected COLLECTION:TAG, got {0!r}".format(spec))
+
+
+class EventDatabase(object):
+    """
+    An event log indexed in a SQLite database, for questions about single
+    steps and items in logs too big to grep (see the tables in _SCHEMA).
+
+    Build one with index(events), which streams the events in (in batches,
+    in one transaction), and then open it again later with the same path.
+    As in EventGraph, the events of each worker are assumed to be
+    serialized, to find which step did each PUT and PRESCRIBED.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.text_factory = str
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_indexed(self):
+        """Whether the database holds a completely indexed log."""
+        return self.db.execute("SELECT COUNT(*) FROM sqlite_master "
+                               "WHERE type = 'table' AND name = 'indexed'").fetchone()[0] > 0
+
+    def index(self, events, batch_size=50000):
+        """
+        Read an iterable of Events into the (new, empty) database; return the
+        number of events. The database is only complete once this returns.
+        """
+        db = self.db
+        # the database can just be made again if the machine crashes
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(_SCHEMA)
+        insert = "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)"
+        # worker -> seq of the RUNNING of the step it's running
+        running = {}
+        # worker -> [(seq, GET-DEP event)] for the next step it prescribes
+        gets = {}
+        rows = []
+        seq = 0
+        for action, label, tag, time, worker in events:
+            seq += 1
+            parent = None
+            if action == actions.GET_DEP:
+                gets.setdefault(worker, []).append((seq, label, tag, time))
+                continue
+            if action == actions.PRESCRIBED:
+                parent = running.get(worker)
+                for dep_seq, dep_label, dep_tag, dep_time in gets.pop(worker, ()):
+                    rows.append((dep_seq, actions.GET_DEP, dep_label, dep_tag, dep_time, worker, seq))
+            elif action == actions.RUNNING:
+                running[worker] = seq
+            elif action == actions.PUT:
+                parent = running.get(worker)
+            rows.append((seq, action, label, tag, time, worker, parent))
+            if len(rows) >= batch_size:
+                db.executemany(insert, rows)
+                rows = []
+        # GET-DEPs at the very end of the log (with no step)
+        for worker, pending in gets.iteritems():
+            rows.extend((dep_seq, actions.GET_DEP, dep_label, dep_tag, dep_time, worker, None)
+                        for dep_seq, dep_label, dep_tag, dep_time in pending)
+        db.executemany(insert, rows)
+        db.executescript(_DERIVED)
+        db.execute(_COMPLETE)
+        db.execute("INSERT INTO indexed VALUES (?)", (seq,))
+        db.commit()
+        return seq
+
+    def query(self, sql, params=()):
+        """Run a query; return the cursor (to iterate over the rows)."""
+        return self.db.execute(sql, params)
+
+    def puts(self, collection, tag):
+        """
+        Return the puts of an item, as (seq, time, worker, producer
+        collection, producer tag) (the producer is None for the environment).
+        """
+        return self.db.execute("""
+            SELECT i.put, e.time, e.worker, p.collection, p.tag
+            FROM items i JOIN events e ON e.seq = i.put
+                 LEFT JOIN events p ON p.seq = i.producer
+            WHERE i.collection = ? AND i.tag = ?
+            ORDER BY i.put""", (collection, tag)).fetchall()
+
+    def consumers(self, collection, tag):
+        """Return the steps that get an item, as (collection, tag, running seq)."""
+        return self.db.execute("""
+            SELECT d.step_collection, d.step_tag, s.running
+            FROM deps d LEFT JOIN steps s
+                 ON s.collection = d.step_collection AND s.tag = d.step_tag
+            WHERE d.collection = ? AND d.tag = ?
+            ORDER BY s.running""", (collection, tag)).fetchall()
+
+    def waiting(self, collection=None):
+        """
+        Return the steps that never ran (or ran but never finished) and get
+        an item that was never put, as (step collection, step tag, item
+        collection, item tag), optionally only for items of one collection.
+        """
+        where = "AND d.collection = ?" if collection else ""
+        return self.db.execute("""
+            SELECT s.collection, s.tag, d.collection, d.tag
+            FROM steps s JOIN deps d
+                 ON d.step_collection = s.collection AND d.step_tag = s.tag
+            WHERE s.done IS NULL {0}
+              AND NOT EXISTS (SELECT 1 FROM items i
+                              WHERE i.collection = d.collection AND i.tag = d.tag)
+            ORDER BY s.collection, s.prescribed, d.collection, d.tag""".format(where),
+            (collection,) if collection else ()).fetchall()
+
+    def put_to_run(self, collection=None):
+        """
+        Return the time from each PUT to the first RUNNING of a step that
+        gets the item, as (collection, tag, delay), in ns for logs with times,
+        or else as the number of events in between. Items that no step got
+        (or whose consumers never ran) are left out.
+        """
+        where = "WHERE i.collection = ?" if collection else ""
+        return self.db.execute("""
+            SELECT i.collection, i.tag,
+                   COALESCE(MIN(r.time) - p.time, MIN(r.seq) - p.seq)
+            FROM items i JOIN events p ON p.seq = i.put
+                 JOIN deps d ON d.collection = i.collection AND d.tag = i.tag
+                 JOIN steps s ON s.collection = d.step_collection AND s.tag = d.step_tag
+                 JOIN events r ON r.seq = s.running
+            {0}
+            GROUP BY i.collection, i.tag""".format(where),
+            (collection,) if collection else ()).fetchall()
+
+    def timed(self):
+        """Whether the events have times (the log was binary)."""
+        return self.db.execute("SELECT time IS NOT NULL FROM events LIMIT 1").fetchone() == (1,)
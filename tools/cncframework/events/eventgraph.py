@@ -1,30 +1,38 @@
 # -*- coding: utf-8 -*-
-import sys, re
+import sys
 from counter import Counter
 from collections import defaultdict
 from cncframework.events.dag import DAG
+from cncframework.events.compact import CompactDAG
+from cncframework.events.logs import EventReader, parse_event
+from cncframework.events.binlog import BinaryLog
 import cncframework.events.styles as styles
 import cncframework.events.actions as actions
 
 class EventGraph(DAG):
     '''
     Directed acyclic graph for a CnC-OCR event log. Assumes that execution is
-    serialized, i.e. no two activities can be running at the same time.
+    serialized, i.e. no two activities can be running at the same time, or
+    that the events say which worker they ran on (as in binary logs), in
+    which case each worker's events are assumed to be serialized.
     '''
     def __init__(self, event_log, prescribe=True, html=False):
         """
         EventGraph: create a DAG representing an event log
 
-        event_log parameter should be a list of strings, each element being a
-        line in the event log.
+        event_log parameter should be an iterable of lines from the event log
+        (e.g. an open log file, which is then read incrementally), or an
+        EventReader over those lines, or a BinaryLog.
         prescribe indicates whether prescribe edges will be added to the graph.
         html indicates whether the graph should be prepared for HTML output.
         This option embeds a bit of extra ordering information in the graph.
         """
         super(EventGraph, self).__init__()
         self.init_vars(prescribe, html)
-        for event in event_log:
-            self.process_event(event)
+        if not isinstance(event_log, (EventReader, BinaryLog)):
+            event_log = EventReader(event_log)
+        for action, label, tag, time, worker in event_log:
+            self.add_event(action, label, tag, worker, time)
         self.post_process()
 
     def init_vars(self, prescribe, html):
@@ -41,24 +49,29 @@ class EventGraph(DAG):
         self._id_count = 1
         # action_label_tag identifier -> node id
         self._cache_node_ids = {}
-        # [(id,label,collection) for get events on the next activity prescribed]
-        self._activity_gets = []
+        # worker -> [(id,label,collection) for get events on the next activity prescribed]
+        self._activity_gets = defaultdict(list)
         # list of node id's for steps that have entered running state
         self._steps_run = []
         # prescribe node id -> (prescriber, [items in get list])
         self._steps_prescribed = {}
-        # list of node id's for items that have been get
-        self._items_gotten = []
-        # list of node id's for items that have been put
-        self._items_put = []
+        # set of node id's for items that have been get
+        self._items_gotten = set()
+        # node id -> number of times that item has been put
+        self._items_put = Counter()
         # put init on the graph and style it like a step
         self.add_node(0)
         self.set_property(0, "label", "init")
         self.style_step(0)
         if self.html:
             self.mark_running_time(0, 1)
-        # id of last step to enter running state
-        self._last_running_activity_tag = 0
+        # worker -> id of last step to enter running state (init to start with)
+        self._last_running_activity_tag = defaultdict(int)
+        # (label, tag) -> (node id, time) of running steps (for logs with
+        # times; the node id changes on RUNNING for html output)
+        self._steps_started = {}
+        # step node id -> running time (DONE time - RUNNING time)
+        self.durations = {}
         # the id of the finalize node
         self.finalize_node = None
 
@@ -72,23 +85,29 @@ class EventGraph(DAG):
         # skip anything without an @
         if "@" not in event:
             return
-        # action is one of the things defined in actions
-        # label is either the collection or the step name, depending on action
-        # tag is the tag of the step or collection
-        # format: ACTION  LABEL @ TAG
-        pattern = re.compile(r'([^\s]+) ([^\s]+) @ (.+)')
-        match = pattern.match(event)
-        action, label, tag = [match.group(i+1) for i in range(3)]
+        parsed = parse_event(event)
+        if parsed:
+            self.add_event(parsed.action, parsed.label, parsed.tag, parsed.worker, parsed.time)
+
+    def add_event(self, action, label, tag, worker=None, time=None):
+        """
+        Add a parsed event to the DAG (see process_event).
+
+        action is one of the things defined in actions
+        label is either the collection or the step name, depending on action
+        tag is the tag of the step or collection
+        worker is the worker the event happened on, if known
+        time is the time of the event, if known
+        """
         # make sure that cncPrescribe_StepName and StepName are treated the same
         node_id = self.create_node_id(action, label, tag)
         node_label = self.create_node_label(action, label, tag)
         if action == actions.PRESCRIBED:
-            self.add_get_edges(node_id, node_label, self._activity_gets)
+            # (and clear out the activity get list to prepare for next prescribe)
+            self.add_get_edges(node_id, node_label, self._activity_gets.pop(worker, []))
             if self.prescribe:
-                self.add_prescribe_edge(self._last_running_activity_tag, node_id)
+                self.add_prescribe_edge(self._last_running_activity_tag[worker], node_id)
             self.style_step(node_id)
-            # clear out the activity get list to prepare for next prescribe
-            self._activity_gets = []
             # track the finalize node
             if label.endswith("_finalize"):
                 self.finalize_node = node_id
@@ -100,22 +119,25 @@ class EventGraph(DAG):
                 self.mark_running_time(node_id,
                         self.create_node_id(action, label, tag, force = True))
             # record this tag as being the currently running activity
-            self._last_running_activity_tag = node_id
+            self._last_running_activity_tag[worker] = node_id
             self._steps_run.append(node_id)
+            if time is not None:
+                self._steps_started[(label, tag)] = (node_id, time)
 
         elif action == actions.DONE:
-            # nothing to do for this action
-            pass
+            started = self._steps_started.pop((label, tag), None)
+            if started is not None:
+                self.durations[started[0]] = time - started[1]
 
         elif action == actions.GET_DEP:
             # happens before a step is prescribed, so we keep track of these items
-            self._activity_gets.append((node_id, node_label, label))
-            self._items_gotten.append(node_id)
+            self._activity_gets[worker].append((node_id, node_label, label))
+            self._items_gotten.add(node_id)
 
         elif action == actions.PUT:
             self.add_put_edges(node_id, node_label,
-                               label, self._last_running_activity_tag)
-            self._items_put.append(node_id)
+                               label, self._last_running_activity_tag[worker])
+            self._items_put[node_id] += 1
 
         else:
             print >>sys.stderr, "Unrecognized action %s" % action
@@ -196,8 +218,8 @@ class EventGraph(DAG):
         """
         # warn for items in sequence of node ids appearing more than once
         def warn_on_duplicates(sequence, verb):
-            # print a warning on duplicates in a sequence
-            counts = Counter(sequence)
+            # print a warning on duplicates in a sequence (or a Counter)
+            counts = sequence if isinstance(sequence, Counter) else Counter(sequence)
             for k in counts:
                 if counts[k] > 1:
                     print >>sys.stderr, "Warning: %s %s %d times." % (
@@ -216,16 +238,33 @@ class EventGraph(DAG):
         warn_on_duplicates(self._steps_prescribed.keys(), "prescribed")
         warn_on_duplicates(self._items_put, "put")
         # warn on items gotten but not put or put without get
-        gotten_without_put = set(self._items_gotten).difference(set(self._items_put))
-        put_without_get = set(self._items_put).difference(set(self._items_gotten))
+        gotten_without_put = self._items_gotten.difference(self._items_put)
+        put_without_get = set(self._items_put).difference(self._items_gotten)
         warn_on_existence(gotten_without_put, "Items with GET without PUT",
                           styles.color('get_without_put'))
         warn_on_existence(put_without_get, "Items with PUT without GET",
                           styles.color('put_without_get'))
         # warn on nodes that have no path to the finalize
         if self.finalize_node is not None:
-            trans = self.transpose()
             visits = {self.finalize_node}
-            trans.bfs(self.finalize_node, visitor = visits.add)
+            self.bfs(self.finalize_node, visitor = visits.add, reverse = True)
             warn_on_existence(set(self).difference(visits),
                             "Nodes without path to FINALIZE")
+
+    def freeze(self):
+        """
+        Return a compact, read-only copy of the event graph (see CompactDAG).
+
+        Besides the usual properties, each node gets a _kind ("step" or
+        "item") and a _collection (the step or item collection name), and
+        the steps that ran get a _duration if the log had times.
+        """
+        item_shape = styles.shape('item')
+        def kind(n):
+            return "item" if self.property(n, 'shape') == item_shape else "step"
+        def collection(n):
+            return self.property(n, 'label', '').split(": ", 1)[0]
+        columns = {'_kind': kind, '_collection': collection}
+        if self.durations:
+            columns['_duration'] = self.durations.get
+        return CompactDAG.from_dag(self, columns)
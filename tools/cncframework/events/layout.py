@@ -0,0 +1,144 @@
+import json
+from array import array
+from cncframework.events.analysis import LevelAnalysis
+import cncframework.events.styles as styles
+
+class LayeredLayout(object):
+    """
+    Layered (Sugiyama-style) layout of an event DAG, for drawing big graphs
+    without Graphviz.
+
+    Each node goes in the row of its topological level (see LevelAnalysis),
+    and the order of the nodes within each level is then improved with a
+    few sweeps of the barycenter heuristic, alternately down (ordering each
+    level by the mean position of the nodes' parents) and up (by their
+    children), to reduce the edge crossings. The order with the fewest
+    crossings (between adjacent levels) is kept, since the log order that
+    the levels start with is often good already. Edges that span several
+    levels are drawn straight, without dummy nodes, so the cost of each
+    sweep is linear in the size of the graph (plus sorting each level).
+
+    x[row] and y[row] are the coordinates of each row of the frozen graph
+    (in units of node spacing, with each level centered on x = 0).
+    """
+    def __init__(self, graph, sweeps=4):
+        analysis = LevelAnalysis(graph)
+        self.graph = dag = analysis.dag
+        n = len(dag)
+        self.y = array('i', analysis.levels)
+        self.x = array('d', [0.0]) * n
+        # the rows of each level, in their current order
+        offsets = analysis.level_offsets
+        self.rows = [analysis.order[offsets[i]:offsets[i+1]] for i in xrange(analysis.depth)]
+        for rows in self.rows:
+            self._place(rows)
+        best, best_rows = self.crossings(), list(self.rows)
+        csr = dag.csr(reverse=True), dag.csr()
+        for sweep in xrange(sweeps):
+            if best == 0:
+                break
+            down = sweep % 2 == 0
+            neighbor_offsets, neighbors = csr[0 if down else 1]
+            levels = xrange(1, len(self.rows)) if down else xrange(len(self.rows) - 2, -1, -1)
+            for level in levels:
+                self.rows[level] = self._sort(self.rows[level], neighbor_offsets, neighbors)
+                self._place(self.rows[level])
+            crossings = self.crossings()
+            if crossings < best:
+                best, best_rows = crossings, list(self.rows)
+        if best_rows != self.rows:
+            self.rows = best_rows
+            for rows in self.rows:
+                self._place(rows)
+
+    def _place(self, rows):
+        """Set the x of each row in a level from its position in the level."""
+        x, mid = self.x, (len(rows) - 1) / 2.0
+        for i, row in enumerate(rows):
+            x[row] = i - mid
+
+    def _sort(self, rows, offsets, neighbors):
+        """Return the rows of a level in order of the barycenters of their neighbors."""
+        x = self.x
+        def barycenter(row):
+            lo, hi = offsets[row], offsets[row+1]
+            if lo == hi:
+                # nothing to go by, so stay put
+                return x[row]
+            total = 0.0
+            for k in xrange(lo, hi):
+                total += x[neighbors[k]]
+            return total / (hi - lo)
+        return array('i', sorted(rows, key=lambda row: (barycenter(row), x[row])))
+
+    def crossings(self):
+        """Return the number of crossings between edges that join adjacent levels."""
+        offsets, children = self.graph.csr()
+        x, y = self.x, self.y
+        total = 0
+        for rows in self.rows[:-1]:
+            # edges to the next level, by the x of their ends; count inversions
+            edges = sorted((x[row], x[children[k]]) for row in rows
+                           for k in xrange(offsets[row], offsets[row+1])
+                           if y[children[k]] == y[row] + 1)
+            ends = [end for _, end in edges]
+            total += _inversions(ends)
+        return total
+
+    def to_json(self):
+        """
+        Return the layout as compact JSON for the HTML viewer: columns of
+        node data (with the rows of the frozen graph as the indices), and
+        the edges as a flat list of row pairs.
+        """
+        dag = self.graph
+        n = len(dag)
+        colors, color_index = [], {}
+        def color(row):
+            c = dag.property(dag.node(row), 'color', 'black')
+            if c not in color_index:
+                color_index[c] = len(colors)
+                colors.append(c)
+            return color_index[c]
+        item_shape = styles.shape('item')
+        dashed = styles.style('prescribe')
+        offsets, children = dag.csr()
+        edges, prescribe = [], []
+        for row in xrange(n):
+            node = dag.node(row)
+            for k in xrange(offsets[row], offsets[row+1]):
+                if dag.edge_property(node, dag.node(children[k]), 'style') == dashed:
+                    prescribe.append(len(edges) // 2)
+                edges.extend((row, children[k]))
+        data = {
+            'ids': list(dag),
+            'x': [int(v) if v == int(v) else v for v in self.x],
+            'y': list(self.y),
+            'labels': [dag.property(node, 'label', str(node)) for node in dag],
+            'colors': colors,
+            'color': [color(row) for row in xrange(n)],
+            'item': [int(dag.property(node, 'shape') == item_shape) for node in dag],
+            'running': [int(dag.property(node, 'href', 0)) for node in dag],
+            'edges': edges,
+            'prescribe': prescribe,
+        }
+        # (the JSON goes in a <script>, so make sure it can't end it)
+        return json.dumps(data, separators=(',', ':')).replace("</", "<\\/")
+
+
+def _inversions(values):
+    """Count the pairs out of order in a list (by merge sort)."""
+    if len(values) < 2:
+        return 0
+    mid = len(values) // 2
+    left, right = values[:mid], values[mid:]
+    count = _inversions(left) + _inversions(right)
+    left.sort()
+    right.sort()
+    i = 0
+    for v in right:
+        # left values greater than v are out of order with it
+        while i < len(left) and left[i] <= v:
+            i += 1
+        count += len(left) - i
+    return count
@@ -0,0 +1,194 @@
+import sys, os, re, io, gzip, bz2, select, subprocess, time
+from collections import namedtuple
+
+# One line of a CnC event log, e.g. "PUT X @ 1, 2" (the tag is kept as-is).
+# Binary logs also give the time (in ns) and the worker (thread) of each event.
+Event = namedtuple('Event', ['action', 'label', 'tag', 'time', 'worker'])
+Event.__new__.__defaults__ = (None, None)
+
+# format: ACTION LABEL @ TAG
+_event_re = re.compile(r'([^\s]+) ([^\s]+) @ (.+)')
+
+def _split_event(line):
+    """Split a well-formed event line, or return None if it's not one."""
+    head, sep, tag = line.partition(" @ ")
+    if sep:
+        fields = head.split()
+        # exactly two fields, separated by a single space (like the regex)
+        if len(fields) == 2 and len(head) == len(fields[0]) + len(fields[1]) + 1 and head[len(fields[0])] == " ":
+            if tag.endswith("\n"):
+                tag = tag[:-1]
+            if tag:
+                return fields[0], fields[1], tag
+    return None
+
+def parse_event(line):
+    """
+    Parse a line from the event log into an Event.
+
+    Return None if the line isn't an event.
+    """
+    # fast path for well-formed lines (nearly all of them)
+    parts = _split_event(line)
+    if parts:
+        return Event(*parts)
+    # fall back to the regex for anything unusual
+    match = _event_re.match(line)
+    if match:
+        return Event(*match.groups())
+    return None
+
+
+class EventReader(object):
+    """
+    Iterate over the events in a stream of log lines (e.g. an open log file).
+
+    Lines are read lazily, so memory use doesn't depend on the log size.
+    Non-event lines (e.g. program output) are skipped. Counts of the lines
+    and events read so far are kept in line_count and event_count.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.line_count = 0
+        self.event_count = 0
+
+    def __iter__(self):
+        # this loop is the hot path for big logs, so the common case of
+        # _split_event is inlined, and the counts are kept in locals
+        new = tuple.__new__
+        lines, events = self.line_count, self.event_count
+        try:
+            for line in self.lines:
+                lines += 1
+                head, sep, tag = line.partition(" @ ")
+                if not sep:
+                    continue
+                fields = head.split()
+                if (len(fields) == 2 and len(head) == len(fields[0]) + len(fields[1]) + 1
+                        and head[len(fields[0])] == " " and len(tag) > 1):
+                    events += 1
+                    yield new(Event, (fields[0], fields[1], tag[:-1] if tag[-1] == "\n" else tag, None, None))
+                else:
+                    event = parse_event(line)
+                    if event:
+                        events += 1
+                        yield event
+        finally:
+            self.line_count, self.event_count = lines, events
+
+    def close(self):
+        """Close the underlying log (if it can be closed)."""
+        if hasattr(self.lines, 'close'):
+            self.lines.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _PipedLog(object):
+    """Read the output of a decompression command as a log file."""
+    def __init__(self, cmd):
+        try:
+            self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        except OSError as e:
+            raise IOError("Can't run {0} to decompress the log: {1}".format(cmd[0], e))
+
+    def __iter__(self):
+        return iter(self.proc.stdout)
+
+    def close(self):
+        # (the command reports its own errors on stderr)
+        self.proc.stdout.close()
+        self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_log(path):
+    """
+    Open an event log for reading, as an iterable of lines.
+
+    Logs compressed with gzip, bzip2 or xz are decompressed on the fly
+    (detected by their magic numbers), and "-" reads from stdin.
+    """
+    if path == "-":
+        return sys.stdin
+    with open(path, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith("\x1f\x8b"):
+        # buffering gzip's own readline makes it several times faster
+        return io.BufferedReader(gzip.open(path, 'rb'), 1 << 16)
+    elif magic.startswith("BZh"):
+        return bz2.BZ2File(path, 'r')
+    elif magic.startswith("\xfd7zXZ\x00"):
+        # no xz support in the Python 2 standard library
+        return _PipedLog(["xz", "-dc", path])
+    else:
+        return open(path, 'r')
+
+def tail_lines(f, poll=0.5, idle=None):
+    """
+    Yield the lines of a file that's still being written, forever (like
+    tail -f, but from the start of the file). Whenever there's nothing more
+    to read yet, call idle() (if given) and then wait poll seconds. A line
+    is only yielded once it's complete.
+    """
+    partial = ""
+    while True:
+        line = f.readline()
+        if line.endswith("\n"):
+            yield partial + line
+            partial = ""
+        else:
+            partial += line
+            if idle:
+                idle()
+            time.sleep(poll)
+            # (clear the EOF, so the next read sees any new data)
+            f.seek(0, 1)
+
+def pipe_lines(f, poll=0.5, idle=None):
+    """
+    Yield the lines of a pipe (e.g. stdin) until it's closed. Whenever
+    nothing more arrives for poll seconds, call idle() (if given). The pipe
+    is read with select and os.read rather than through the file's buffer,
+    which would wait for a full block before returning anything.
+    """
+    fd = f.fileno()
+    partial = ""
+    while True:
+        ready, _, _ = select.select([fd], [], [], poll)
+        if not ready:
+            if idle:
+                idle()
+            continue
+        data = os.read(fd, 1 << 16)
+        if not data:
+            break
+        lines = (partial + data).split("\n")
+        partial = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if partial:
+        yield partial
+
+def open_events(path):
+    """
+    Open a text or binary (CNC_DEBUG_BINLOG) event log, as an iterable of
+    Events that can also be used as a context manager (an EventReader over
+    open_log(path), or a BinaryLog).
+
+    For a binary log, path can be the CNC_DEBUG_BINLOG prefix or any of the
+    per-worker files.
+    """
+    from cncframework.events.binlog import BinaryLog, is_binary_log
+    if path != "-" and is_binary_log(path):
+        return BinaryLog(path)
+    return EventReader(open_log(path))
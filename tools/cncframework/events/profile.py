@@ -0,0 +1,96 @@
+from collections import namedtuple, defaultdict
+from cncframework.events.binlog import open_worker_logs
+
+# Reader for the step profiles written with CNC_PROFILE (see _cncProfileStep
+# in the generated cnc_common.c). The files have the same layout as the
+# binary event logs, with a record for each step instance that was enqueued
+# (prescribed) and for each one that ran. Times are in nanoseconds.
+
+MAGIC = "CNCPROF\0"
+SUFFIX = "prof"
+
+# start, end, collection id, worker, type, tag length, puts, gets, tag
+RECORD_FORMAT = "<QQIHBBII%dq"
+
+# record type codes (keep in sync with cnc_common.h)
+ENQUEUE, STEP = 1, 2
+
+
+class StepProfile(namedtuple('StepProfile', 'label tag worker enqueued start end puts gets')):
+    """
+    Timings of one step instance. The tag is a tuple, and enqueued is None
+    if the step wasn't prescribed from a step (or the context) of this run.
+    """
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def wait(self):
+        """Time from being prescribed to starting to run (or None)."""
+        return None if self.enqueued is None else self.start - self.enqueued
+
+
+def read_profile(path):
+    """
+    Return the StepProfiles of all the steps that ran, in start time order,
+    given the CNC_PROFILE prefix or any of the per-worker files.
+    """
+    workers = open_worker_logs(path, SUFFIX, MAGIC, RECORD_FORMAT)
+    try:
+        # the enqueue and the step records can be in different files, so
+        # read them all before matching them up on (collection, tag)
+        enqueued = {}
+        steps = []
+        for w in workers:
+            for record in w.records():
+                key = (record[2],) + record[8:8+record[5]]
+                if record[4] == ENQUEUE:
+                    enqueued.setdefault(key, record[0])
+                elif record[4] == STEP:
+                    steps.append((key, record, w.names))
+        profiles = [StepProfile(names[key[0]], key[1:], record[3], enqueued.get(key),
+                                record[0], record[1], record[6], record[7])
+                    for key, record, names in steps]
+    finally:
+        for w in workers:
+            w.close()
+    profiles.sort(key=lambda p: p.start)
+    return profiles
+
+
+def percentile(values, p):
+    """Return the p-th percentile (nearest rank) of a sorted list of values."""
+    if not values:
+        return None
+    # (ceil(p% of the count), in exact arithmetic for integer percentiles)
+    rank = int(-(-p * len(values) // 100)) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+CollectionSummary = namedtuple('CollectionSummary',
+        'label count total mean p50 p90 p99 max puts gets wait')
+
+def summarize(profiles):
+    """
+    Return a CollectionSummary of the step durations of each collection, in
+    decreasing order of total time. The wait is the mean time from being
+    prescribed to starting to run (None if that's unknown for every step).
+    """
+    by_label = defaultdict(list)
+    for p in profiles:
+        by_label[p.label].append(p)
+    summaries = []
+    for label, steps in by_label.iteritems():
+        durations = sorted(p.duration for p in steps)
+        waits = [p.wait for p in steps if p.wait is not None]
+        total = sum(durations)
+        summaries.append(CollectionSummary(label, len(steps), total,
+                float(total) / len(steps), percentile(durations, 50),
+                percentile(durations, 90), percentile(durations, 99), durations[-1],
+                sum(p.puts for p in steps), sum(p.gets for p in steps),
+                float(sum(waits)) / len(waits) if waits else None))
+    summaries.sort(key=lambda s: (-s.total, s.label))
+    return summaries
@@ -0,0 +1,187 @@
+import re
+from array import array
+from collections import deque
+from heapq import heappush, heappop
+from cncframework.events.compact import CompactDAG
+from cncframework.events.analysis import step_cost
+
+# Replay of event graphs on a number of virtual workers, to predict the
+# makespan of a run under different scheduling policies.
+
+class _FifoQueue(object):
+    """One shared queue of ready steps, oldest first."""
+    def __init__(self, workers, priority):
+        self.ready = deque()
+
+    def push(self, row, worker):
+        self.ready.append(row)
+
+    def pop(self, worker):
+        return self.ready.popleft()
+
+    def __len__(self):
+        return len(self.ready)
+
+
+class _StealingQueues(object):
+    """
+    A queue of ready steps per worker, like a work-stealing runtime: each
+    worker runs the newest of the steps it enabled, and when it has none,
+    steals the oldest step of the next worker that has some.
+    """
+    def __init__(self, workers, priority):
+        self.ready = [deque() for _ in xrange(workers)]
+        self.count = 0
+
+    def push(self, row, worker):
+        self.ready[worker].append(row)
+        self.count += 1
+
+    def pop(self, worker):
+        self.count -= 1
+        if self.ready[worker]:
+            return self.ready[worker].pop()
+        n = len(self.ready)
+        for i in xrange(1, n):
+            victim = self.ready[(worker + i) % n]
+            if victim:
+                return victim.popleft()
+
+    def __len__(self):
+        return self.count
+
+
+class _PriorityQueue(object):
+    """One shared queue of ready steps, highest priority first (then oldest)."""
+    def __init__(self, workers, priority):
+        self.ready = []
+        self.priority = priority
+        self.count = 0
+
+    def push(self, row, worker):
+        self.count += 1
+        heappush(self.ready, (-self.priority[row], self.count, row))
+
+    def pop(self, worker):
+        return heappop(self.ready)[2]
+
+    def __len__(self):
+        return len(self.ready)
+
+
+POLICIES = {'fifo': _FifoQueue, 'lifo': _StealingQueues, 'priority': _PriorityQueue}
+
+
+class Simulator(object):
+    """
+    Discrete-event simulation of running an event graph (a frozen
+    EventGraph) on P workers.
+
+    Each step runs on one worker for its cost (see analysis.step_cost, or
+    give a cost function), once all its parents are done; items and other
+    nodes that cost nothing are done as soon as their parents are. Idle
+    workers take ready steps in the order given by the policy (see
+    POLICIES). The priority function (node -> number, higher runs first) is
+    only used by the priority policy.
+    """
+    def __init__(self, graph, cost=None, priority=None):
+        if not isinstance(graph, CompactDAG):
+            graph = graph.freeze()
+        self.graph = graph
+        n = len(graph)
+        if cost is None:
+            self.timed, cost = step_cost(graph)
+        else:
+            self.timed = True
+        self.cost = array('d', (cost(graph.node(row)) for row in xrange(n)))
+        self.priority = array('d', (priority(graph.node(row)) if priority else 0
+                                    for row in xrange(n)))
+        self.child_offsets, self.children = graph.csr()
+        parent_offsets, _ = graph.csr(reverse=True)
+        self.in_degree = array('i', (parent_offsets[row+1] - parent_offsets[row]
+                                     for row in xrange(n)))
+
+    @property
+    def work(self):
+        return sum(self.cost)
+
+    def run(self, workers, policy='fifo'):
+        """Return the makespan of running the graph on the given number of workers."""
+        cost, offsets, children = self.cost, self.child_offsets, self.children
+        pending = array('i', self.in_degree)
+        ready = POLICIES[policy](workers, self.priority)
+        done = [0]
+        def finish(row, worker):
+            # mark a node done, along with any free nodes that enables
+            stack = [row]
+            while stack:
+                r = stack.pop()
+                done[0] += 1
+                for k in xrange(offsets[r], offsets[r+1]):
+                    child = children[k]
+                    pending[child] -= 1
+                    if pending[child] == 0:
+                        if cost[child] > 0:
+                            ready.push(child, worker)
+                        else:
+                            stack.append(child)
+        for row in [row for row in xrange(len(cost)) if pending[row] == 0]:
+            if cost[row] > 0:
+                ready.push(row, 0)
+            else:
+                finish(row, 0)
+        # (finish time, worker, row) of the running steps
+        running = []
+        # the most recently freed worker is last (and gets work first)
+        idle = range(workers - 1, -1, -1)
+        time = 0.0
+        while True:
+            while idle and len(ready):
+                worker = idle.pop()
+                row = ready.pop(worker)
+                heappush(running, (time + cost[row], worker, row))
+            if not running:
+                break
+            time, worker, row = heappop(running)
+            idle.append(worker)
+            finish(row, worker)
+        if done[0] != len(cost):
+            raise ValueError("Graph has a cycle ({0} nodes never became ready)".format(
+                    len(cost) - done[0]))
+        return time
+
+
+def spec_priorities(graph, specfile, tuningfiles):
+    """
+    Return a priority function for the nodes of a frozen event graph, from
+    the priority tunings of the steps in a CnC graph spec and its tuning
+    specs.
+
+    Priority expressions can use the step's tag and $RANKS (taken to be 1),
+    with C integer arithmetic and logic (but not ?: or the context).
+    Steps without a priority tuning (and items) get priority 0.
+    """
+    from cncframework import graph as cncgraph, parser
+    g = cncgraph.CnCGraph("sim", parser.cncGraphSpec.parseFile(specfile, parseAll=True))
+    for tuningfile in tuningfiles:
+        g.addTunings(parser.cncTuningSpec.parseFile(tuningfile, parseAll=True))
+    fns = {}
+    for name, step in g.stepLikes.iteritems():
+        expr = step.attrs.get('priority')
+        if expr is None:
+            continue
+        expr = str(expr).strip().replace("$RANKS", "1")
+        if re.search(r'[#@?]|numProcs', expr):
+            raise ValueError("Can't simulate the priority of {0}: {1}".format(name, expr))
+        expr = re.sub(r'!(?!=)', ' not ', expr.replace("&&", " and ").replace("||", " or "))
+        fns[name] = (step.tag, compile(expr, name, 'eval'))
+    def priority(node):
+        if graph.property(node, '_kind') != "step":
+            return 0
+        name, _, tag = graph.property(node, 'label', '').partition(": ")
+        if name not in fns:
+            return 0
+        tagNames, code = fns[name]
+        values = [int(x) for x in tag.split(",")] if tag else []
+        return eval(code, {}, dict(zip(tagNames, values)))
+    return priority
@@ -0,0 +1,316 @@
+import os, sys, time, resource
+from collections import defaultdict, deque
+from multiprocessing import Pool
+from cncframework.events.logs import EventReader, open_events, open_log, pipe_lines, tail_lines
+
+def parse_tag(tag):
+    """Parse a tag like "1, 2" into a tuple of ints (or keep it as a string)."""
+    try:
+        return tuple(map(int, tag.split(", ")))
+    except ValueError:
+        return tag
+
+
+class StallState(object):
+    """
+    Item and step state from (part of) an event log, for finding stalled steps.
+
+    Tracks the items that were put, and the steps that were prescribed or
+    running (but not done), with the item dependences of each prescribed step.
+    The GET-DEPs for a step come right before its PRESCRIBED, from the same
+    worker, so they're tracked per worker (for binary logs of parallel runs).
+
+    A log can be split into consecutive chunks, with a StallState for each,
+    and then the states merged in log order give the same result as reading
+    the whole log. For that, each state keeps the GET-DEPs that come after
+    its last PRESCRIBED (they belong to the next chunk's first prescribed
+    step), and which steps its leading GET-DEPs went to.
+    """
+    def __init__(self, start=False):
+        # at the start of the log, there's no earlier chunk for DONE to refer to
+        self.start = start
+        self.items = defaultdict(set)
+        # collection -> {tag: [(item collection, item tag)]}, or None for
+        # steps done in this chunk that started in an earlier one
+        self.steps = defaultdict(dict)
+        # worker -> GET-DEPs not yet claimed by a PRESCRIBED
+        self.deps = defaultdict(list)
+        # steps that got the GET-DEPs from the start of the chunk (-> worker),
+        # as long as nothing else has happened to the step since
+        self.first = {}
+        # workers that prescribed a step in this chunk
+        self.prescribed = set()
+        self.unknown = []
+
+    def process(self, event):
+        action, coll, worker = event.action, event.label, event.worker
+        if action == 'PUT':
+            self.items[coll].add(parse_tag(event.tag))
+        elif action == 'GET-DEP':
+            self.deps[worker].append((coll, parse_tag(event.tag)))
+        elif action in ('PRESCRIBED', 'RUNNING', 'DONE'):
+            tag = parse_tag(event.tag)
+            self.first.pop((coll, tag), None)
+            if action == 'PRESCRIBED':
+                self.steps[coll][tag] = self.deps.pop(worker, [])
+                if worker not in self.prescribed:
+                    self.prescribed.add(worker)
+                    self.first[(coll, tag)] = worker
+            elif action == 'RUNNING':
+                self.steps[coll][tag] = []
+            elif self.start:
+                self.steps[coll].pop(tag, None)
+            else:
+                self.steps[coll][tag] = None
+        else:
+            self.unknown.append(action)
+
+    def read(self, events):
+        """Process an iterable of events; return self."""
+        for event in events:
+            self.process(event)
+        return self
+
+    def merge(self, later):
+        """Add the state of the chunk of log right after this one."""
+        for coll, tags in later.items.iteritems():
+            self.items[coll].update(tags)
+        for (coll, tag), worker in later.first.iteritems():
+            later.steps[coll][tag] = self.deps[worker] + later.steps[coll][tag]
+        for worker in later.prescribed.union(later.deps):
+            if worker in later.prescribed:
+                self.deps[worker] = later.deps[worker]
+            else:
+                self.deps[worker].extend(later.deps[worker])
+        for coll, tags in later.steps.iteritems():
+            steps = self.steps[coll]
+            for tag, deps in tags.iteritems():
+                if deps is not None:
+                    steps[tag] = deps
+                elif self.start:
+                    steps.pop(tag, None)
+                else:
+                    steps[tag] = None
+        self.prescribed.update(later.prescribed)
+        self.unknown.extend(later.unknown)
+
+    def report(self):
+        """Return the lines of the stalled/running steps report."""
+        stalled, running = [], []
+        for collname, coll in self.steps.iteritems():
+            for tag, stepdeps in coll.iteritems():
+                if stepdeps is None:
+                    continue
+                missing = [dep for dep in sorted(stepdeps)
+                           if dep[1] not in self.items.get(dep[0], ())]
+                if missing:
+                    stalled.append((collname, tag, missing))
+                else:
+                    running.append((collname, tag))
+        return stall_report(stalled, running)
+
+
+def stall_report(stalled, running=None):
+    """
+    Return the lines of the stalled/running steps report, from the
+    (collection, tag, missing items) of the stalled steps and the
+    (collection, tag) of the running ones (left out if None).
+    """
+    def withFinalizerLast(step):
+        return (step[0].endswith("_finalize"), step[0], step[1])
+    lines = ["*** STALLED STEPS ***"]
+    lines.extend("%s %s %s" % step for step in sorted(stalled, key=withFinalizerLast))
+    if running is not None:
+        lines.append("")
+        lines.append("*** RUNNING STEPS ***")
+        lines.extend("%s %s" % step for step in sorted(running))
+    return lines
+
+
+class StallTracker(object):
+    """
+    Stalled steps of a log that's still being written, kept up to date
+    event by event (for following a long run, see follow_stalls).
+
+    Unlike StallState, which works out the missing items of each step when
+    it makes the report, this keeps the missing items of each prescribed
+    step, and the steps waiting on each missing item, so each event is O(1)
+    work (amortized over the dependences of the steps), and the stalled
+    steps can be listed at any time without going through the whole state.
+    """
+    def __init__(self):
+        self.items = defaultdict(set)
+        # (collection, tag) of the steps not done -> their missing items
+        # (empty once they're running, or all their items were put)
+        self.steps = {}
+        # (collection, tag) of the items that aren't put yet -> the steps
+        # that got them (possibly stale, if a step was prescribed again)
+        self.waiting = defaultdict(list)
+        # worker -> GET-DEPs for the next step it prescribes
+        self.deps = defaultdict(list)
+        self.unknown = []
+        self.event_count = 0
+
+    def process(self, event):
+        self.event_count += 1
+        action, coll = event.action, event.label
+        if action == 'GET-DEP':
+            self.deps[event.worker].append((coll, parse_tag(event.tag)))
+            return
+        key = (coll, parse_tag(event.tag))
+        if action == 'PUT':
+            self.items[coll].add(key[1])
+            for step in self.waiting.pop(key, ()):
+                missing = self.steps.get(step)
+                if missing:
+                    missing.discard(key)
+        elif action == 'PRESCRIBED':
+            missing = set(dep for dep in self.deps.pop(event.worker, ())
+                          if dep[1] not in self.items.get(dep[0], ()))
+            for dep in missing:
+                self.waiting[dep].append(key)
+            self.steps[key] = missing
+        elif action == 'RUNNING':
+            self.steps[key] = set()
+        elif action == 'DONE':
+            self.steps.pop(key, None)
+        else:
+            self.unknown.append(action)
+
+    def stalled(self):
+        """Return the (collection, tag, sorted missing items) of the stalled steps."""
+        return [(coll, tag, sorted(missing))
+                for (coll, tag), missing in self.steps.iteritems() if missing]
+
+    def running(self):
+        """Return the (collection, tag) of the steps that aren't stalled or done."""
+        return [step for step, missing in self.steps.iteritems() if not missing]
+
+    def missing_items(self):
+        """Return the number of items that stalled steps are waiting on, by collection."""
+        # (not the keys of waiting, which can be stale)
+        counts = defaultdict(int)
+        for coll, _ in set().union(*self.steps.itervalues()):
+            counts[coll] += 1
+        return counts
+
+
+def _lines_in_range(path, start, end):
+    """Yield the lines of a file that start in the byte range [start, end)."""
+    with open(path, 'rb') as f:
+        if start > 0:
+            # skip the line that started in the previous range
+            f.seek(start - 1)
+            start += len(f.readline()) - 1
+        pos = start
+        for line in f:
+            if pos >= end:
+                break
+            pos += len(line)
+            yield line
+
+def _read_range(job):
+    path, start, end = job
+    return StallState().read(EventReader(_lines_in_range(path, start, end)))
+
+def _read_lines(lines):
+    return StallState().read(EventReader(lines))
+
+def _limit_memory(limit):
+    if limit:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _chunk_jobs(log, chunk_size):
+    """
+    Split a log into jobs for the pool: byte ranges of a plain file, or
+    batches of lines read here for anything that can't seek (compressed
+    logs, stdin), so the parsing is still done in parallel.
+    """
+    if isinstance(log, file) and log is not sys.stdin:
+        size = os.fstat(log.fileno()).st_size
+        return _read_range, ((log.name, start, min(start + chunk_size, size))
+                             for start in xrange(0, size, chunk_size))
+    def batches():
+        batch, batch_bytes = [], 0
+        for line in log:
+            batch.append(line)
+            batch_bytes += len(line)
+            if batch_bytes >= chunk_size:
+                yield batch
+                batch, batch_bytes = [], 0
+        if batch:
+            yield batch
+    return _read_lines, batches()
+
+def find_stalls(path, jobs=1, chunk_size=64 << 20, mem_limit=None):
+    """
+    Read an event log (see logs.open_events) and return its merged StallState.
+
+    With jobs > 1, a text log is split into chunks of about chunk_size bytes
+    that are parsed in a pool of that many processes, and merged in order.
+    At most two chunks per process are in flight at once, to bound memory
+    use. (Binary logs are always read here, since they're cheap to parse.)
+    If mem_limit is given, the address space of each process is limited to
+    that many bytes (so running out gives a MemoryError rather than swapping
+    the machine to a halt).
+    """
+    _limit_memory(mem_limit)
+    with open_events(path) as events:
+        if jobs <= 1 or not isinstance(events, EventReader):
+            return StallState(start=True).read(events)
+        return _find_stalls_parallel(events.lines, jobs, chunk_size)
+
+def _find_stalls_parallel(log, jobs, chunk_size):
+    fn, chunks = _chunk_jobs(log, chunk_size)
+    state = StallState(start=True)
+    pool = Pool(jobs)
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(fn, (chunk,)))
+            if len(pending) >= 2 * jobs:
+                state.merge(pending.popleft().get())
+        while pending:
+            state.merge(pending.popleft().get())
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return state
+
+def follow_stalls(path, snapshot, interval=10.0, poll=0.5):
+    """
+    Follow a text event log that's still being written (like tail -f), with
+    a StallTracker, and call snapshot(tracker) every interval seconds.
+    "-" reads stdin until it's closed; files are followed until interrupted
+    (with Ctrl-C). Either way, snapshots keep coming while the log is idle
+    (e.g. once a run has deadlocked), and the tracker is returned at the end.
+    """
+    from cncframework.events.binlog import is_binary_log
+    tracker = StallTracker()
+    last = [time.time()]
+    def tick():
+        now = time.time()
+        if now - last[0] >= interval:
+            last[0] = now
+            snapshot(tracker)
+    if path == "-":
+        lines = pipe_lines(sys.stdin, poll, tick)
+    else:
+        log = None if is_binary_log(path) else open_log(path)
+        if not isinstance(log, file):
+            if log:
+                log.close()
+            raise IOError("Can't follow {0}: only plain text logs can be followed".format(path))
+        lines = tail_lines(log, poll, tick)
+    try:
+        for event in EventReader(lines):
+            tracker.process(event)
+            # (a busy log may never be idle, so check the clock now and then)
+            if tracker.event_count & 0x3ff == 0:
+                tick()
+    except KeyboardInterrupt:
+        pass
+    return tracker
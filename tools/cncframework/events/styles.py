@@ -40,8 +40,9 @@ def color(event, key=None):
         raise KeyError("Expected a key to choose color.")
     # randomly pick a color if we haven't seen this event,key pair
     # otherwise return what we saw last time
-    choice = _color_key_cache.get((event,key), random.choice(c))
-    _color_key_cache[(event,key)] = choice
+    choice = _color_key_cache.get((event,key))
+    if choice is None:
+        choice = _color_key_cache[(event,key)] = random.choice(c)
     return choice
 
 def shape(node_type):
@@ -1,8 +1,9 @@
 /**
- * Return an object with methods to provide animations for the dag.
+ * Return an object with methods to provide animations for the dag, drawn
+ * by the given view (see views.js).
  * Assumes that the node id's are distinct nonnegative numbers.
  */
-function Animate(dag) {
+function Animate(dag, view) {
     "use strict";
     // time between showing nodes (milliseconds)
     var timestep = 100;
@@ -70,46 +71,37 @@ function Animate(dag) {
         return m;
     })();
 
-    function nodeDom(node_id) {
-        // Return the DOM node for the given graph node.
-        return dag.property(node_id, '_dom');
-    }
-    function edgeDom(from, to) {
-        // Return the DOM node for the given graph edge.
-        return dag.edgeProperty(from, to, '_dom');
-    }
-
     function hide(node1, node2) {
-        // Set node or edge style to display:none
+        // Hide a node or an edge.
         // If one arg given, hide node. If two, hide edge.
         if (node2 === undefined)
-            nodeDom(node1).style.display = 'none';
+            view.setNodeVisible(node1, false);
         else
-            edgeDom(node1, node2).style.display = 'none'
+            view.setEdgeVisible(node1, node2, false);
     }
 
     function show(node1, node2) {
-        // Set node or edge style to display:block
+        // Show a node or an edge.
         // If one arg given, show node. If two, show edge.
         if (node2 === undefined) {
-            nodeDom(node1).style.display = 'block';
+            view.setNodeVisible(node1, true);
             if (autoscroll)
                 scrollTo(node1);
         }
         else
-            edgeDom(node1, node2).style.display = 'block'
+            view.setEdgeVisible(node1, node2, true);
     }
 
     function connect(node) {
         // Set the opacity of the node to 1.
-        nodeDom(node).style.opacity = '1';
+        view.setNodeOpacity(node, 1);
         if (autoscroll)
             scrollTo(node);
     }
 
     function disconnect(node) {
         // Set the opacity of the node to 0.4.
-        nodeDom(node).style.opacity = '0.4';
+        view.setNodeOpacity(node, 0.4);
     }
 
     function onAll(onNodes, onEdges) {
@@ -145,17 +137,8 @@ function Animate(dag) {
         current_time = max_time;
     }
     function scrollTo(node) {
-        // Scroll the window to this node.
-        // If the node is already visible, do not scroll.
-        // Otherwise move the viewport such that the node is at top of screen.
-        var d = nodeDom(node),
-            r = d.getBoundingClientRect();
-        // check that node is not in current viewport, then scroll.
-        if (r.top < 0 ||
-                r.left < 0 ||
-                r.bottom > window.innerHeight ||
-                r.right > window.innerWidth)
-            window.scrollTo(r.left - r.width, r.top - r.height);
+        // Scroll the view to this node (if it's not already in view).
+        view.scrollTo(node);
     }
     function showNext() {
         // Show the next node and any induced edges.
@@ -55,8 +55,16 @@
         return g;
     }
 
-    var dag = svgToDAG(document.querySelector("#image_data > svg")),
-        animator = Animate(dag);
+    var dag, view;
+    if (typeof LAYOUT !== "undefined") {
+        // native layout, drawn on a canvas
+        dag = layoutToDAG(LAYOUT);
+        view = CanvasView(LAYOUT, document.querySelector("#graph_canvas"));
+    } else {
+        dag = svgToDAG(document.querySelector("#image_data > svg"));
+        view = SvgView(dag);
+    }
+    var animator = Animate(dag, view);
     animator.hideAll();
     animator.showInOrder();
     // Attach controls to the animations.
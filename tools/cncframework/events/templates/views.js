@@ -0,0 +1,316 @@
+/**
+ * Views draw the graph for the animations (see animations.js). Each has
+ * setNodeVisible(node, bool), setEdgeVisible(from, to, bool),
+ * setNodeOpacity(node, opacity) and scrollTo(node).
+ */
+
+/**
+ * View of a graph drawn by Graphviz as an inline SVG, where the DOM node
+ * of each graph node and edge is in its "_dom" property.
+ */
+function SvgView(dag) {
+    "use strict";
+    function setNodeVisible(node, visible) {
+        dag.property(node, '_dom').style.display = visible ? 'block' : 'none';
+    }
+    function setEdgeVisible(from, to, visible) {
+        dag.edgeProperty(from, to, '_dom').style.display = visible ? 'block' : 'none';
+    }
+    function setNodeOpacity(node, opacity) {
+        dag.property(node, '_dom').style.opacity = String(opacity);
+    }
+    function scrollTo(node) {
+        // If the node is already visible, do not scroll.
+        // Otherwise move the viewport such that the node is at top of screen.
+        var r = dag.property(node, '_dom').getBoundingClientRect();
+        if (r.top < 0 ||
+                r.left < 0 ||
+                r.bottom > window.innerHeight ||
+                r.right > window.innerWidth)
+            window.scrollTo(r.left - r.width, r.top - r.height);
+    }
+    return {
+        setNodeVisible: setNodeVisible,
+        setEdgeVisible: setEdgeVisible,
+        setNodeOpacity: setNodeOpacity,
+        scrollTo: scrollTo,
+    };
+}
+
+/**
+ * Return a DAG (see dag.js) for a layout from the Python LayeredLayout, with
+ * the same node properties as the SVG version (type, and running for
+ * steps), plus prescribe on the edges.
+ */
+function layoutToDAG(layout) {
+    "use strict";
+    var g = DAG(),
+        ids = layout.ids,
+        edges = layout.edges,
+        prescribe = {};
+    for (var i = 0; i < layout.prescribe.length; i++)
+        prescribe[layout.prescribe[i]] = true;
+    for (var row = 0; row < ids.length; row++) {
+        g.addNode(ids[row]);
+        g.setProperty(ids[row], "type", layout.item[row] ? "item" : "step");
+        if (layout.running[row])
+            g.setProperty(ids[row], "running", layout.running[row]);
+    }
+    for (var e = 0; e < edges.length / 2; e++) {
+        var from = ids[edges[2*e]], to = ids[edges[2*e+1]];
+        g.addEdge(from, to);
+        g.setEdgeProperty(from, to, "prescribe", !!prescribe[e]);
+    }
+    return g;
+}
+
+/**
+ * View of a layout from the Python LayeredLayout, drawn on a canvas.
+ *
+ * Only the part of the graph in the viewport is drawn: the nodes are
+ * indexed by level and by x within each level, so finding the visible ones
+ * doesn't depend on the size of the graph. Edges are drawn if either end
+ * is visible. Changes to the nodes and edges just mark the view as dirty,
+ * and it's redrawn (at most) once per animation frame. Drag to pan, and
+ * use the mouse wheel to zoom.
+ */
+function CanvasView(layout, canvas) {
+    "use strict";
+    // size of a layout unit at scale 1 (pixels)
+    var UNIT_X = 70, UNIT_Y = 60, NODE_W = 56, NODE_H = 24,
+        // above this many nodes in view, draw just the nodes, as dots
+        MAX_DETAILED = 20000;
+    var ids = layout.ids,
+        n = ids.length,
+        x = layout.x,
+        y = layout.y,
+        ctx = canvas.getContext("2d"),
+        rowOf = {},
+        nodeVisible = new Uint8Array(n),
+        nodeOpacity = new Float32Array(n),
+        edgeCount = layout.edges.length / 2,
+        edgeVisible = new Uint8Array(edgeCount),
+        edgeDashed = new Uint8Array(edgeCount),
+        // CSR index of the edges out of (and into) each row
+        outStart = new Int32Array(n + 1),
+        inStart = new Int32Array(n + 1),
+        inEdges = new Int32Array(edgeCount),
+        // rows sorted by level then x, and where each level starts
+        sorted = new Int32Array(n),
+        levelStart = [],
+        // rows being drawn, in the current frame
+        inView = new Uint8Array(n),
+        // view transform: screen = (layout * unit) * scale + offset
+        scale = 1, offsetX = 0, offsetY = 20,
+        dirty = false;
+
+    (function index() {
+        var e, row, i;
+        for (row = 0; row < n; row++) {
+            rowOf[ids[row]] = row;
+            nodeVisible[row] = 1;
+            nodeOpacity[row] = 1;
+        }
+        for (e = 0; e < edgeCount; e++) {
+            edgeVisible[e] = 1;
+            outStart[layout.edges[2*e] + 1]++;
+            inStart[layout.edges[2*e+1] + 1]++;
+        }
+        for (i = 0; i < layout.prescribe.length; i++)
+            edgeDashed[layout.prescribe[i]] = 1;
+        for (row = 0; row < n; row++) {
+            outStart[row+1] += outStart[row];
+            inStart[row+1] += inStart[row];
+        }
+        var fill = new Int32Array(inStart.subarray(0, n));
+        for (e = 0; e < edgeCount; e++)
+            inEdges[fill[layout.edges[2*e+1]]++] = e;
+        for (row = 0; row < n; row++)
+            sorted[row] = row;
+        Array.prototype.sort.call(sorted, function(a, b) {
+            return (y[a] - y[b]) || (x[a] - x[b]);
+        });
+        for (i = 0; i < n; i++)
+            if (i === 0 || y[sorted[i]] !== y[sorted[i-1]])
+                levelStart[y[sorted[i]]] = i;
+        levelStart.push(n);
+    })();
+
+    function screenX(row) { return x[row] * UNIT_X * scale + offsetX; }
+    function screenY(row) { return y[row] * UNIT_Y * scale + offsetY; }
+
+    function lowerBound(lo, hi, value) {
+        // first index in sorted[lo, hi) with x >= value
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (x[sorted[mid]] < value) lo = mid + 1; else hi = mid;
+        }
+        return lo;
+    }
+
+    function visibleRows() {
+        // Return the rows in (or near) the viewport.
+        var margin = NODE_W,
+            xmin = (-offsetX - margin) / (UNIT_X * scale),
+            xmax = (canvas.width - offsetX + margin) / (UNIT_X * scale),
+            lmin = Math.max(0, Math.floor((-offsetY - margin) / (UNIT_Y * scale))),
+            lmax = Math.min(levelStart.length - 2, Math.ceil((canvas.height - offsetY + margin) / (UNIT_Y * scale))),
+            rows = [];
+        for (var level = lmin; level <= lmax; level++) {
+            var end = levelStart[level+1];
+            for (var i = lowerBound(levelStart[level], end, xmin); i < end && x[sorted[i]] <= xmax; i++)
+                rows.push(sorted[i]);
+        }
+        return rows;
+    }
+
+    function drawEdge(e) {
+        var from = layout.edges[2*e], to = layout.edges[2*e+1];
+        if (!edgeVisible[e] || !nodeVisible[from] || !nodeVisible[to]) return;
+        ctx.setLineDash(edgeDashed[e] ? [4, 3] : []);
+        ctx.globalAlpha = Math.min(nodeOpacity[from], nodeOpacity[to]);
+        ctx.beginPath();
+        ctx.moveTo(screenX(from), screenY(from) + NODE_H * scale / 2);
+        ctx.lineTo(screenX(to), screenY(to) - NODE_H * scale / 2);
+        ctx.stroke();
+    }
+
+    function drawNode(row, detailed) {
+        var cx = screenX(row), cy = screenY(row),
+            w = NODE_W * scale, h = NODE_H * scale;
+        ctx.globalAlpha = nodeOpacity[row];
+        ctx.strokeStyle = layout.colors[layout.color[row]];
+        if (!detailed) {
+            ctx.fillStyle = ctx.strokeStyle;
+            ctx.fillRect(cx - 1, cy - 1, 2, 2);
+            return;
+        }
+        ctx.setLineDash([]);
+        ctx.beginPath();
+        if (layout.item[row])
+            ctx.rect(cx - w / 2, cy - h / 2, w, h);
+        else
+            ctx.ellipse(cx, cy, w / 2, h / 2, 0, 0, 2 * Math.PI);
+        ctx.fillStyle = "white";
+        ctx.fill();
+        ctx.stroke();
+        if (scale >= 0.5) {
+            ctx.fillStyle = "black";
+            ctx.fillText(layout.labels[row], cx, cy, w - 4);
+        }
+    }
+
+    function draw() {
+        dirty = false;
+        ctx.setTransform(1, 0, 0, 1, 0, 0);
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        ctx.font = Math.round(11 * scale) + "px sans-serif";
+        ctx.textAlign = "center";
+        ctx.textBaseline = "middle";
+        var rows = visibleRows(),
+            detailed = rows.length <= MAX_DETAILED,
+            i, k, row;
+        if (detailed) {
+            ctx.strokeStyle = "#555";
+            ctx.lineWidth = 1;
+            for (i = 0; i < rows.length; i++)
+                inView[rows[i]] = 1;
+            for (i = 0; i < rows.length; i++) {
+                row = rows[i];
+                for (k = outStart[row]; k < outStart[row+1]; k++)
+                    drawEdge(k);
+                // edges from nodes out of view (the rest were drawn above)
+                for (k = inStart[row]; k < inStart[row+1]; k++)
+                    if (!inView[layout.edges[2*inEdges[k]]])
+                        drawEdge(inEdges[k]);
+            }
+            for (i = 0; i < rows.length; i++)
+                inView[rows[i]] = 0;
+        }
+        for (i = 0; i < rows.length; i++)
+            if (nodeVisible[rows[i]])
+                drawNode(rows[i], detailed);
+        ctx.globalAlpha = 1;
+    }
+
+    function redraw() {
+        // Schedule a redraw (once per frame, however many changes there are).
+        if (!dirty) {
+            dirty = true;
+            window.requestAnimationFrame(draw);
+        }
+    }
+
+    function edgeIndex(from, to) {
+        var f = rowOf[from], t = rowOf[to];
+        for (var e = outStart[f]; e < outStart[f+1]; e++)
+            if (layout.edges[2*e+1] === t) return e;
+        return -1;
+    }
+
+    function setNodeVisible(node, visible) {
+        nodeVisible[rowOf[node]] = visible ? 1 : 0;
+        redraw();
+    }
+    function setEdgeVisible(from, to, visible) {
+        var e = edgeIndex(from, to);
+        if (e >= 0) edgeVisible[e] = visible ? 1 : 0;
+        redraw();
+    }
+    function setNodeOpacity(node, opacity) {
+        nodeOpacity[rowOf[node]] = opacity;
+        redraw();
+    }
+    function scrollTo(node) {
+        // Center the view on the node, if it's not in view already.
+        var row = rowOf[node], sx = screenX(row), sy = screenY(row);
+        if (sx < 0 || sy < 0 || sx > canvas.width || sy > canvas.height) {
+            offsetX += canvas.width / 2 - sx;
+            offsetY += canvas.height / 2 - sy;
+            redraw();
+        }
+    }
+
+    function resize() {
+        canvas.width = window.innerWidth;
+        canvas.height = window.innerHeight;
+        redraw();
+    }
+
+    (function attach() {
+        var dragging = null;
+        canvas.addEventListener('mousedown', function(event) {
+            dragging = {x: event.clientX, y: event.clientY};
+        });
+        window.addEventListener('mouseup', function() {
+            dragging = null;
+        });
+        window.addEventListener('mousemove', function(event) {
+            if (!dragging) return;
+            offsetX += event.clientX - dragging.x;
+            offsetY += event.clientY - dragging.y;
+            dragging = {x: event.clientX, y: event.clientY};
+            redraw();
+        });
+        canvas.addEventListener('wheel', function(event) {
+            // zoom around the mouse position
+            var factor = event.deltaY < 0 ? 1.2 : 1 / 1.2;
+            offsetX = event.clientX - (event.clientX - offsetX) * factor;
+            offsetY = event.clientY - (event.clientY - offsetY) * factor;
+            scale *= factor;
+            event.preventDefault();
+            redraw();
+        });
+        window.addEventListener('resize', resize);
+        // start with the top of the graph centered
+        offsetX = window.innerWidth / 2;
+        resize();
+    })();
+
+    return {
+        setNodeVisible: setNodeVisible,
+        setEdgeVisible: setEdgeVisible,
+        setNodeOpacity: setNodeOpacity,
+        scrollTo: scrollTo,
+    };
+}
@@ -0,0 +1,108 @@
+import json
+from collections import defaultdict
+import cncframework.events.actions as actions
+
+# (json.dumps with non-default options makes a new encoder on every call)
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+# Export of CnC event logs as Chrome trace-event JSON (for chrome://tracing,
+# Perfetto, etc.): each worker is a thread track, each step instance a
+# slice from RUNNING to DONE, and each item put -> get a flow arrow from
+# the step that put the item to the step that got it (see the "Trace Event
+# Format" spec for the JSON).
+
+class TraceWriter(object):
+    """
+    Write the trace of an event log to a file, one event at a time.
+
+    Nothing is buffered apart from what's needed to draw the flows (the time
+    and worker of each item put, and the GET-DEPs of each step until it
+    runs), so the trace can be much bigger than memory. The trace events
+    aren't in time order (a flow is written when its consumer starts), but
+    the viewers sort them anyway.
+
+    Events without a time (from text logs) are given one microsecond per
+    event, in log order, and events without a worker go on worker 0.
+    """
+    def __init__(self, out, pid=1, name="CnC"):
+        self.out = out
+        self.pid = pid
+        self._workers = set()
+        # (item collection, tag) -> (time, worker) of its put
+        self._puts = {}
+        # worker -> GET-DEPs for the next step it prescribes
+        self._deps = defaultdict(list)
+        # (step collection, tag) -> its GET-DEPs
+        self._step_deps = {}
+        self.flow_count = 0
+        self.event_count = 0
+        # time of the first event (so the trace starts at 0)
+        self._start = None
+        self.out.write('{"displayTimeUnit":"ns","traceEvents":[\n')
+        self._first = True
+        self._write(ph="M", name="process_name", pid=pid, args={"name": name})
+
+    def _write(self, **event):
+        if not self._first:
+            self.out.write(",\n")
+        self._first = False
+        self.out.write(_encode(event))
+
+    def _track(self, worker):
+        tid = worker or 0
+        if tid not in self._workers:
+            self._workers.add(tid)
+            self._write(ph="M", name="thread_name", pid=self.pid, tid=tid,
+                        args={"name": "worker %d" % tid})
+        return tid
+
+    def add(self, event):
+        """Add an Event (see logs.Event) to the trace."""
+        self.event_count += 1
+        # trace times are in microseconds
+        if event.time is None:
+            ts = self.event_count
+        else:
+            if self._start is None:
+                self._start = event.time
+            ts = (event.time - self._start) / 1000.0
+        action, key = event.action, (event.label, event.tag)
+        if action == actions.GET_DEP:
+            self._deps[event.worker].append(key)
+        elif action == actions.PRESCRIBED:
+            deps = self._deps.pop(event.worker, None)
+            if deps:
+                self._step_deps[key] = deps
+        elif action == actions.RUNNING:
+            tid = self._track(event.worker)
+            self._write(ph="B", name=event.label, cat="step", ts=ts, pid=self.pid, tid=tid,
+                        args={"tag": event.tag})
+            for item in self._step_deps.pop(key, ()):
+                put = self._puts.get(item)
+                if put:
+                    self.flow_count += 1
+                    name = "%s @ %s" % item
+                    self._write(ph="s", name=name, cat="item", id=self.flow_count,
+                                ts=put[0], pid=self.pid, tid=put[1])
+                    self._write(ph="f", bp="e", name=name, cat="item", id=self.flow_count,
+                                ts=ts, pid=self.pid, tid=tid)
+        elif action == actions.DONE:
+            self._write(ph="E", ts=ts, pid=self.pid, tid=self._track(event.worker))
+        elif action == actions.PUT:
+            tid = self._track(event.worker)
+            self._puts[key] = (ts, tid)
+            self._write(ph="i", s="t", name="PUT %s @ %s" % key, cat="item", ts=ts,
+                        pid=self.pid, tid=tid)
+
+    def close(self):
+        """Finish the trace (but leave the file open)."""
+        self.out.write("\n]}\n")
+
+
+def write_trace(events, out):
+    """Write the Chrome trace of an iterable of Events to out; return the TraceWriter."""
+    writer = TraceWriter(out)
+    for event in events:
+        writer.add(event)
+    writer.close()
+    return writer
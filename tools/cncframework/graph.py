@@ -11,6 +11,16 @@ def expandExpr(x, collID="0", numRanks="CNC_NUM_RANKS"):
                   .replace("@", "args->").replace("#", "ctx->")
                   .replace("$ID", collID).replace("$RANKS", numRanks))
 
+# Fixed-size C types that fit in 64 bits (items of these types can be
+# stored in place in their item collection, instead of in a datablock)
+SCALAR_TYPES = frozenset([
+    "char", "signed char", "unsigned char", "short", "unsigned short",
+    "int", "unsigned", "unsigned int", "long", "unsigned long",
+    "long long", "unsigned long long", "float", "double", "bool", "_Bool",
+    "s8", "u8", "s16", "u16", "s32", "u32", "s64", "u64",
+    "int8_t", "uint8_t", "int16_t", "uint16_t", "int32_t", "uint32_t",
+    "int64_t", "uint64_t", "size_t", "intptr_t", "uintptr_t", "cncTag_t"])
+
 class CType(object):
     """C-style data type"""
     def __init__(self, typ, arrayTyp):
@@ -20,7 +30,9 @@ class CType(object):
         if self.isVecType: self.stars += "*"
         self.isPtrType = bool(self.stars)
         self.ptrType = str(self) + ("" if self.isPtrType else "*")
-        self.vecSizeRaw = arrayTyp and arrayTyp.arraySize
+        self.isScalar = not self.isPtrType and " ".join(self.baseType.split()) in SCALAR_TYPES
+        # flatten the size expression tokens into a plain string
+        self.vecSizeRaw = "".join(arrayTyp.arraySize) if arrayTyp else ""
         self.vecSize = expandExpr(self.vecSizeRaw)
     def __str__(self):
         return "{0} {1}".format(self.baseType, self.stars)
@@ -79,6 +91,8 @@ class ItemRef(object):
         self.binding = itemRef.binding
         self.keyRanges = tuple(x for x in self.key if x.isRanged)
         self.rangeSize = "*".join([x.sizeExpr for x in self.keyRanges]) or "1"
+        # condition of the enclosing if/else blocks (None if unconditional)
+        self.enabledCond = None
     def setBinding(self, b):
         self.binding = b
 
@@ -190,6 +204,24 @@ class StepFunction(object):
             i.setBinding(binding)
         # build the step input count expression
         self.inputCountExpr = " + ".join([i.rangeSize for i in self.inputItems]) or "0"
+        # ... and the count of inputs actually fetched (skipping disabled conditional inputs)
+        def enabledCountExpr(refs):
+            terms = []
+            for r in refs:
+                if isinstance(r, RefBlock):
+                    terms.append("(({0}) ? ({1}) : 0)".format(r.cond, enabledCountExpr(r.refs)))
+                elif isinstance(r, ItemRef):
+                    terms.append(r.rangeSize)
+            return " + ".join(terms) or "0"
+        self.enabledInputCountExpr = enabledCountExpr(self.inputs)
+        # record the conditions that enable the inputs
+        def setEnabledConds(refs, cond):
+            for r in refs:
+                if isinstance(r, RefBlock):
+                    setEnabledConds(r.refs, r.cond if not cond else "({0}) && ({1})".format(cond, r.cond))
+                elif isinstance(r, ItemRef):
+                    r.enabledCond = cond
+        setEnabledConds(self.inputs, None)
         # ranged inputs
         self.rangedInputItems = [ x for x in self.inputItems if x.keyRanges ]
         # set up lookup tables
@@ -253,6 +285,90 @@ def getDistFn(colls, collName, ranksExpr):
         rawFn = decl.attrs.get('distfn', defaultFn)
     return expandExpr(rawFn, collID=collID, numRanks=ranksExpr)
 
+def splitTopLevel(expr, sep=","):
+    """Split a C expression list at the separators that aren't nested in brackets."""
+    parts, depth, start = [], 0, 0
+    for i, c in enumerate(expr):
+        if c in "([{": depth += 1
+        elif c in ")]}": depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(expr[start:i])
+            start = i + 1
+    parts.append(expr[start:])
+    return [ x.strip() for x in parts ]
+
+def getDenseBounds(decl):
+    rawBounds = decl.attrs.get('dense')
+    if not rawBounds:
+        return None
+    rawBounds = str(rawBounds).strip()
+    assert not decl.isVirtual and decl.key, "Dense item collections must be keyed and concrete: "+decl.collName
+    assert rawBounds.startswith("[") and rawBounds.endswith("]"), \
+            "Expected a list of key bounds, e.g. dense: [#n, #m], for "+decl.collName
+    bounds = splitTopLevel(rawBounds[1:-1])
+    assert len(bounds) == len(decl.key), \
+            "Expected {0} dense key bounds for {1}".format(len(decl.key), decl.collName)
+    return [ "({0})".format(expandExpr(x)) for x in bounds ]
+
+def getGetCount(decl):
+    rawCount = decl.attrs.get('getCount')
+    if not rawCount:
+        return None
+    assert not decl.isVirtual and decl.key, "Get-counted item collections must be keyed and concrete: "+decl.collName
+    return "({0})".format(expandExpr(rawCount))
+
+def getTagBits(decl, tag):
+    rawBits = decl.attrs.get('tagBits')
+    if not rawBits:
+        return None
+    rawBits = str(rawBits).strip()
+    assert rawBits.startswith("[") and rawBits.endswith("]"), \
+            "Expected a list of bit widths, e.g. tagBits: [16, 16, 32], for "+decl.collName
+    bits = [ int(x) for x in splitTopLevel(rawBits[1:-1]) ]
+    assert len(bits) == len(tag), \
+            "Expected {0} tag bit widths for {1}".format(len(tag), decl.collName)
+    assert all(0 < b <= 64 for b in bits), "Tag bit widths must be from 1 to 64: "+decl.collName
+    return bits
+
+def packTagWords(bits):
+    """
+    Lay out tag components of these bit widths in 64-bit words (first fit,
+    in order, with no component split across words). Return a (word, shift)
+    pair for each component, and the number of words.
+    """
+    layout, word, used = [], 0, 0
+    for b in bits:
+        if used + b > 64:
+            word, used = word + 1, 0
+        layout.append((word, used))
+        used += b
+    return layout, word + 1
+
+def packTag(bits, tag):
+    """
+    C expressions for the words of a packed tag (from its components' expressions).
+    Each component is masked to its width, so a value that's out of range
+    can't spill into its neighbors.
+    """
+    layout, wordCount = packTagWords(bits)
+    words = [ [] for _ in range(wordCount) ]
+    for x, b, (word, shift) in zip(tag, bits, layout):
+        part = "(u64)({0})".format(x)
+        if b < 64: part = "({0} & {1:#x})".format(part, (1 << b) - 1)
+        words[word].append("({0} << {1})".format(part, shift) if shift else part)
+    return [ " | ".join(w) for w in words ]
+
+def unpackTag(bits, words):
+    """C expressions for the components of a packed tag (stored in the array named words)."""
+    layout, _ = packTagWords(bits)
+    exprs = []
+    for b, (word, shift) in zip(bits, layout):
+        x = "(u64){0}[{1}]".format(words, word)
+        if shift: x = "({0} >> {1})".format(x, shift)
+        if b < 64: x = "({0} & {1:#x})".format(x, (1 << b) - 1)
+        exprs.append("(cncTag_t){0}".format(x))
+    return exprs
+
 def getTuningFn(colls, collName, name, ranksExpr, default):
     decl = colls[collName]
     collID = str(list(colls.keys()).index(collName))
@@ -284,6 +400,9 @@ class CnCGraph(object):
         self.stepLikes = OrderedDict(self.stepFunctions)
         self.stepLikes[self.initFunction.collName] = self.initFunction
         self.stepLikes[self.finalizeFunction.collName] = self.finalizeFunction
+        # collection names in the binary event log (items, then steps)
+        self.logCollNames = [ i.collName for i in self.concreteItems ] + [ s.collName for s in self.finalAndSteps ]
+        self.logTagMax = max([ len(i.key) for i in self.concreteItems ] + [ len(s.tag) for s in self.finalAndSteps ] + [ 1 ])
         # attribute tracking
         self.allAttrNames = set()
         # context
@@ -298,12 +417,90 @@ class CnCGraph(object):
     def lookupType(self, item):
         return self.itemDeclarations[item.collName].type
 
+    def logCollId(self, msgType, collName):
+        """Id of a collection in the binary event log (an index into logCollNames)."""
+        if msgType in ('PUT', 'GET-DEP'):
+            return self.logCollNames.index(collName)
+        return self.logCollNames.index(collName, len(self.concreteItems))
+
     def itemDistFn(self, collName, ranksExpr):
         return getDistFn(self.itemDeclarations, collName, ranksExpr)
 
     def stepDistFn(self, collName, ranksExpr):
         return getDistFn(self.stepLikes, collName, ranksExpr)
 
+    def itemDenseBounds(self, collName):
+        """Upper bounds of the key components of a dense item collection (or None)."""
+        return getDenseBounds(self.itemDeclarations[collName])
+
+    def denseItems(self):
+        return [ i for i in self.concreteItems if self.itemDenseBounds(i.collName) ]
+
+    def itemDenseSize(self, collName):
+        return "*".join(self.itemDenseBounds(collName))
+
+    def itemDenseIndex(self, collName, key):
+        """Row-major index of a key (list of C expressions) in a dense item collection."""
+        bounds = self.itemDenseBounds(collName)
+        index = "({0})".format(key[0])
+        for k, b in zip(key[1:], bounds[1:]):
+            index = "({0}*{1} + ({2}))".format(index, b, k)
+        return index
+
+    def itemGetCount(self, collName):
+        """Number of gets of each item in a get-counted collection (or None)."""
+        return getGetCount(self.itemDeclarations[collName])
+
+    def hasGetCountedRefs(self, refs):
+        """Do any of these item references (or conditional blocks of them) get from a get-counted collection?"""
+        return any(self.hasGetCountedRefs(x.refs) if isinstance(x, RefBlock) else self.itemGetCount(x.collName)
+                   for x in refs)
+
+    def itemTagBits(self, collName):
+        """Bit widths of the key components of an item collection tuned with tagBits (or None)."""
+        decl = self.itemDeclarations[collName]
+        bits = getTagBits(decl, decl.key)
+        assert not bits or not (decl.isVirtual or getDenseBounds(decl)), \
+                "Packed tags are for concrete, hashed item collections: "+collName
+        return bits
+
+    def stepTagBits(self, collName):
+        """Bit widths of the tag components of a step collection tuned with tagBits (or None)."""
+        step = self.stepLikes[collName]
+        return getTagBits(step, step.tag)
+
+    def itemTagWords(self, collName, key):
+        """C expressions for the words of an item's tag (packed if the collection has tagBits)."""
+        bits = self.itemTagBits(collName)
+        return packTag(bits, key) if bits else list(key)
+
+    def stepTagWords(self, collName, tag):
+        """C expressions for the words of a step's tag, cast to u64 (as EDT parameters)."""
+        bits = self.stepTagBits(collName)
+        return packTag(bits, tag) if bits else [ "(u64){0}".format(x) for x in tag ]
+
+    def stepTagComponents(self, collName, words):
+        """C expressions for the components of a step's tag, from the array of its words."""
+        bits = self.stepTagBits(collName)
+        if bits:
+            return unpackTag(bits, words)
+        return [ "(cncTag_t){0}[{1}]".format(words, i) for i in range(len(self.stepLikes[collName].tag)) ]
+
+    def tagBitsChecks(self, bits, tag):
+        """(component, C condition) for the range check of each packed tag component
+        (components must be non-negative, and fit in their widths). A signed
+        64-bit component always fits in 63 bits or more, so those only get the
+        sign check (and 1LL << 63 would overflow)."""
+        return [ (x, "0 <= ({0})".format(x) if b >= 63 else "0 <= ({0}) && ({0}) < (1LL << {1})".format(x, b))
+                 for x, b in zip(tag, bits) ]
+
+    def itemIsScalar(self, collName):
+        """Can items of this collection be put by value (see SCALAR_TYPES)?"""
+        decl = self.itemDeclarations[collName]
+        if decl.isVirtual and not self.itemIsScalar(decl.mapTarget):
+            return False
+        return decl.type.isScalar
+
     def itemTuningFn(self, collName, name, ranksExpr, default):
         return getTuningFn(self.itemDeclarations, collName, name, ranksExpr, default)
 
@@ -49,6 +49,12 @@ typedef struct { cncTag_t {{ i.key|join(", ") }}; } {{name}}ItemKey;
 void cncPut_{{name}}({{i.type.ptrType}}_item, {{
         util.print_tag(i.key, typed=True)
         }}{{util.g_ctx_param()}});
+{% if g.itemIsScalar(i.collName) -%}
+// (puts the value itself, without allocating an item where possible)
+void cncPutValue_{{name}}({{i.type}}_value, {{
+        util.print_tag(i.key, typed=True)
+        }}{{util.g_ctx_param()}});
+{% endif -%}
 {% endfor %}
 /************************************\
  ******** STEP PRESCRIPTIONS ********
@@ -73,3 +73,276 @@ void *_cncRangedInputAlloc(u32 n, u32 dims[], size_t itemSize, void **dataStartP
     return ptrs;
 }
 
+
+#if defined(CNC_DEBUG_BINLOG) || defined(CNC_PROFILE)
+/**********************************\
+****** CNC PER-WORKER RECORD LOGS ***
+\**********************************/
+
+#include <errno.h>
+#include <fcntl.h>
+#include <pthread.h>
+#include <signal.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+
+#define _CNC_LOG_MAX_WORKERS 1024
+// records per buffer (the files are written in blocks of this many records)
+#define _CNC_LOG_BUFFER_RECORDS (1 << 14)
+#define _CNC_LOG_VERSION 1
+
+// Collection names, indexed by collection id
+static const char *_cncLogNames[] = { {% for name in g.logCollNames %}"{{name}}", {% endfor %}};
+
+// File header (followed by the NUL-terminated collection names, padded to 8 bytes)
+typedef struct {
+    char magic[8];
+    u32 version;
+    u32 recordSize;
+    u32 tagMax;
+    u32 worker;
+    u64 runId; // same for all the files from one run
+    u32 nameCount;
+    u32 headerSize; // offset of the first record
+} _cncLogHeader;
+
+typedef struct {
+    int fd;
+    volatile u32 count; // records committed to the buffer
+    volatile sig_atomic_t flushing; // set while the buffer is being written out
+    char records[]; // _CNC_LOG_BUFFER_RECORDS records
+} _cncLogBuffer;
+
+// A set of per-worker files of fixed-size records
+typedef struct {
+    const char *prefix;
+    const char *suffix;
+    const char *magic;
+    u32 recordSize;
+    _cncLogBuffer *buffers[_CNC_LOG_MAX_WORKERS];
+} _cncRecordLog;
+
+static u32 _cncLogWorkerCount;
+static u64 _cncLogRunId;
+static pthread_once_t _cncLogOnce = PTHREAD_ONCE_INIT;
+static __thread s32 _cncLogWorker = -1;
+
+#ifdef CNC_DEBUG_BINLOG
+static _cncRecordLog _cncBinLogFiles = { CNC_DEBUG_BINLOG, "bin", "CNCBLOG", sizeof(_cncBinLogRecord), { NULL } };
+static __thread _cncLogBuffer *_cncBinLogLocal;
+#endif /* CNC_DEBUG_BINLOG */
+#ifdef CNC_PROFILE
+static _cncRecordLog _cncProfileFiles = { CNC_PROFILE, "prof", "CNCPROF", sizeof(_cncProfileRecord), { NULL } };
+static __thread _cncLogBuffer *_cncProfileLocal;
+__thread u32 _cncProfilePuts;
+#endif /* CNC_PROFILE */
+
+static _cncRecordLog *_cncRecordLogs[] = {
+#ifdef CNC_DEBUG_BINLOG
+    &_cncBinLogFiles,
+#endif /* CNC_DEBUG_BINLOG */
+#ifdef CNC_PROFILE
+    &_cncProfileFiles,
+#endif /* CNC_PROFILE */
+};
+
+static u64 _cncLogTime(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1000000000ULL + ts.tv_nsec;
+}
+
+static void _cncLogWrite(int fd, const void *data, size_t bytes) {
+    const char *p = data;
+    while (bytes > 0) {
+        ssize_t n = write(fd, p, bytes);
+        if (n < 0) {
+            if (errno == EINTR) continue;
+            perror("CnC record log");
+            return;
+        }
+        p += n;
+        bytes -= n;
+    }
+}
+
+static void _cncLogFlush(_cncRecordLog *log, _cncLogBuffer *buf) {
+    buf->flushing = 1;
+    __sync_synchronize();
+    _cncLogWrite(buf->fd, buf->records, log->recordSize * buf->count);
+    buf->count = 0;
+    __sync_synchronize();
+    buf->flushing = 0;
+}
+
+// Flush the buffers of all the workers (at exit, when no more records are added)
+static void _cncLogFlushAll(void) {
+    u32 i, j, n = __sync_fetch_and_add(&_cncLogWorkerCount, 0);
+    for (j=0; j<sizeof(_cncRecordLogs)/sizeof(*_cncRecordLogs); j++) {
+        _cncRecordLog *log = _cncRecordLogs[j];
+        for (i=0; i<n && i<_CNC_LOG_MAX_WORKERS; i++) {
+            _cncLogBuffer *buf = log->buffers[i];
+            if (buf) {
+                _cncLogFlush(log, buf);
+                fsync(buf->fd);
+            }
+        }
+    }
+}
+
+// Save what we have if a hung program gets killed.
+// Only async-signal-safe calls are allowed here, so we just write(2) the
+// records each buffer has committed so far (skipping buffers that are in the
+// middle of a flush, since their records are already being written out).
+static void _cncLogSignalHandler(int sig) {
+    const int savedErrno = errno;
+    u32 i, j, n = _cncLogWorkerCount;
+    for (j=0; j<sizeof(_cncRecordLogs)/sizeof(*_cncRecordLogs); j++) {
+        _cncRecordLog *log = _cncRecordLogs[j];
+        for (i=0; i<n && i<_CNC_LOG_MAX_WORKERS; i++) {
+            _cncLogBuffer *buf = log->buffers[i];
+            if (buf && !buf->flushing) {
+                const char *p = buf->records;
+                size_t bytes = log->recordSize * buf->count;
+                while (bytes > 0) {
+                    ssize_t written = write(buf->fd, p, bytes);
+                    if (written < 0 && errno == EINTR) continue;
+                    if (written <= 0) break;
+                    p += written;
+                    bytes -= written;
+                }
+                buf->count = 0;
+            }
+        }
+    }
+    errno = savedErrno;
+    signal(sig, SIG_DFL);
+    raise(sig);
+}
+
+static void _cncLogInit(void) {
+    _cncLogRunId = _cncLogTime();
+    atexit(_cncLogFlushAll);
+    signal(SIGINT, _cncLogSignalHandler);
+    signal(SIGTERM, _cncLogSignalHandler);
+}
+
+// Open the calling thread's file for a log (numbering the thread if it's new)
+static _cncLogBuffer *_cncLogRegister(_cncRecordLog *log) {
+    pthread_once(&_cncLogOnce, _cncLogInit);
+    if (_cncLogWorker < 0) {
+        _cncLogWorker = __sync_fetch_and_add(&_cncLogWorkerCount, 1);
+        assert(_cncLogWorker < _CNC_LOG_MAX_WORKERS && "Too many threads for CnC record logs");
+    }
+    const u32 worker = _cncLogWorker;
+    _cncLogBuffer *buf = malloc(sizeof(*buf) + log->recordSize * _CNC_LOG_BUFFER_RECORDS);
+    if (!buf) {
+        fprintf(stderr, "Failed to allocate a CnC record log buffer (%s.%u.%s)\n",
+                log->prefix, worker, log->suffix);
+        exit(1);
+    }
+    char path[4096];
+    snprintf(path, sizeof(path), "%s.%u.%s", log->prefix, worker, log->suffix);
+    buf->fd = open(path, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+    if (buf->fd < 0) {
+        perror(path);
+        exit(1);
+    }
+    buf->count = 0;
+    buf->flushing = 0;
+    // write the header
+    const u32 nameCount = sizeof(_cncLogNames) / sizeof(*_cncLogNames);
+    u32 i, namesSize = 0;
+    for (i=0; i<nameCount; i++) {
+        namesSize += strlen(_cncLogNames[i]) + 1;
+    }
+    _cncLogHeader header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.magic, log->magic, sizeof(header.magic)); // (magic strings are 7 chars + NUL)
+    header.version = _CNC_LOG_VERSION;
+    header.recordSize = log->recordSize;
+    header.tagMax = _CNC_BINLOG_TAG_MAX;
+    header.worker = worker;
+    header.runId = _cncLogRunId;
+    header.nameCount = nameCount;
+    header.headerSize = (sizeof(header) + namesSize + 7) & ~7;
+    _cncLogWrite(buf->fd, &header, sizeof(header));
+    for (i=0; i<nameCount; i++) {
+        _cncLogWrite(buf->fd, _cncLogNames[i], strlen(_cncLogNames[i]) + 1);
+    }
+    const u64 zeros = 0;
+    _cncLogWrite(buf->fd, &zeros, header.headerSize - sizeof(header) - namesSize);
+    // publish the buffer so it gets flushed at exit
+    log->buffers[worker] = buf;
+    return buf;
+}
+
+// Return the calling thread's buffer for a log (opening its file on first use)
+static inline _cncLogBuffer *_cncLogLocalBuffer(_cncRecordLog *log, _cncLogBuffer **local) {
+    if (!*local) {
+        *local = _cncLogRegister(log);
+    }
+    return *local;
+}
+
+// Add a record to the calling thread's buffer (flushing it when it's full)
+static inline void _cncLogAppend(_cncRecordLog *log, _cncLogBuffer *buf, const void *record) {
+    memcpy(&buf->records[log->recordSize * buf->count], record, log->recordSize);
+    // commit the record only once it's completely in the buffer
+    __sync_synchronize();
+    if (++buf->count == _CNC_LOG_BUFFER_RECORDS) {
+        _cncLogFlush(log, buf);
+    }
+}
+
+static inline void _cncLogCopyTag(s64 *dst, const cncTag_t *tag, u32 tagLength) {
+    u32 i;
+    for (i=0; i<tagLength; i++) dst[i] = tag[i];
+    for (; i<_CNC_BINLOG_TAG_MAX; i++) dst[i] = 0;
+}
+#endif /* CNC_DEBUG_BINLOG || CNC_PROFILE */
+
+#ifdef CNC_DEBUG_BINLOG
+void _cncBinLog(u8 type, u32 collId, const cncTag_t *tag, u32 tagLength) {
+    _cncLogBuffer *buf = _cncLogLocalBuffer(&_cncBinLogFiles, &_cncBinLogLocal);
+    _cncBinLogRecord r;
+    r.time = _cncLogTime();
+    r.collId = collId;
+    r.worker = _cncLogWorker;
+    r.type = type;
+    r.tagLength = tagLength;
+    _cncLogCopyTag(r.tag, tag, tagLength);
+    _cncLogAppend(&_cncBinLogFiles, buf, &r);
+}
+#endif /* CNC_DEBUG_BINLOG */
+
+#ifdef CNC_PROFILE
+u64 _cncProfileTime(void) {
+    return _cncLogTime();
+}
+
+static void _cncProfileAdd(u8 type, u32 collId, const cncTag_t *tag, u32 tagLength,
+        u64 start, u64 end, u32 puts, u32 gets) {
+    _cncLogBuffer *buf = _cncLogLocalBuffer(&_cncProfileFiles, &_cncProfileLocal);
+    _cncProfileRecord r;
+    r.start = start;
+    r.end = end;
+    r.collId = collId;
+    r.worker = _cncLogWorker;
+    r.type = type;
+    r.tagLength = tagLength;
+    r.puts = puts;
+    r.gets = gets;
+    _cncLogCopyTag(r.tag, tag, tagLength);
+    _cncLogAppend(&_cncProfileFiles, buf, &r);
+}
+
+void _cncProfileEnqueue(u32 collId, const cncTag_t *tag, u32 tagLength) {
+    _cncProfileAdd(_CNC_PROF_ENQUEUE, collId, tag, tagLength, _cncLogTime(), 0, 0, 0);
+}
+
+void _cncProfileStep(u32 collId, const cncTag_t *tag, u32 tagLength, u64 start, u32 gets) {
+    _cncProfileAdd(_CNC_PROF_STEP, collId, tag, tagLength, start, _cncLogTime(), _cncProfilePuts, gets);
+}
+#endif /* CNC_PROFILE */
@@ -9,4 +9,79 @@
 
 void *_cncRangedInputAlloc(u32 n, u32 dims[], size_t itemSize, void **dataStartPtr);
 
+#if defined(CNC_DEBUG_BINLOG) || defined(CNC_PROFILE)
+#ifdef CNCOCR_TG
+#error "CnC binary event logging and profiling are not supported on FSim (use trace instead)."
+#endif /* CNCOCR_TG */
+#if defined(CNC_DISTRIBUTED) || defined(DIST_CNC)
+#error "CnC binary event logging and profiling are not supported for distributed (try CNC_DEBUG_TRACE instead)"
+#endif /* CNC_DISTRIBUTED || DIST_CNC */
+#define _CNC_BINLOG_TAG_MAX {{g.logTagMax}}
+#endif /* CNC_DEBUG_BINLOG || CNC_PROFILE */
+
+#ifdef CNC_DEBUG_BINLOG
+/**********************************\
+****** CNC BINARY EVENT LOGGING ****
+\**********************************/
+#ifdef CNC_DEBUG_LOG
+#error "CNC_DEBUG_BINLOG and CNC_DEBUG_LOG can't be used together"
+#endif /* CNC_DEBUG_LOG */
+
+// Event types (keep in sync with cncframework/events/binlog.py)
+enum {
+    _CNC_EV_PUT = 1,
+    _CNC_EV_GET_DEP,
+    _CNC_EV_PRESCRIBED,
+    _CNC_EV_RUNNING,
+    _CNC_EV_DONE
+};
+
+// Fixed-size event record
+typedef struct {
+    u64 time; // nanoseconds (monotonic clock)
+    u32 collId; // index into the collection name table
+    u16 worker;
+    u8 type;
+    u8 tagLength;
+    s64 tag[_CNC_BINLOG_TAG_MAX];
+} _cncBinLogRecord;
+
+// Log an event to the calling thread's log file (CNC_DEBUG_BINLOG.<worker>.bin)
+void _cncBinLog(u8 type, u32 collId, const cncTag_t *tag, u32 tagLength);
+#endif /* CNC_DEBUG_BINLOG */
+
+#ifdef CNC_PROFILE
+/**********************************\
+********* CNC STEP PROFILING *******
+\**********************************/
+
+// Profile record types (keep in sync with cncframework/events/profile.py)
+enum {
+    _CNC_PROF_ENQUEUE = 1,
+    _CNC_PROF_STEP
+};
+
+// Fixed-size profile record (one per prescribed, and one per finished step)
+typedef struct {
+    u64 start; // nanoseconds (monotonic clock); the time of the prescribe for ENQUEUE
+    u64 end; // (0 for ENQUEUE)
+    u32 collId; // index into the collection name table
+    u16 worker;
+    u8 type;
+    u8 tagLength;
+    u32 puts; // items put by the step
+    u32 gets; // input items of the step
+    s64 tag[_CNC_BINLOG_TAG_MAX];
+} _cncProfileRecord;
+
+// Count of the items put by the step running on this thread
+extern __thread u32 _cncProfilePuts;
+
+u64 _cncProfileTime(void);
+// Record a prescribe (enqueue) to the calling thread's profile (CNC_PROFILE.<worker>.prof)
+void _cncProfileEnqueue(u32 collId, const cncTag_t *tag, u32 tagLength);
+// Record a finished step instance
+void _cncProfileStep(u32 collId, const cncTag_t *tag, u32 tagLength, u64 start, u32 gets);
+#endif /* CNC_PROFILE */
+
 #endif /*{{defname}}*/
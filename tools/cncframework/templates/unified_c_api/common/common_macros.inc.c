@@ -18,6 +18,12 @@
             (['%ld'] * tag|count)|join(', ') if tag else 0 }}\n"{{
             ([""] + tag|list)|join(', ') }});
     fflush(cncDebugLog);
+#elif defined(CNC_DEBUG_BINLOG)
+{%- if tag %}
+    { cncTag_t _logTag[] = { {{ tag|join(", ") }} }; _cncBinLog(_CNC_EV_{{msgType|replace("-", "_")}}, {{ g.logCollId(msgType, collName) }}, _logTag, {{ tag|count }}); }
+{%- else %}
+    _cncBinLog(_CNC_EV_{{msgType|replace("-", "_")}}, {{ g.logCollId(msgType, collName) }}, NULL, 0);
+{%- endif %}
 #elif CNC_DEBUG_TRACE
     printf("<<CnC Trace>>: {{msgType}} {{collName}} @ {{
            (['%ld'] * tag|count)|join(', ') if tag else 0 }}\n"{{
@@ -210,6 +216,41 @@ for ({{idx}} = {{startVal}}; {{idx}} {{range_cmp_op(x)}} {{endVal}}; {{idx}}++)
     #endif
 {%- endmacro %}
 
+{#/****** Step profiling hooks (CNC_PROFILE) ******/#}
+{% macro profile_enqueue(collName, tag, indent=0) -%}
+#ifdef CNC_PROFILE
+{%- call render_indented(indent+1) %}
+{%- if tag %}
+    { cncTag_t _profTag[] = { {{ tag|join(", ") }} }; _cncProfileEnqueue({{ g.logCollId("PRESCRIBED", collName) }}, _profTag, {{ tag|count }}); }
+{%- else %}
+    _cncProfileEnqueue({{ g.logCollId("PRESCRIBED", collName) }}, NULL, 0);
+{%- endif %}
+#endif
+{%- endcall %}
+{%- endmacro %}
+{% macro profile_put(indent=0) -%}
+#ifdef CNC_PROFILE
+{%- call render_indented(indent+1) %}
+    _cncProfilePuts++;
+#endif
+{%- endcall %}
+{%- endmacro %}
+{% macro profile_step_start() -%}
+#ifdef CNC_PROFILE
+        const u64 _profStart = _cncProfileTime();
+        _cncProfilePuts = 0;
+    #endif
+{%- endmacro %}
+{% macro profile_step_end(stepfun) -%}
+#ifdef CNC_PROFILE
+{%- if stepfun.tag %}
+        { cncTag_t _profTag[] = { {{ stepfun.tag|join(", ") }} }; _cncProfileStep({{ g.logCollId("RUNNING", stepfun.collName) }}, _profTag, {{ stepfun.tag|count }}, _profStart, {{ stepfun.enabledInputCountExpr }}); }
+{%- else %}
+        _cncProfileStep({{ g.logCollId("RUNNING", stepfun.collName) }}, NULL, 0, _profStart, {{ stepfun.enabledInputCountExpr }});
+{%- endif %}
+    #endif
+{%- endmacro %}
+
 {% macro render_step_outputs(outputs) -%}
 {% for output in outputs recursive -%}
 {% if output.kind == 'ITEM' -%}
@@ -15,6 +15,39 @@ static inline cncLocation_t _cncItemDistFn_{{name}}({{ util.print_tag(i.key, typ
 {% endif %}
 CNC_BITWISE_SERIALIZABLE({{util.g_ctx_t()}});
 
+{#/* Dense item collections are keyed by a row-major index (see cncDenseItemTuner) */-#}
+{% macro item_tag_t(name) -%}
+{{ "cncTag_t" if g.itemDenseBounds(name) else "cncAggregateTag_t" }}
+{%- endmacro -%}
+{% macro has_item_tuner(name) -%}
+{{ "1" if g.hasCustomDist() or g.itemDenseBounds(name) or g.itemGetCount(name) else "" }}
+{%- endmacro -%}
+{% macro dense_index(i) -%}
+{% set bounds = g.itemDenseBounds(i.collName) -%}
+{% for x in i.key -%}
+        assert(0 <= {{x}} && {{x}} < {{bounds[loop.index0]}} && "Key out of bounds for dense item collection {{i.collName}}");
+        {% endfor -%}
+        cncTag_t _tag = {{g.itemDenseIndex(i.collName, i.key)}};
+{%- endmacro -%}
+{% macro unpack_item_tag(name, i) -%}
+{% if g.itemDenseBounds(name) -%}
+{% set bounds = g.itemDenseBounds(name) -%}
+        cncTag_t _rest = _tag;
+        {% for x in i.key|reverse -%}
+        {% set b = bounds[(i.key|count) - loop.index] -%}
+        {% if loop.last -%}
+        const cncTag_t {{x}} = _rest;
+        {% else -%}
+        const cncTag_t {{x}} = _rest % {{b}}; _rest /= {{b}};
+        {% endif -%}
+        {% endfor -%}
+{% else -%}
+        {% for x in i.key -%}
+        const cncTag_t {{x}} = _tag[{{loop.index0}}];
+        {% endfor -%}
+{% endif -%}
+{%- endmacro -%}
+
 namespace {{g.name}} {
 
     {# /* TODO - Should move these XXX declarations to a common iCnC file */ #}
@@ -31,16 +64,20 @@ namespace {{g.name}} {
     {% set gCppCtx = g.name ~ "CppCtx" -%}
     struct {{gCppCtx}};
 
-    {% if g.hasCustomDist() -%}
-    {% for name, i in g.itemDeclarations.items() -%}
-    struct cncItemTuner_{{name}}: public CnC::hashmap_tuner {
+    {% for name, i in g.itemDeclarations.items() if has_item_tuner(name) -%}
+    {% set dense = g.itemDenseBounds(name) -%}
+    struct cncItemTuner_{{name}}: public {{ "cncDenseItemTuner" if dense else "CnC::hashmap_tuner" }} {
         {{gCppCtx}} &_cppCtx;
         cncItemTuner_{{name}}({{gCppCtx}} &ctx): _cppCtx(ctx) { }
-        int consumed_on(const cncAggregateTag_t &_tag);
-        int produced_on(const cncAggregateTag_t &_tag);
+        {% if g.hasCustomDist() -%}
+        int consumed_on(const {{ item_tag_t(name) }} &_tag) const;
+        int produced_on(const {{ item_tag_t(name) }} &_tag) const;
+        {%- endif %}
+        {% if g.itemGetCount(name) -%}
+        int get_count(const {{ item_tag_t(name) }} &_tag) const;
+        {%- endif %}
     };
-    {% endfor %}
-    {% endif -%}
+    {% endfor -%}
     {% for stepfun in g.finalAndSteps -%}
     // STEP {{stepfun.collName}}
     struct cncStepTuner_{{stepfun.collName}}: public CnC::step_tuner<> {
@@ -64,10 +101,12 @@ namespace {{g.name}} {
         // (probably need to update the serializer to set size to 1)
         // https://github.com/icnc/icnc/blob/v1.0.100/samples/blackscholes/blackscholes/blackscholes.h#L105-L113
         {%- for name, i in g.itemDeclarations.items() %}
-        {% if g.hasCustomDist() -%}
+        {% if has_item_tuner(name) -%}
         cncItemTuner_{{name}} ituner_{{name}};
-        {% endif -%}
+        CnC::item_collection<{{ item_tag_t(name) }}, cncBoxedItem_t*, cncItemTuner_{{name}}> i_{{name}};
+        {% else -%}
         CnC::item_collection<cncAggregateTag_t, cncBoxedItem_t*> i_{{name}};
+        {% endif -%}
         {% endfor %}
 
         // Step collections
@@ -83,11 +122,11 @@ namespace {{g.name}} {
             : CnC::context<{{gCppCtx}}>(),
               // init item colls
               {%- for name, i in g.itemDeclarations.items() %}
-              {% if g.hasCustomDist() -%}
+              {% if has_item_tuner(name) -%}
               ituner_{{name}}(*this),
               {% endif -%}
               i_{{name}}(*this, "[{{name}}]"
-                      {%- if g.hasCustomDist() -%}
+                      {%- if has_item_tuner(name) -%}
                       , ituner_{{name}}
                       {%- endif -%}
                       ),
@@ -143,6 +182,7 @@ extern "C" {
         {% endif %}
         _cncCppCtx({{util.g_ctx_var()}})->s_{{stepfun.collName}}.put(_tag);
         {{ util.log_msg("PRESCRIBED", stepfun.collName, stepfun.tag, indent=2) }}
+        {{ util.profile_enqueue(stepfun.collName, stepfun.tag, indent=2) }}
     }
     {% endfor %}
 
@@ -152,7 +192,10 @@ extern "C" {
         {% if not i.isVirtual -%}
         {#/*****NON-VIRTUAL*****/-#}
         {{ util.log_msg("PUT", i.collName, i.key, indent=2) }}
-        {% if i.key -%}
+        {{ util.profile_put(indent=2) }}
+        {% if g.itemDenseBounds(i.collName) -%}
+        {{ dense_index(i) }}
+        {%- elif i.key -%}
         cncTag_t _init[] = { {{i.key|join(", ")}} };
         cncAggregateTag_t _tag(_init, {{i.key|count}});
         {%- else -%}
@@ -175,11 +218,22 @@ extern "C" {
         {%- endif %}
     }
 
+    {% if g.itemIsScalar(i.collName) -%}
+    void cncPutValue_{{i.collName}}({{i.type}}_value, {{
+            util.print_tag(i.key, typed=True) ~ util.g_ctx_param() }}) {
+        {{i.type.ptrType}}_item = ({{i.type.ptrType}})cncItemAlloc(sizeof(*_item));
+        *_item = _value;
+        cncPut_{{i.collName}}(_item, {{ util.print_tag(i.key) ~ util.g_ctx_var()}});
+    }
+
+    {% endif -%}
     {{i.type.ptrType}}cncGet_{{i.collName}}({{ util.print_tag(i.key, typed=True) ~ util.g_ctx_param()}}) {
         {% if not i.isVirtual -%}
         {#/*****NON-VIRTUAL*****/-#}
         {{ util.log_msg("GET-DEP", i.collName, i.key, indent=2) }}
-        {% if i.key -%}
+        {% if g.itemDenseBounds(i.collName) -%}
+        {{ dense_index(i) }}
+        {%- elif i.key -%}
         cncTag_t _init[] = { {{i.key|join(", ")}} };
         cncAggregateTag_t _tag(_init, {{i.key|count}});
         {%- else -%}
@@ -210,10 +264,23 @@ extern "C" {
     }
 
     void {{g.name}}_destroy({{util.g_ctx_param()}}) {
+        {% for name in g.itemDeclarations if g.itemGetCount(name) -%}
+        if (_cncCppCtx({{util.g_ctx_var()}})->i_{{name}}.size() > 0) {
+            fprintf(stderr, "WARNING! %lu {{name}} items were never freed (is their getCount too big?)\n",
+                    (unsigned long)_cncCppCtx({{util.g_ctx_var()}})->i_{{name}}.size());
+        }
+        {% endfor -%}
         delete _cncCppCtx({{util.g_ctx_var()}});
     }
 
     void {{g.name}}_launch({{util.g_args_param()}}, {{util.g_ctx_param()}}) {
+        {% if g.denseItems() -%}
+        #ifndef DIST_CNC
+        {% for i in g.denseItems() -%}
+        _cncCppCtx({{util.g_ctx_var()}})->i_{{i.collName}}.set_max({{g.itemDenseSize(i.collName)}});
+        {% endfor -%}
+        #endif /* DIST_CNC */
+        {% endif -%}
         {{util.qualified_step_name(g.initFunction)}}({{util.g_args_var()}}, {{util.g_ctx_var()}});
         _cncCppCtx({{util.g_ctx_var()}})->wait();
     }
@@ -229,16 +296,21 @@ namespace {{g.name}} {
     {% if g.hasCustomDist() -%}
     {% for name, i in g.itemDeclarations.items() -%}
     {% for f in ["produced_on", "consumed_on"] -%}
-    int cncItemTuner_{{name}}::{{f}}(const cncAggregateTag_t &_tag) {
+    int cncItemTuner_{{name}}::{{f}}(const {{ item_tag_t(name) }} &_tag) const {
         const {{util.g_ctx_param()}} = &_cppCtx.cctx;
-        {% for x in i.key -%}
-        const cncTag_t {{x}} = _tag[{{loop.index0}}];
-        {% endfor -%}
+        {{ unpack_item_tag(name, i) -}}
         return {{g.itemDistFn(name, "numProcs()")}};
     }
     {% endfor -%}
     {% endfor %}
     {% endif -%}
+    {% for name, i in g.itemDeclarations.items() if g.itemGetCount(name) -%}
+    int cncItemTuner_{{name}}::get_count(const {{ item_tag_t(name) }} &_tag) const {
+        const {{util.g_ctx_param()}} = &_cppCtx.cctx; MAYBE_UNUSED({{util.g_ctx_var()}});
+        {{ unpack_item_tag(name, i) -}}
+        return {{g.itemGetCount(name)}};
+    }
+    {% endfor -%}
     {% for stepfun in g.finalAndSteps -%}
     // STEP {{stepfun.collName}}
     {% if g.hasCustomDist() -%}
@@ -87,8 +87,10 @@ else {
     {{ util.step_enter() }}
     // Call user-defined step function
     {{ util.log_msg("RUNNING", stepfun.collName, stepfun.tag) }}
+    {{ util.profile_step_start() }}
     {{util.qualified_step_name(stepfun)}}({{ util.print_tag(stepfun.tag)
             ~ util.print_bindings(stepfun.inputItems) }}{{util.g_ctx_var()}});
+    {{ util.profile_step_end(stepfun) }}
     // Clean up
     {% for input in stepfun.rangedInputItems -%}
     cncLocalFree({{input.binding}});
@@ -22,6 +22,10 @@ extern "C" {
     }
 }
 
+void CnC::cnc_destroy(cncBoxedItem_t *ptr) {
+    cncLocalFree(ptr);
+}
+
 #ifdef DIST_CNC
 void CnC::serialize(CnC::serializer &ser, cncBoxedItem_t *&ptr) {
     const bool unpacking = ser.is_unpacking();
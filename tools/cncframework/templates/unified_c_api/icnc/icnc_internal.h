@@ -24,6 +24,14 @@ extern "C" {
 typedef int cncLocation_t;
 typedef std::valarray<cncTag_t> cncAggregateTag_t;
 
+// Dense item collections are keyed by the (row-major) index of the tag.
+// The vector tables are sized per process, so distributed ones stay hashed.
+#ifdef DIST_CNC
+typedef CnC::hashmap_tuner cncDenseItemTuner;
+#else
+typedef CnC::vector_tuner cncDenseItemTuner;
+#endif /* DIST_CNC */
+
 template<typename T>
 inline std::ostream &cnc_format(std::ostream &os, const std::valarray<T> &t) {
     os << "[ ";
@@ -95,6 +103,11 @@ namespace CnC {
 
 #endif /* DIST_CNC */
 
+// Items with a get_count are dropped by their collection after the last get
+namespace CnC {
+    void cnc_destroy(cncBoxedItem_t *ptr);
+}
+
 extern cncAggregateTag_t _cncSingletonTag;
 
 #endif /*{{defname}}*/
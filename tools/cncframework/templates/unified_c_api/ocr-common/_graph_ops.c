@@ -65,10 +65,20 @@ pthread_mutex_t _cncDebugMutex = PTHREAD_MUTEX_INITIALIZER;
 }
 
 static void _initCtxColls({{util.g_ctx_param()}}) {
+    {% if g.hasTuning('tableSize') -%}
+    #ifdef CNC_AFFINITIES
+    const u64 _ranks = {{util.g_ctx_var()}}->_affinityCount;
+    #else
+    const u64 _ranks = 1;
+    #endif /* CNC_AFFINITIES */
+    MAYBE_UNUSED(_ranks);
+    {% endif -%}
     // initialize item collections
     {% for i in g.concreteItems -%}
-    {% if i.key -%}
-    {{util.g_ctx_var()}}->_items.{{i.collName}} = _cncItemCollectionCreate();
+    {% if g.itemDenseBounds(i.collName) -%}
+    {{util.g_ctx_var()}}->_items.{{i.collName}} = _cncItemCollectionDenseCreate({{g.itemDenseSize(i.collName)}}, {{ "true" if g.itemGetCount(i.collName) else "false" }});
+    {% elif i.key -%}
+    {{util.g_ctx_var()}}->_items.{{i.collName}} = _cncItemCollectionCreate({{g.itemTuningFn(i.collName, 'tableSize', "_ranks", "CNC_TABLE_SIZE")}}, {{ "true" if g.itemGetCount(i.collName) else "false" }});
     {% else -%}
     {{util.g_ctx_var()}}->_items.{{i.collName}} = _cncItemCollectionSingletonCreate();
     {% endif -%}
@@ -14,6 +14,12 @@
 
 {% for name, i in g.itemDeclarations.items() %}
 void cncGet_{{name}}({{ util.print_tag(i.key, typed=True) }}ocrGuid_t destination, u32 slot, ocrDbAccessMode_t mode, {{util.g_ctx_param()}});
+{% if g.itemIsScalar(name) -%}
+{{i.type}}_cncGetInline_{{name}}({{ util.print_tag(i.key, typed=True) ~ util.g_ctx_param()}});
+{% endif -%}
+{% if g.itemGetCount(name) -%}
+void _cncRelease_{{name}}({{ util.print_tag(i.key, typed=True) ~ util.g_ctx_param()}});
+{% endif -%}
 {% endfor %}
 
 #ifdef CNC_AFFINITIES
@@ -3,7 +3,27 @@
 
 #include "{{g.name}}_internal.h"
 #include <string.h>
-
+{#/* Index of an item in a dense collection (with its key checked against the bounds) */-#}
+{% macro dense_index(i) -%}
+{% set bounds = g.itemDenseBounds(i.collName) -%}
+{% for x in i.key -%}
+    ASSERT(0 <= {{x}} && {{x}} < {{bounds[loop.index0]}} && "Key out of bounds for dense item collection {{i.collName}}");
+    {% endfor -%}
+    cncTag_t _index = {{g.itemDenseIndex(i.collName, i.key)}};
+{%- endmacro %}
+{#/* Tag of an item (packed into fewer words, with its components checked, if it's tuned with tagBits) */-#}
+{% macro item_tag(i, check=false) -%}
+{% set bits = g.itemTagBits(i.collName) -%}
+{% if bits and check -%}
+{% for x, cond in g.tagBitsChecks(bits, i.key) -%}
+    if (!({{cond}})) {
+        printf("ERROR! Key component %s = %lld is out of range for the tagBits of {{i.collName}}\n", "{{x}}", (long long)({{x}}));
+        CNC_ABORT(1);
+    }
+    {% endfor -%}
+{% endif -%}
+    cncTag_t _tag[] = { {{g.itemTagWords(i.collName, i.key)|join(", ")}} };
+{%- endmacro -%}
 {% for i in g.itemDeclarations.values() %}
 /* {{i.collName}} */
 
@@ -25,8 +45,20 @@ void cncPut_{{i.collName}}({{i.type.ptrType}}_item, {{
     const cncLocation_t _loc = CNC_CURRENT_LOCATION; MAYBE_UNUSED(_loc);
     #endif /* CNC_AFFINITIES */
     {{ util.log_msg("PUT", i.collName, i.key) }}
-    {% if i.key -%}
-    cncTag_t _tag[] = { {{i.key|join(", ")}} };
+    {{ util.profile_put() }}
+    {% if g.itemGetCount(i.collName) -%}
+    #ifndef CNC_AFFINITIES
+    if ({{g.itemGetCount(i.collName)}} == 0) { // no one will get it
+        cncItemFree(_item);
+        return;
+    }
+    #endif /* CNC_AFFINITIES */
+    {% endif -%}
+    {% if g.itemDenseBounds(i.collName) -%}
+    {{ dense_index(i) }}
+    _cncPut(_handle, &_index, 1, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, _loc));
+    {%- elif i.key -%}
+    {{ item_tag(i, check=true) }}
     const size_t _tagSize = sizeof(_tag)/sizeof(*_tag);
     _cncPut(_handle, _tag, _tagSize, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, _loc));
     {%- else -%}
@@ -56,8 +88,11 @@ void cncGet_{{i.collName}}({{ util.print_tag(i.key, typed=True) }}ocrGuid_t _des
     #else
     const cncLocation_t _loc = CNC_CURRENT_LOCATION; MAYBE_UNUSED(_loc);
     #endif /* CNC_AFFINITIES */
-    {% if i.key -%}
-    cncTag_t _tag[] = { {{i.key|join(", ")}} };
+    {% if g.itemDenseBounds(i.collName) -%}
+    {{ dense_index(i) }}
+    return _cncGet(&_index, 1, _destination, _slot, _mode, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, _loc));
+    {%- elif i.key -%}
+    {{ item_tag(i, check=true) }}
     const size_t _tagSize = sizeof(_tag)/sizeof(*_tag);
     return _cncGet(_tag, _tagSize, _destination, _slot, _mode, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, _loc));
     {%- else -%}
@@ -81,4 +116,101 @@ void cncGet_{{i.collName}}({{ util.print_tag(i.key, typed=True) }}ocrGuid_t _des
     {%- endif %}
 }
 
+{% if g.itemIsScalar(i.collName) -%}
+void cncPutValue_{{i.collName}}({{i.type}}_value, {{
+        util.print_tag(i.key, typed=True) ~ util.g_ctx_param()}}) {
+    {% if not i.isVirtual -%}
+    {#/*****NON-VIRTUAL*****/-#}
+    #ifdef CNC_INLINE_ITEMS
+    {{ util.log_msg("PUT", i.collName, i.key) }}
+    {{ util.profile_put() }}
+    {% if g.itemGetCount(i.collName) -%}
+    if ({{g.itemGetCount(i.collName)}} == 0) return; // no one will get it
+    {% endif -%}
+    u64 _bits = 0;
+    memcpy(&_bits, &_value, sizeof(_value));
+    {% if g.itemDenseBounds(i.collName) -%}
+    {{ dense_index(i) }}
+    _cncPutInline(_bits, &_index, 1, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION));
+    {%- elif i.key -%}
+    {{ item_tag(i, check=true) }}
+    const size_t _tagSize = sizeof(_tag)/sizeof(*_tag);
+    _cncPutInline(_bits, _tag, _tagSize, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION));
+    {%- else -%}
+    _cncPutInlineSingleton(_bits, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION));
+    {%- endif %}
+    #else
+    {{i.type.ptrType}}_item = cncItemAlloc(sizeof(*_item));
+    *_item = _value;
+    cncPut_{{i.collName}}(_item, {{ util.print_tag(i.key) ~ util.g_ctx_var()}});
+    #endif /* CNC_INLINE_ITEMS */
+    {%- else -%}
+    {% set targetColl = g.itemDeclarations[i.mapTarget] -%}
+    {% if i.isInline -%}
+    {#/*****INLINE VIRTUAL*****/-#}
+    cncPutValue_{{i.mapTarget}}(_value, {{ util.print_tag(i.keyFunction) ~ util.g_ctx_var()}});
+    {%- else -%}
+    {#/*****EXTERN VIRTUAL******/-#}
+    {{i.mapTarget}}ItemKey _key = {{i.functionName}}({{
+        util.print_tag(i.key) }}{{util.g_ctx_var()}});
+    cncPutValue_{{i.mapTarget}}(_value, {{
+        util.print_tag(targetColl.key, prefix="_key.") ~ util.g_ctx_var()}});
+    {%- endif %}
+    {%- endif %}
+}
+
+{{i.type}}_cncGetInline_{{i.collName}}({{ util.print_tag(i.key, typed=True) ~ util.g_ctx_param()}}) {
+    {% if not i.isVirtual -%}
+    {#/*****NON-VIRTUAL*****/-#}
+    #ifdef CNC_INLINE_ITEMS
+    {% if g.itemDenseBounds(i.collName) -%}
+    cncTag_t _index = {{g.itemDenseIndex(i.collName, i.key)}};
+    const void *_bits = _cncGetInline(&_index, 1, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION));
+    {%- elif i.key -%}
+    {{ item_tag(i) }}
+    const size_t _tagSize = sizeof(_tag)/sizeof(*_tag);
+    const void *_bits = _cncGetInline(_tag, _tagSize, _CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION));
+    {%- else -%}
+    const void *_bits = _cncGetInlineSingleton(_CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION));
+    {%- endif %}
+    {{i.type}}_value;
+    memcpy(&_value, _bits, sizeof(_value));
+    return _value;
+    #else
+    ASSERT(!"Missing input item {{i.collName}}");
+    return 0;
+    #endif /* CNC_INLINE_ITEMS */
+    {%- else -%}
+    {% set targetColl = g.itemDeclarations[i.mapTarget] -%}
+    {% if i.isInline -%}
+    {#/*****INLINE VIRTUAL*****/-#}
+    return _cncGetInline_{{i.mapTarget}}({{ util.print_tag(i.keyFunction) ~ util.g_ctx_var()}});
+    {%- else -%}
+    {#/*****EXTERN VIRTUAL******/-#}
+    {{i.mapTarget}}ItemKey _key = {{i.functionName}}({{
+        util.print_tag(i.key) }}{{util.g_ctx_var()}});
+    return _cncGetInline_{{i.mapTarget}}({{
+        util.print_tag(targetColl.key, prefix="_key.") ~ util.g_ctx_var()}});
+    {%- endif %}
+    {%- endif %}
+}
+
+{% endif -%}
+{% if g.itemGetCount(i.collName) -%}
+void _cncRelease_{{i.collName}}({{ util.print_tag(i.key, typed=True) ~ util.g_ctx_param()}}) {
+    {% if g.itemDenseBounds(i.collName) -%}
+    cncTag_t _index = {{g.itemDenseIndex(i.collName, i.key)}};
+    const s64 _getsLeft = _cncItemCollRelease(_CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION), &_index, 1, {{g.itemGetCount(i.collName)}});
+    {%- else -%}
+    {{ item_tag(i) }}
+    const size_t _tagSize = sizeof(_tag)/sizeof(*_tag);
+    const s64 _getsLeft = _cncItemCollRelease(_CNC_ITEM_COLL_HANDLE({{util.g_ctx_var()}}, {{i.collName}}, CNC_CURRENT_LOCATION), _tag, _tagSize, {{g.itemGetCount(i.collName)}});
+    {%- endif %}
+    if (_getsLeft < 0) {
+        printf("ERROR! Got item {{i.collName}} @ {{ (['%ld'] * i.key|count)|join(', ') }} more than getCount times\n", {{ i.key|join(", ") }});
+        ASSERT(!"Item freed too early");
+    }
+}
+
+{% endif -%}
 {% endfor %}
@@ -11,6 +11,20 @@
 {%- endwith -%}
 {%- endmacro -%}
 
+{#/****** Read a scalar-typed item, which may have been put inline
+          (with no datablock) if its dependence is NULL, unless the
+          input is disabled (then it reads as 0) ******/#}
+{%- macro read_scalar_item(input, target) -%}
+{%- call(var) util.render_tag_nest("Read \"" ~ input.binding ~ "\" (from its datablock, or inline)", input, useTag=true) -%}
+{{target}} = {% if input.enabledCond %}!({{ input.enabledCond }}) ? 0
+        : {% endif %}depv[_edtSlot].ptr ? {{unpack_item(input)}}_cncItemDataPtr(depv[_edtSlot].ptr)
+        : _cncGetInline_{{input.collName}}(
+        {%- for k in input.key %}_i{{loop.index0}}, {% endfor -%}
+        {{util.g_ctx_var()}});
+_edtSlot++;
+{%- endcall -%}
+{%- endmacro -%}
+
 #ifdef CNC_DEBUG_LOG
 #if !defined(CNCOCR_x86)
 #error "Debug logging mode only supported on x86 targets"
@@ -21,14 +35,16 @@ extern pthread_mutex_t _cncDebugMutex;
 
 {% for stepfun in g.finalAndSteps %}
 {% set isFinalizer = loop.first -%}
-{% set paramTag = (stepfun.tag|count) <= 8 -%}
+{% set tagWords = g.stepTagWords(stepfun.collName, stepfun.tag) -%}
+{% set tagComponents = g.stepTagComponents(stepfun.collName, "_tag") -%}
+{% set paramTag = (tagWords|count) <= 8 -%}
 /* {{stepfun.collName}} setup/teardown function */
 ocrGuid_t _{{g.name}}_cncStep_{{stepfun.collName}}(u32 paramc, u64 paramv[], u32 depc, ocrEdtDep_t depv[]) {
     {{util.g_ctx_param()}} = depv[0].ptr;
 
     u64 *_tag = {{ "paramv" if paramTag else "depv[1].ptr" }}; MAYBE_UNUSED(_tag);
     {% for x in stepfun.tag -%}
-    const cncTag_t {{x}} = (cncTag_t)_tag[{{loop.index0}}]; MAYBE_UNUSED({{x}});
+    const cncTag_t {{x}} = {{tagComponents[loop.index0]}}; MAYBE_UNUSED({{x}});
     {% endfor -%}
     {% if not paramTag -%}
     ocrDbDestroy(depv[1].guid); // free tag component datablock
@@ -46,24 +62,64 @@ ocrGuid_t _{{g.name}}_cncStep_{{stepfun.collName}}(u32 paramc, u64 paramv[], u32
         {{ g.lookupType(input) }}*_item;
         {{input.binding}} = _cncRangedInputAlloc({{ input.keyRanges|count
                 }}, _dims, sizeof({{ g.lookupType(input) }}), (void**)&_item);
+        {% if g.itemIsScalar(input.collName) -%}
+        _i = 0; MAYBE_UNUSED(_itemCount);
+        {% call util.render_indented(2) -%}
+        {{ read_scalar_item(input, "_item[_i++]")|trim }}
+        {%- endcall %}
+        {%- else -%}
         for (_i=0; _i<_itemCount; _i++) {
             _item[_i] = {{unpack_item(input)}}_cncItemDataPtr(depv[_edtSlot++].ptr);
         }
+        {%- endif %}
     }
     {% else -%}
     {#/*SCALAR*/-#}
     {{ g.lookupType(input) ~ input.binding }};
+    {% if g.itemIsScalar(input.collName) -%}
+    {% call util.render_indented(1) -%}
+    {{ read_scalar_item(input, input.binding)|trim }}
+    {%- endcall %}
+    {%- else -%}
     {{input.binding}} = {{unpack_item(input)}}_cncItemDataPtr(depv[_edtSlot++].ptr);
+    {%- endif %}
     {% endif -%}
     {% endfor %}
     {{ util.step_enter() }}
     // Call user-defined step function
     {{ util.log_msg("RUNNING", stepfun.collName, stepfun.tag) }}
+    {{ util.profile_step_start() }}
     {{util.qualified_step_name(stepfun)}}({{ util.print_tag(stepfun.tag) ~ util.print_bindings(stepfun.inputItems) }}{{util.g_ctx_var()}});
+    {{ util.profile_step_end(stepfun) }}
     // Clean up
     {% for input in stepfun.rangedInputItems -%}
     cncLocalFree({{input.binding}});
     {% endfor -%}
+    {% if g.hasGetCountedRefs(stepfun.inputs) -%}
+    #ifndef CNC_AFFINITIES
+    // Release the gets of get-counted items
+    {% call util.render_indented(1) -%}
+{% for input in stepfun.inputs recursive -%}
+{% if input.kind in ['IF', 'ELSE'] -%}
+{% if g.hasGetCountedRefs(input.refs) -%}
+if ({{ input.cond }}) {
+{%- call util.render_indented(1) -%}
+{{ loop(input.refs) }}
+{%- endcall %}
+}
+{% endif -%}
+{% elif g.itemGetCount(input.collName) -%}
+{%- set comment = "Release \"" ~ input.binding ~ "\"" -%}
+{%- call(var) util.render_tag_nest(comment, input, useTag=true) -%}
+_cncRelease_{{input.collName}}(
+        {%- for k in input.key %}_i{{loop.index0}}, {% endfor -%}
+         {{util.g_ctx_var()}});
+{%- endcall %}
+{% endif -%}
+{% endfor -%}
+{% endcall %}
+    #endif /* CNC_AFFINITIES */
+    {% endif -%}
     {{ util.log_msg("DONE", stepfun.collName, stepfun.tag) }}
     {{ util.step_exit() }}
     return NULL_GUID;
@@ -74,7 +130,7 @@ static void cncPrescribeInternal_{{stepfun.collName}}({{
         ("" if paramTag else "ocrGuid_t _tagGuid, ")
         }}u64 *_tag, {{ util.g_ctx_param()}}) {
     {% for x in stepfun.tag -%}
-    const cncTag_t {{x}} = (cncTag_t)_tag[{{loop.index0}}]; MAYBE_UNUSED({{x}});
+    const cncTag_t {{x}} = {{tagComponents[loop.index0]}}; MAYBE_UNUSED({{x}});
     {% endfor -%}
 
     ocrGuid_t _stepGuid;
@@ -85,7 +141,7 @@ static void cncPrescribeInternal_{{stepfun.collName}}({{
     u64 _depc = {{stepfun.inputCountExpr}} + {{ 1 if paramTag else 2 }};
     ocrEdtCreate(&_stepGuid, {{util.g_ctx_var()}}->_steps.{{stepfun.collName}},
         {% if paramTag -%}
-        /*paramc=*/{{(stepfun.tag|count)}}, /*paramv=*/_tag,
+        /*paramc=*/{{tagWords|count}}, /*paramv=*/_tag,
         {% else -%}
         /*paramc=*/0, /*paramv=*/NULL,
         {% endif -%}
@@ -136,6 +192,7 @@ ocrAddDependence(NULL_GUID, _stepGuid, _edtSlot++, DB_DEFAULT_MODE);
 {% endcall %}
     ASSERT(_depc == _edtSlot);
     {{ util.log_msg("PRESCRIBED", stepfun.collName, stepfun.tag) }}
+    {{ util.profile_enqueue(stepfun.collName, stepfun.tag) }}
 }
 
 #ifdef CNC_AFFINITIES
@@ -155,7 +212,15 @@ void cncPrescribe_{{stepfun.collName}}({{
         util.print_tag(stepfun.tag, typed=True)
         ~ util.g_ctx_param() }}) {
     {% if stepfun.tag -%}
-    u64 _args[] = { (u64){{ stepfun.tag|join(", (u64)") }} };
+    {% if g.stepTagBits(stepfun.collName) -%}
+    {% for x, cond in g.tagBitsChecks(g.stepTagBits(stepfun.collName), stepfun.tag) -%}
+    if (!({{cond}})) {
+        printf("ERROR! Tag component %s = %lld is out of range for the tagBits of {{stepfun.collName}}\n", "{{x}}", (long long)({{x}}));
+        CNC_ABORT(1);
+    }
+    {% endfor -%}
+    {% endif -%}
+    u64 _args[] = { {{ tagWords|join(", ") }} };
     {% if not paramTag -%}
     ocrGuid_t _tagBlockGuid;
     u64 *_tagBlockPtr;
@@ -172,7 +237,7 @@ void cncPrescribe_{{stepfun.collName}}({{
         const ocrGuid_t _remoteCtx = {{util.g_ctx_var()}}->_affinities[_loc];
         const ocrGuid_t _affinity = _cncAffinityFromCtx(_remoteCtx);
         {% if paramTag -%}
-        const u32 _argCount = {{stepfun.tag|count}};
+        const u32 _argCount = {{tagWords|count}};
         const u32 _depCount = 1;
         ocrGuid_t _deps[] = { _remoteCtx };
         {% else -%}
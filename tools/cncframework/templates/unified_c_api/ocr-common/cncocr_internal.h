@@ -56,7 +56,8 @@ static inline u64 _cncTagHash(cncTag_t *components, u32 length) {
 }
 {% endblock tag_util -%}
 
-cncItemCollection_t _cncItemCollectionCreate(void);
+cncItemCollection_t _cncItemCollectionCreate(u64 tableSize, bool getCounted);
+cncItemCollection_t _cncItemCollectionDenseCreate(u64 slotCount, bool getCounted);
 void _cncItemCollectionDestroy(cncItemCollection_t coll);
 
 cncItemCollection_t _cncItemCollectionSingletonCreate(void);
@@ -68,6 +69,11 @@ void _cncItemCollectionSingletonDestroy(cncItemCollection_t coll);
 void _cncItemCollUpdate(cncItemCollHandle_t handle, cncTag_t *tag, u32 tagLength, u8 role,
         ocrGuid_t input, u32 slot, ocrDbAccessMode_t mode);
 
+/* Release a step's get of an item from a get-counted collection, freeing the
+ * item after its last get. Return the number of gets left (negative if the
+ * item was got more than getCount times). */
+s64 _cncItemCollRelease(cncItemCollHandle_t handle, cncTag_t *tag, u32 tagLength, u32 getCount);
+
 /* Putting an item into the hashmap */
 static inline void _cncPut(ocrGuid_t item, cncTag_t *tag, int tagLength, cncItemCollHandle_t handle) {
     _cncItemCollUpdate(handle, tag, tagLength, _CNC_PUTTER_ROLE, item, 0, _CNC_ITEM_MODE);
@@ -96,6 +102,27 @@ static inline void _cncGetSingleton(ocrGuid_t destination, u32 slot, ocrDbAccess
 }
 {% endblock singleton_ops -%}
 
+#ifdef CNC_INLINE_ITEMS
+/* Put a small scalar item (the bits of its value) straight into the table,
+ * satisfying its event with NULL_GUID instead of a datablock */
+void _cncPutInline(u64 value, cncTag_t *tag, u32 tagLength, cncItemCollHandle_t handle);
+
+/* Find the value of an item that was put inline */
+void *_cncGetInline(cncTag_t *tag, u32 tagLength, cncItemCollHandle_t handle);
+
+static inline void _cncPutInlineSingleton(u64 value, cncItemCollHandle_t handle) {
+    cncTag_t tag = 0;
+    tag = -_cncTagHash(&tag, 1);
+    _cncPutInline(value, &tag, 1, handle);
+}
+
+static inline void *_cncGetInlineSingleton(cncItemCollHandle_t handle) {
+    cncTag_t tag = 0;
+    tag = -_cncTagHash(&tag, 1);
+    return _cncGetInline(&tag, 1, handle);
+}
+#endif /* CNC_INLINE_ITEMS */
+
 static inline ocrGuid_t _cncCurrentAffinity() {
     #ifdef CNC_AFFINITIES
     ocrGuid_t affinity;
@@ -315,7 +315,10 @@ void _cncItemCollUpdate(cncItemCollHandle_t handle, cncTag_t *tag, u32 tagLength
     ocrEdtTemplateDestroy(templGuid);
 }
 
-cncItemCollection_t _cncItemCollectionCreate(void) {
+cncItemCollection_t _cncItemCollectionCreate(u64 tableSize, bool getCounted) {
+    // (the pure-OCR table has a fixed size, since its buckets are datablocks)
+    MAYBE_UNUSED(tableSize);
+    MAYBE_UNUSED(getCounted);
     int i;
     ocrGuid_t collGuid, *itemTable;
     SIMPLE_DBCREATE(&collGuid, (void**)&itemTable, sizeof(ocrGuid_t)*CNC_TABLE_SIZE);
@@ -330,6 +333,13 @@ cncItemCollection_t _cncItemCollectionCreate(void) {
     return collGuid;
 }
 
+cncItemCollection_t _cncItemCollectionDenseCreate(u64 slotCount, bool getCounted) {
+    // XXX - the dense index is just hashed like any other (one-component) tag here
+    // (the translator warns about this for pure OCR targets)
+    MAYBE_UNUSED(slotCount);
+    return _cncItemCollectionCreate(CNC_TABLE_SIZE, getCounted);
+}
+
 void _cncItemCollectionDestroy(cncItemCollection_t coll) {
     // FIXME - need to do a deep traversal to really destroy the collection
     ocrDbDestroy(coll);
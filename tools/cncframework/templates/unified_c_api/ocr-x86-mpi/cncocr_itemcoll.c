@@ -20,14 +20,14 @@ static ocrGuid_t _cncItemCollUpdateEdt(u32 paramc, u64 paramv[], u32 depc, ocrEd
     struct _cncItemCollUpdateParams *p = depv[0].ptr;
     u8 *ctxBase = depv[1].ptr;
     cncItemCollection_t *coll = (void*)(ctxBase + p->collOffset);
-    _cncItemCollectionEntry *entry;
-    _allocateEntryIfAbsent(*coll, p->tag, p->tagLength, p->role, &entry);
+    ocrGuid_t event;
+    _cncItemEventIfAbsent(*coll, p->tag, p->tagLength, p->role, &event);
 
     if (p->role == _CNC_PUTTER_ROLE) { // put input into collection
-        ocrEventSatisfy(entry->event, p->input);
+        ocrEventSatisfy(event, p->input);
     }
     else { // get placeholder and pass to input
-        ocrAddDependence(entry->event, p->input, p->slot, p->mode);
+        ocrAddDependence(event, p->input, p->slot, p->mode);
     }
     ocrDbDestroy(depv[0].guid);
     return NULL_GUID;
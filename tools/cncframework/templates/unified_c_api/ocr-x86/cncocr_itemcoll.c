@@ -3,36 +3,131 @@
 
 #include "cncocr_internal.h"
 
+/* Item collections are lock-free hash tables that grow as items are added,
+ * without ever moving an entry (split-ordered lists, Shalev & Shavit 2006).
+ * All the entries are in one linked list, sorted by their bit-reversed hash,
+ * so each bucket of the table is a contiguous stretch of the list, starting
+ * at a "dummy" entry for the bucket. Doubling the number of buckets just
+ * splits each stretch in two; the dummy entries for the new buckets are
+ * added lazily, the first time a bucket is used. So puts and gets carry on
+ * while the table grows, and a lookup only scans about CNC_ITEMS_LOAD
+ * entries, however many items there are.
+ *
+ * Dense collections (tuned with "dense: [bounds]") skip all that: the key
+ * space is a known box, so the table is just an array of events, indexed by
+ * the row-major index of the key (which the item ops pass as the tag).
+ *
+ * In get-counted collections (tuned with "getCount: n"), each step releases
+ * its gets when it's done, and the last get destroys the item's datablock
+ * and event. The entry itself is left in the table (with a "freed" event),
+ * since the list is lock-free and there's no safe point to reclaim a node,
+ * but it's only a tag and a few words.
+ *
+ * Small scalar items (put with cncPutValue) don't get a datablock at all:
+ * the value is stored in the item's state, and its event is satisfied with
+ * NULL_GUID, so the consuming steps find a NULL dependence and read the
+ * value from the table instead (see _cncGetInline). Entries never move, so
+ * the steps can use it in place.
+ */
+
+/* Average number of entries per bucket before the table doubles */
+#define CNC_ITEMS_LOAD 2
+
+/* The buckets are in segments, where segment 0 holds the first baseSize
+ * buckets and segment i > 0 the next baseSize*2^(i-1) buckets, so the
+ * segments never move either. */
+#define CNC_ITEMS_SEGMENTS 48
+
+/* Event of an item that was freed after its last get */
+#define _CNC_FREED_GUID ((ocrGuid_t)-1)
+
+/* The state of an item instance */
+typedef struct {
+    volatile ocrGuid_t event; /* The event representing the data item. Data will be put through the event when it is satisfied */
+    union {
+        ocrGuid_t item; /* The item's datablock (once it's put) */
+        u64 value; /* The item itself, if it was put inline */
+    };
+    volatile u32 gets; /* Number of gets released (for get-counted collections) */
+    bool isInline; /* Was the item put inline? */
+} _cncItemState;
+
 /* The structure to hold an item in the item collection */
 typedef struct _cncItemCollEntry {
-    ocrGuid_t event; /* The event representing the data item. Data will be put through the event when it is satisfied */
-    struct _cncItemCollEntry * volatile nxt; /* The next bucket in the hashtable */
+    _cncItemState state;
+    struct _cncItemCollEntry * volatile nxt; /* The next entry in the list */
+    u64 key; /* Bit-reversed hash (odd), or bit-reversed bucket index for dummy entries (even) */
     char creator; /* Who created this entry (could be from a Put or a Get)*/
     cncTag_t tag[]; /* Tags are byte arrays, with a known length for each item collection */
 } _cncItemCollectionEntry;
 
-/* Get an entry from the item collection, or create and insert one (atomically) if it doesn't exist.
- * The creator parameter PUTTER/GETTER role ensures that multiple puts are not allowed.
+typedef _cncItemCollectionEntry * volatile _cncItemBucket;
+
+struct _cncItemTable {
+    volatile u64 size; /* Number of buckets in use (a power of 2) */
+    volatile u64 count; /* Number of items */
+    u64 baseSize; /* Number of buckets in segment 0 (a power of 2) */
+    _cncItemBucket * volatile segments[CNC_ITEMS_SEGMENTS];
+    bool getCounted; /* Are items freed after their last get? */
+    u64 denseSize; /* Number of slots, for dense collections (or 0) */
+    _cncItemState slots[]; /* A dense collection's items */
+};
+
+static inline u64 _cncReverseBits(u64 x) {
+    x = ((x >> 1) & 0x5555555555555555ULL) | ((x & 0x5555555555555555ULL) << 1);
+    x = ((x >> 2) & 0x3333333333333333ULL) | ((x & 0x3333333333333333ULL) << 2);
+    x = ((x >> 4) & 0x0F0F0F0F0F0F0F0FULL) | ((x & 0x0F0F0F0F0F0F0F0FULL) << 4);
+    return __builtin_bswap64(x);
+}
+
+/* Return the slot of a bucket, allocating its segment if need be */
+static _cncItemBucket *_cncBucketSlot(cncItemCollection_t table, u64 bucket) {
+    u32 segment;
+    u64 offset, segmentSize;
+    if (bucket < table->baseSize) {
+        segment = 0;
+        offset = bucket;
+        segmentSize = table->baseSize;
+    }
+    else {
+        const u64 i = bucket / table->baseSize; // >= 1
+        segment = 64 - __builtin_clzll(i);
+        segmentSize = table->baseSize << (segment - 1);
+        offset = bucket - segmentSize;
+    }
+    _cncItemBucket *buckets = table->segments[segment];
+    if (!buckets) {
+        _cncItemBucket *fresh = calloc(segmentSize, sizeof(*fresh));
+        if (__sync_bool_compare_and_swap(&table->segments[segment], NULL, fresh)) {
+            buckets = fresh;
+        }
+        else { // someone else got there first
+            free((void*)fresh);
+            buckets = table->segments[segment];
+        }
+    }
+    return &buckets[offset];
+}
+
+/* Find the entry for a key (and tag) in the list, starting from a dummy entry,
+ * or insert one (atomically) if it isn't there. For dummy entries, tag is NULL.
+ * Return true if the entry was inserted (or false if it was there already).
  */
-static bool _allocateEntryIfAbsent(
-        _cncItemCollectionEntry * volatile * hashmap, cncTag_t *tag,
-        int length, char creator, _cncItemCollectionEntry **entryOut) {
+static bool _cncListInsertIfAbsent(_cncItemCollectionEntry *start, u64 key,
+        cncTag_t *tag, int length, char creator, _cncItemCollectionEntry **entryOut) {
     const int tagByteCount = length*sizeof(*tag);
-    int index = (_cncTagHash(tag, length)) % CNC_TABLE_SIZE;
-    _cncItemCollectionEntry * volatile current = hashmap[index];
-    _cncItemCollectionEntry * volatile * currentLocation = &hashmap[index];
-    _cncItemCollectionEntry * volatile head = current;
-    _cncItemCollectionEntry * volatile tail = NULL;
-
-    _cncItemCollectionEntry * entry = NULL;
+    _cncItemCollectionEntry *prev = start;
+    _cncItemCollectionEntry *entry = NULL;
 
     while (1) {
-        /* traverse the buckets in the table to get to the last one */
-        while (current != tail) {
-            if (_cncTagEquals(current->tag, tag, length)) {
+        /* find where the key goes: after all the entries with smaller keys,
+         * checking each entry with the same key (for the same tag) */
+        _cncItemCollectionEntry *current = prev->nxt;
+        while (current && current->key <= key) {
+            if (current->key == key && (!tag || _cncTagEquals(current->tag, tag, length))) {
                 /* deallocate the entry we eagerly allocated in a previous iteration of the outer while(1) loop */
-                if (entry != NULL){
-                    ocrEventDestroy(entry->event);
+                if (entry != NULL) {
+                    if (tag) ocrEventDestroy(entry->state.event);
                     free(entry);
                 }
 
@@ -40,65 +135,251 @@ static bool _allocateEntryIfAbsent(
                 *entryOut = current;
                 return false;
             }
+            prev = current;
             current = current->nxt;
         }
 
-        /* allocate a new entry if this is the first time we are going to try and insert a new entry to the end of the bucket list */
+        /* allocate a new entry if this is the first time we are going to try and insert it */
         if (entry == NULL) {
             entry = malloc(sizeof(_cncItemCollectionEntry)+tagByteCount);
+            entry->key = key;
             entry->creator = creator;
-            memcpy(entry->tag, tag, tagByteCount);
-            ocrEventCreate(&(entry->event), OCR_EVENT_IDEM_T, true);
+            entry->state.item = NULL_GUID;
+            entry->state.gets = 0;
+            entry->state.isInline = false;
+            if (tag) {
+                memcpy(entry->tag, tag, tagByteCount);
+                ocrEventCreate((ocrGuid_t*)&(entry->state.event), OCR_EVENT_IDEM_T, true);
+            }
+            else {
+                entry->state.event = NULL_GUID;
+            }
         }
-        entry->nxt=head;
+        entry->nxt = current;
 
-        /* try to insert the new entry into the _first_ position in a bucket of the table */
-        if (__sync_bool_compare_and_swap(currentLocation, head, entry)) {
+        /* try to link the new entry in after prev */
+        if (__sync_bool_compare_and_swap(&prev->nxt, current, entry)) {
             *entryOut = entry;
             return true;
         }
 
-        /* CAS failed, which means that someone else inserted the new entry into the table while we were trying to do so, we need to try again */
-        current = hashmap[index]; //do not update tail anymore if deletes are inserted.
-        tail = head;
-        head = current;
+        /* CAS failed, which means that someone else inserted an entry after prev while we were
+         * trying to do so (entries are never removed, so we can carry on from prev) */
     }
 
     ASSERT(!"Unreachable"); /* we should never get here */
     return false;
 }
 
-static inline ocrGuid_t _cncItemCollUpdateLocal(_cncItemCollectionEntry **coll, cncTag_t *tag, u32 tagLength, u8 role,
+/* Return the dummy entry that starts a bucket, adding it to the list if need be */
+static _cncItemCollectionEntry *_cncBucketStart(cncItemCollection_t table, u64 bucket) {
+    _cncItemBucket *slot = _cncBucketSlot(table, bucket);
+    _cncItemCollectionEntry *dummy = *slot;
+    if (!dummy) {
+        /* a bucket splits off from its parent (the same index without its top bit) */
+        const u64 parent = bucket & ~(1ULL << (63 - __builtin_clzll(bucket)));
+        _cncListInsertIfAbsent(_cncBucketStart(table, parent), _cncReverseBits(bucket),
+                NULL, 0, 0, &dummy);
+        /* (the list has just one dummy per bucket, so any racing threads agree on it) */
+        *slot = dummy;
+    }
+    return dummy;
+}
+
+/* Get an entry from the item collection, or create and insert one (atomically) if it doesn't exist.
+ * The creator parameter PUTTER/GETTER role ensures that multiple puts are not allowed.
+ */
+static bool _allocateEntryIfAbsent(
+        cncItemCollection_t table, cncTag_t *tag,
+        int length, char creator, _cncItemCollectionEntry **entryOut) {
+    const u64 hash = _cncTagHash(tag, length);
+    const u64 size = table->size;
+    const u64 key = _cncReverseBits(hash) | 1;
+    if (!_cncListInsertIfAbsent(_cncBucketStart(table, hash & (size - 1)), key,
+                tag, length, creator, entryOut)) {
+        return false;
+    }
+    /* grow the table if it's getting too full */
+    const u64 count = __sync_add_and_fetch(&table->count, 1);
+    if (count > size * CNC_ITEMS_LOAD && size < (table->baseSize << (CNC_ITEMS_SEGMENTS - 1))) {
+        __sync_bool_compare_and_swap(&table->size, size, size * 2);
+    }
+    return true;
+}
+
+/* Get the state of an item from a dense collection, creating its event (atomically) if need be */
+static bool _cncDenseStateIfAbsent(cncItemCollection_t table, u64 index, _cncItemState **stateOut) {
+    ASSERT(index < table->denseSize && "Dense item key out of bounds");
+    _cncItemState *state = &table->slots[index];
+    *stateOut = state;
+    if (state->event == NULL_GUID) {
+        ocrGuid_t event;
+        ocrEventCreate(&event, OCR_EVENT_IDEM_T, true);
+        if (__sync_bool_compare_and_swap(&state->event, NULL_GUID, event)) {
+            return true;
+        }
+        // someone else got there first
+        ocrEventDestroy(event);
+    }
+    return false;
+}
+
+/* Get the state of an item, creating it (atomically) if it doesn't exist.
+ * Return true if it was created.
+ */
+static bool _cncItemStateIfAbsent(cncItemCollection_t table, cncTag_t *tag,
+        int length, char creator, _cncItemState **stateOut) {
+    if (table->denseSize) {
+        ASSERT(length == 1);
+        return _cncDenseStateIfAbsent(table, *tag, stateOut);
+    }
+    _cncItemCollectionEntry *entry;
+    bool wasUpdated = _allocateEntryIfAbsent(table, tag, length, creator, &entry);
+    *stateOut = &entry->state;
+    return wasUpdated;
+}
+
+/* Get the event for an item, creating it (atomically) if it doesn't exist.
+ * Return true if the event was created.
+ */
+static bool _cncItemEventIfAbsent(cncItemCollection_t table, cncTag_t *tag,
+        int length, char creator, ocrGuid_t *eventOut) {
+    _cncItemState *state;
+    bool wasUpdated = _cncItemStateIfAbsent(table, tag, length, creator, &state);
+    *eventOut = state->event;
+    return wasUpdated;
+}
+
+static inline ocrGuid_t _cncItemCollUpdateLocal(cncItemCollection_t coll, cncTag_t *tag, u32 tagLength, u8 role,
         ocrGuid_t input, u32 slot, ocrDbAccessMode_t mode) {
     // local hashtable update
-    _cncItemCollectionEntry *entry;
-    bool wasUpdated = _allocateEntryIfAbsent(coll, tag, tagLength, role, &entry);
+    _cncItemState *state;
+    bool wasUpdated = _cncItemStateIfAbsent(coll, tag, tagLength, role, &state);
+    const ocrGuid_t event = state->event;
+    if (event == _CNC_FREED_GUID) {
+        printf("ERROR! CnC item used after its last get (is its getCount too small?)\n");
+        ASSERT(!"Item freed too early");
+    }
     if (role == _CNC_PUTTER_ROLE) { // put input into collection
-        ocrEventSatisfy(entry->event, input);
+        state->item = input;
+        state->isInline = false;
+        ocrEventSatisfy(event, input);
     }
     else { // get placeholder and pass to input
-        ocrAddDependence(entry->event, input, slot, mode);
+        ocrAddDependence(event, input, slot, mode);
     }
     // Notify caller if the entry was already there
-    return wasUpdated ? entry->event : NULL_GUID;
+    return wasUpdated ? event : NULL_GUID;
 }
 
-cncItemCollection_t _cncItemCollectionCreate(void) {
-    return calloc(CNC_TABLE_SIZE, sizeof(struct _cncItemCollEntry*));
+s64 _cncItemCollRelease(cncItemCollHandle_t handle, cncTag_t *tag, u32 tagLength, u32 getCount) {
+    _cncItemState *state;
+    // (the entry is already there, since the step got the item)
+    _cncItemStateIfAbsent(handle.coll, tag, tagLength, _CNC_GETTER_ROLE, &state);
+    const u32 gets = __sync_add_and_fetch(&state->gets, 1);
+    if (gets == getCount) { // that was the last get
+        if (!state->isInline) ocrDbDestroy(state->item);
+        ocrEventDestroy(state->event);
+        state->event = _CNC_FREED_GUID;
+    }
+    return (s64)getCount - gets;
+}
+
+void _cncPutInline(u64 value, cncTag_t *tag, u32 tagLength, cncItemCollHandle_t handle) {
+    _cncItemState *state;
+    _cncItemStateIfAbsent(handle.coll, tag, tagLength, _CNC_PUTTER_ROLE, &state);
+    const ocrGuid_t event = state->event;
+    if (event == _CNC_FREED_GUID) {
+        printf("ERROR! CnC item used after its last get (is its getCount too small?)\n");
+        ASSERT(!"Item freed too early");
+    }
+    state->value = value;
+    state->isInline = true;
+    // the value must be visible before any step waiting on the event runs
+    hal_fence();
+    ocrEventSatisfy(event, NULL_GUID);
+}
+
+void *_cncGetInline(cncTag_t *tag, u32 tagLength, cncItemCollHandle_t handle) {
+    _cncItemState *state;
+    // (the entry is already there, since the step got the item)
+    _cncItemStateIfAbsent(handle.coll, tag, tagLength, _CNC_GETTER_ROLE, &state);
+    ASSERT(state->isInline && "Item wasn't put inline");
+    return &state->value;
+}
+
+cncItemCollection_t _cncItemCollectionCreate(u64 tableSize, bool getCounted) {
+    cncItemCollection_t table = calloc(1, sizeof(*table));
+    table->getCounted = getCounted;
+    // round the initial size up to a power of 2
+    u64 size = 1;
+    while (size < tableSize) size <<= 1;
+    table->size = table->baseSize = size;
+    // bucket 0 starts the list
+    _cncItemCollectionEntry *head = malloc(sizeof(_cncItemCollectionEntry));
+    head->state.event = NULL_GUID;
+    head->state.item = NULL_GUID;
+    head->state.gets = 0;
+    head->state.isInline = false;
+    head->nxt = NULL;
+    head->key = 0;
+    head->creator = 0;
+    *_cncBucketSlot(table, 0) = head;
+    return table;
+}
+
+cncItemCollection_t _cncItemCollectionDenseCreate(u64 slotCount, bool getCounted) {
+    cncItemCollection_t table = calloc(1, sizeof(*table) + slotCount*sizeof(_cncItemState));
+    u64 i;
+    for (i=0; i<slotCount; i++) {
+        table->slots[i].event = NULL_GUID;
+        table->slots[i].item = NULL_GUID;
+    }
+    table->getCounted = getCounted;
+    table->denseSize = slotCount;
+    return table;
+}
+
+/* Was an item put, and never freed? */
+// Destroy an entry's event and datablock (if it still has them),
+// and return whether its item was put but never freed by its gets
+static bool _cncItemStateDestroy(_cncItemState *state) {
+    const ocrGuid_t event = state->event;
+    if (event == _CNC_FREED_GUID) return false;
+    const bool leaked = state->isInline || state->item != NULL_GUID;
+    if (!state->isInline && state->item != NULL_GUID) ocrDbDestroy(state->item);
+    if (event != NULL_GUID) ocrEventDestroy(event);
+    return leaked;
 }
 
 void _cncItemCollectionDestroy(cncItemCollection_t coll) {
-    // FIXME - need to do a deep traversal to really destroy the collection
+    u64 i, leaked = 0;
+    for (i=0; i<coll->denseSize; i++) {
+        leaked += _cncItemStateDestroy(&coll->slots[i]);
+    }
+    _cncItemCollectionEntry *entry = coll->segments[0] ? coll->segments[0][0] : NULL;
+    while (entry) {
+        _cncItemCollectionEntry *next = entry->nxt;
+        leaked += _cncItemStateDestroy(&entry->state);
+        free(entry);
+        entry = next;
+    }
+    if (coll->getCounted && leaked) {
+        printf("WARNING! %lu CnC items were never freed (is their getCount too big?)\n", (unsigned long)leaked);
+    }
+    for (i=0; i<CNC_ITEMS_SEGMENTS; i++) {
+        free((void*)coll->segments[i]);
+    }
     free(coll);
 }
 
 cncItemCollection_t _cncItemCollectionSingletonCreate(void) {
-    return calloc(1, sizeof(struct _cncItemCollEntry*));
+    // (one item never makes the table grow)
+    return _cncItemCollectionCreate(1, false);
 }
 
 void _cncItemCollectionSingletonDestroy(cncItemCollection_t coll) {
-    // FIXME - need to do a deep traversal to really destroy the collection
-    free(coll);
+    _cncItemCollectionDestroy(coll);
 }
 
 {#/* Allow sub-templates to override the public item collection interface */-#}
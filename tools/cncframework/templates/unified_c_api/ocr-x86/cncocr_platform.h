@@ -6,9 +6,12 @@
 #ifdef CNC_DISTRIBUTED
 // enable affinities API on x86-mpi
 #define CNC_AFFINITIES 1
+#else
+// store small scalar items in the item collections (see cncocr_itemcoll.c)
+#define CNC_INLINE_ITEMS 1
 #endif /* CNC_DISTRIBUTED */
 
-typedef struct _cncItemCollEntry **cncItemCollection_t; // item collections
+typedef struct _cncItemTable *cncItemCollection_t; // item collections
 
 typedef struct {
     cncItemCollection_t coll;
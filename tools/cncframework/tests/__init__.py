@@ -0,0 +1,5 @@
+"""
+cncframework.tests: unit tests for the translator model and the event log tools
+
+Run from the tools directory with: python -m unittest discover cncframework/tests
+"""
@@ -0,0 +1,91 @@
+"""Synthetic CnC event logs for the tests."""
+import sys
+from contextlib import contextmanager
+from StringIO import StringIO
+
+@contextmanager
+def quiet():
+    """Hide what's printed on stderr (e.g. the warnings about a graph)."""
+    stderr, sys.stderr = sys.stderr, StringIO()
+    try:
+        yield sys.stderr
+    finally:
+        sys.stderr = stderr
+
+def stencil_log(steps, width, stall=None):
+    """
+    Return the lines of a CNC_DEBUG_LOG for a 1D stencil, with width cells
+    updated for the given number of time steps. Each step X @ t, i gets the
+    three cells around i from time step t-1. If stall is a (t, i) pair, that
+    step runs but never puts its cell, so the steps that need the cell (and
+    the ones that need theirs, and so on) never run.
+    """
+    def deps(t, i):
+        return [(t-1, j) for j in (i-1, i, i+1) if 0 <= j < width]
+    lines = ["PUT X @ 0, %d\n" % i for i in range(width)]
+    for t in range(1, steps):
+        for i in range(width):
+            lines.extend("GET-DEP X @ %d, %d\n" % dep for dep in deps(t, i))
+            lines.append("PRESCRIBED stencil @ %d, %d\n" % (t, i))
+    lines.append("GET-DEP X @ %d, 0\n" % (steps-1))
+    lines.append("PRESCRIBED Stencil_finalize @ 0\n")
+    missing = set()
+    for t in range(1, steps):
+        for i in range(width):
+            if any(dep in missing for dep in deps(t, i)):
+                missing.add((t, i))
+                continue
+            lines.append("RUNNING stencil @ %d, %d\n" % (t, i))
+            if (t, i) == stall:
+                missing.add((t, i))
+            else:
+                lines.append("PUT X @ %d, %d\n" % (t, i))
+            lines.append("DONE stencil @ %d, %d\n" % (t, i))
+    if (steps-1, 0) not in missing:
+        lines.append("RUNNING Stencil_finalize @ 0\n")
+        lines.append("DONE Stencil_finalize @ 0\n")
+    return lines
+
+
+def write_record_log(path, magic, record_format, tag_max, worker, run_id, names, records):
+    """
+    Write one per-worker file of a binary record log (CNC_DEBUG_BINLOG or
+    CNC_PROFILE), laid out like the files written by cnc_common.c.
+    """
+    import struct
+    from cncframework.events.binlog import VERSION
+    record = struct.Struct(record_format % tag_max)
+    names_size = sum(len(name) + 1 for name in names)
+    header_size = (40 + names_size + 7) & ~7
+    with open(path, "wb") as f:
+        f.write(struct.pack("<8sIIIIQII", magic, VERSION, record.size, tag_max,
+                            worker, run_id, len(names), header_size))
+        f.write("".join(name + "\0" for name in names))
+        f.write("\0" * (header_size - 40 - names_size))
+        for fields in records:
+            f.write(record.pack(*fields))
+
+def write_binary_log(prefix, events, workers=1, tag_max=4, run_id=1):
+    """
+    Write the events (from the lines of a text log) as a binary event log,
+    with increasing times, switching to the next worker after each
+    PRESCRIBED and DONE (so a prescribe and its GET-DEPs, or a step's
+    RUNNING, PUTs and DONE, stay on one worker). Return the collection names.
+    """
+    from cncframework.events.binlog import MAGIC, RECORD_FORMAT, ACTIONS
+    from cncframework.events.logs import EventReader
+    codes = dict((action, code) for code, action in ACTIONS.iteritems())
+    names, records = [], [[] for _ in range(workers)]
+    worker = 0
+    for time, event in enumerate(EventReader(events)):
+        if event.label not in names:
+            names.append(event.label)
+        tag = [int(x) for x in event.tag.split(", ")]
+        records[worker].append([1000 + time, names.index(event.label), worker,
+                                codes[event.action], len(tag)] + tag + [0] * (tag_max - len(tag)))
+        if event.action in ('PRESCRIBED', 'DONE'):
+            worker = (worker + 1) % workers
+    for w in range(workers):
+        write_record_log("%s.%d.bin" % (prefix, w), MAGIC, RECORD_FORMAT, tag_max,
+                         w, run_id, names, records[w])
+    return names
@@ -0,0 +1,83 @@
+import os, shutil, tempfile, unittest
+from cncframework.events.aggregate import AggregateGraph, bucket_function
+from cncframework.events.binlog import BinaryLog
+from cncframework.tests.logs import stencil_log, write_binary_log
+
+
+def summary(g):
+    """Return {(kind, collection, bucket): instances} and {(from, to): instance edges}."""
+    counts = dict((g.keys[node], g.counts[node]) for node in g)
+    edges = dict(((g.keys[fr][1], g.keys[to][1]), n) for (fr, to), n in g.edge_counts.iteritems())
+    return counts, edges
+
+
+class AggregateGraphTest(unittest.TestCase):
+    def test_collections(self):
+        g = AggregateGraph(stencil_log(4, 5))
+        counts, edges = summary(g)
+        self.assertEqual(counts, {("step", "init", None): 1, ("item", "X", None): 20,
+                                  ("step", "stencil", None): 15,
+                                  ("step", "Stencil_finalize", None): 1})
+        # each step gets the (up to) three cells around it, and the init step prescribes them all
+        self.assertEqual(edges, {("init", "X"): 5, ("init", "stencil"): 15,
+                                 ("init", "Stencil_finalize"): 1, ("X", "stencil"): 39,
+                                 ("stencil", "X"): 15, ("X", "Stencil_finalize"): 1})
+        self.assertEqual(len(g), 4)
+        x, stencil = g._ids[("item", "X", None)], g._ids[("step", "stencil", None)]
+        self.assertEqual(g.property(stencil, "label"), "stencil\\n15 steps")
+        self.assertEqual(g.property(x, "label"), "X\\n20 puts")
+        self.assertEqual(g.edge_property(x, stencil, "label"), 39)
+        self.assertEqual(g.edge_property(0, stencil, "style"), "dashed")
+        self.assertEqual(g.edge_property(stencil, x, "style"), None)
+
+    def test_stall(self):
+        # the stalled step runs but puts nothing, and nothing that needs its cell runs
+        counts, edges = summary(AggregateGraph(stencil_log(4, 5, stall=(1, 2))))
+        self.assertEqual(counts[("step", "stencil", None)], 15 - 3 - 5)
+        self.assertEqual(counts[("item", "X", None)], 5 + 15 - 3 - 5 - 1)
+        self.assertEqual(counts[("step", "Stencil_finalize", None)], 0)
+        # (the GET-DEPs are logged when the steps are prescribed)
+        self.assertEqual(edges[("X", "stencil")], 39)
+
+    def test_buckets(self):
+        bucket = bucket_function("t[0] if c == 'stencil' else None")
+        self.assertEqual(bucket("stencil", (2, 1)), 2)
+        g = AggregateGraph(stencil_log(4, 5), prescribe=False, bucket=bucket)
+        counts, edges = summary(g)
+        self.assertEqual(counts, {("step", "init", None): 1, ("item", "X", None): 20,
+                                  ("step", "stencil", 1): 5, ("step", "stencil", 2): 5,
+                                  ("step", "stencil", 3): 5,
+                                  ("step", "Stencil_finalize", None): 1})
+        self.assertNotIn(("init", "stencil"), edges)
+        self.assertEqual(g.property(g._ids[("step", "stencil", 2)], "label"),
+                         "stencil [2]\\n5 steps")
+
+    def test_bad_buckets(self):
+        self.assertRaises(ValueError, bucket_function, "t[0] //")
+        bucket = bucket_function("t[0] // 16")
+        # (tags that aren't all ints are kept as strings)
+        try:
+            AggregateGraph(["PUT X @ 1, 2\n", "PUT X @ a\n"], bucket=bucket)
+        except ValueError as e:
+            self.assertIn("X @ 'a'", str(e))
+        else:
+            self.fail("no ValueError")
+
+    def test_binary_log(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            prefix = os.path.join(tmp, "cnc_events")
+            write_binary_log(prefix, stencil_log(4, 5), workers=3)
+            with BinaryLog(prefix) as log:
+                g = AggregateGraph(log)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(summary(g), summary(AggregateGraph(stencil_log(4, 5))))
+        # each step's RUNNING, PUT and DONE are 1 ns apart
+        self.assertEqual(g.times[g._ids[("step", "stencil", None)]], 15 * 2)
+        self.assertEqual(g.property(g._ids[("step", "stencil", None)], "label"),
+                         "stencil\\n15 steps\\n0.0 us")
+
+
+if __name__ == '__main__':
+    unittest.main()
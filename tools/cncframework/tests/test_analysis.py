@@ -0,0 +1,113 @@
+import unittest
+from cncframework.events.analysis import LevelAnalysis, WorkSpan, step_cost
+from cncframework.events.dag import DAG
+from cncframework.events.eventgraph import EventGraph
+from cncframework.tests.logs import quiet, stencil_log
+
+
+def diamond():
+    """A diamond (1 -> 2, 3 -> 4) and a lone node (5)."""
+    return DAG({1: set([2, 3]), 2: set([4]), 3: set([4]), 4: set(), 5: set()})
+
+def timed_diamond():
+    """The diamond, with steps 1-4 taking the given times, and 5 an item."""
+    g = diamond()
+    for node, duration in ((1, 1.0), (2, 5.0), (3, 2.0), (4, 1.0)):
+        g.set_property(node, '_kind', "step")
+        g.set_property(node, '_collection', "long" if node == 2 else "short")
+        g.set_property(node, '_duration', duration)
+    g.set_property(5, '_kind', "item")
+    return g
+
+def stencil(steps, width):
+    with quiet():
+        return EventGraph(stencil_log(steps, width)).freeze()
+
+
+class LevelAnalysisTest(unittest.TestCase):
+    def test_levels(self):
+        a = LevelAnalysis(diamond())
+        self.assertEqual(a.depth, 3)
+        self.assertEqual(a.profile(), [2, 2, 1])
+        self.assertEqual(sorted(a.level_nodes(0)), [1, 5])
+        self.assertEqual(sorted(a.level_nodes(1)), [2, 3])
+        self.assertEqual(a.level(4), 2)
+        self.assertAlmostEqual(a.average_parallelism(), 5 / 3.0)
+        order = a.topsort()
+        self.assertEqual(sorted(order), [1, 2, 3, 4, 5])
+        self.assertEqual(order[-1], 4)
+
+    def test_longest_path(self):
+        a = LevelAnalysis(diamond())
+        length, path = a.longest_path()
+        self.assertEqual(length, 3)
+        self.assertEqual((path[0], path[-1]), (1, 4))
+        weights = {1: 1.0, 2: 5.0, 3: 2.0, 4: 1.0, 5: 4.0}
+        self.assertEqual(a.longest_path(weights.get), (7.0, [1, 2, 4]))
+        self.assertEqual(a.critical_path(weights.get), [1, 2, 4])
+
+    def test_schedule(self):
+        a = LevelAnalysis(diamond())
+        weights = {1: 1.0, 2: 5.0, 3: 2.0, 4: 1.0, 5: 4.0}
+        start, finish = a.schedule(weights.get)
+        row = a.dag.row
+        self.assertEqual((start[row(4)], finish[row(4)]), (6.0, 7.0))
+        self.assertEqual((start[row(5)], finish[row(5)]), (0.0, 4.0))
+        width, busy = a.parallelism_histogram(weights.get, buckets=7)
+        self.assertEqual(width, 1.0)
+        self.assertEqual(busy, [2.0, 3.0, 3.0, 2.0, 1.0, 1.0, 1.0])
+
+    def test_empty(self):
+        a = LevelAnalysis(DAG({}))
+        self.assertEqual((a.depth, a.profile(), a.average_parallelism()), (0, [], 0.0))
+        self.assertEqual(a.longest_path(), (0, []))
+
+    def test_cycle(self):
+        self.assertRaises(ValueError, LevelAnalysis, DAG({1: set([2]), 2: set([1]), 3: set([1])}))
+
+    def test_deep_chain(self):
+        # (no recursion, so the depth isn't limited by the stack)
+        n = 20000
+        a = LevelAnalysis(DAG(dict((i, set([i+1]) if i+1 < n else set()) for i in xrange(n))))
+        self.assertEqual(a.depth, n)
+        self.assertEqual(a.longest_path()[0], n)
+
+    def test_stencil(self):
+        g = stencil(4, 5)
+        a = LevelAnalysis(g)
+        # init, then the cells and steps of each time step, then the finalizer
+        self.assertEqual(a.profile(), [1] + [5] * 7 + [1])
+        self.assertEqual(g.property(a.critical_path()[0], 'label'), "init")
+        self.assertEqual(g.property(a.critical_path()[-1], 'label'), "Stencil_finalize: 0")
+
+
+class WorkSpanTest(unittest.TestCase):
+    def test_steps(self):
+        ws = WorkSpan(stencil(4, 5))
+        self.assertFalse(ws.timed)
+        # init, 3 x 5 stencil steps and the finalizer; the items cost nothing
+        self.assertEqual(ws.work, 17)
+        self.assertEqual(ws.span, 5)
+        self.assertAlmostEqual(ws.parallelism, 3.4)
+        self.assertEqual(ws.critical_collections(),
+                         [("stencil", 3, 3), ("Stencil_finalize", 1, 1), ("init", 1, 1)])
+
+    def test_times(self):
+        ws = WorkSpan(timed_diamond())
+        self.assertTrue(ws.timed)
+        self.assertEqual((ws.work, ws.span), (9.0, 7.0))
+        self.assertAlmostEqual(ws.parallelism, 9 / 7.0)
+        self.assertEqual(ws.critical_collections(), [("long", 1, 5.0), ("short", 2, 2.0)])
+        # (the item takes no time, so only the steps are busy)
+        self.assertEqual(ws.histogram(buckets=7), (1.0, [1.0, 2.0, 2.0, 1.0, 1.0, 1.0, 1.0]))
+
+    def test_untimed(self):
+        timed, cost = step_cost(timed_diamond().freeze(), timed=False)
+        self.assertFalse(timed)
+        self.assertEqual([cost(n) for n in (1, 2, 5)], [1, 1, 0])
+        ws = WorkSpan(timed_diamond(), timed=False)
+        self.assertEqual((ws.work, ws.span), (4, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
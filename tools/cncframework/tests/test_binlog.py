@@ -0,0 +1,61 @@
+import os, shutil, tempfile, unittest
+from cncframework.events.binlog import BinaryLog, MAGIC, RECORD_FORMAT, binary_log_files, is_binary_log
+from cncframework.events.eventgraph import EventGraph
+from cncframework.events.logs import EventReader
+from cncframework.tests.logs import quiet, stencil_log, write_binary_log, write_record_log
+
+
+class BinaryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.tmp, "cnc_events")
+        self.lines = stencil_log(3, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def events(self, log):
+        return [(e.action, e.label, e.tag) for e in log]
+
+    def test_round_trip(self):
+        write_binary_log(self.prefix, self.lines, workers=3)
+        self.assertTrue(is_binary_log(self.prefix))
+        self.assertEqual(binary_log_files(self.prefix + ".2.bin"), binary_log_files(self.prefix))
+        with BinaryLog(self.prefix) as log:
+            self.assertEqual(len(log), len(self.lines))
+            events = list(log)
+            self.assertEqual(log.event_count, len(self.lines))
+        # merged back into time order, with the workers and times kept
+        self.assertEqual(self.events(events), self.events(EventReader(self.lines)))
+        self.assertEqual([e.time for e in events], sorted(e.time for e in events))
+        self.assertEqual(set(e.worker for e in events), set([0, 1, 2]))
+
+    def test_same_graph_as_text_log(self):
+        write_binary_log(self.prefix, self.lines)
+        with quiet(), BinaryLog(self.prefix) as log:
+            graph = EventGraph(log).freeze()
+            self.assertEqual(graph, EventGraph(self.lines).freeze())
+
+    def test_partial_record_is_dropped(self):
+        write_binary_log(self.prefix, self.lines)
+        with open(self.prefix + ".0.bin", "ab") as f:
+            f.write("\1\2\3")
+        with BinaryLog(self.prefix) as log:
+            self.assertEqual(len(list(log)), len(self.lines))
+
+    def test_older_runs_are_ignored(self):
+        write_binary_log(self.prefix, self.lines, workers=2, run_id=5)
+        write_record_log(self.prefix + ".7.bin", MAGIC, RECORD_FORMAT, 4, 7, 3, ["X"],
+                         [(1, 0, 7, 1, 1, 42, 0, 0, 0)])
+        with quiet() as stderr, BinaryLog(self.prefix) as log:
+            self.assertIn("older run", stderr.getvalue())
+            self.assertEqual(len(log.workers), 2)
+            self.assertNotIn("42", [e.tag for e in log])
+
+    def test_missing_log(self):
+        self.assertFalse(is_binary_log(self.prefix))
+        self.assertRaises(IOError, BinaryLog, self.prefix)
+
+
+if __name__ == '__main__':
+    unittest.main()
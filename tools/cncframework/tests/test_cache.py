@@ -0,0 +1,81 @@
+import os, shutil, tempfile, unittest
+from cncframework import cache
+from cncframework.tests.logs import quiet
+
+
+class WriteAtomicTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_write(self):
+        path = os.path.join(self.tmp, "sub", "entry")
+        cache.writeAtomic(path, "one")
+        cache.writeAtomic(path, "two")
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), "two")
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["entry"])
+
+    def test_failed_write_leaves_no_temp_file(self):
+        # (renaming a file over a directory fails)
+        path = os.path.join(self.tmp, "entry")
+        os.mkdir(path)
+        self.assertRaises(OSError, cache.writeAtomic, path, "data")
+        self.assertEqual(os.listdir(self.tmp), ["entry"])
+        self.assertRaises(TypeError, cache.writeAtomic, os.path.join(self.tmp, "other"), None)
+        self.assertEqual(os.listdir(self.tmp), ["entry"])
+
+
+class ObjectCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_store_and_load(self):
+        c = cache.ObjectCache(self.tmp, 1 << 20)
+        self.assertEqual(c.load("a"), None)
+        c.store("a", {"x": [1, 2, 3]})
+        self.assertEqual(c.load("a"), {"x": [1, 2, 3]})
+        # a corrupt entry is just a miss
+        with open(c.entryPath("a"), 'wb') as f:
+            f.write("junk")
+        self.assertEqual(c.load("a"), None)
+
+    def test_evicts_least_recently_used(self):
+        c = cache.ObjectCache(self.tmp, 1 << 20)
+        for key in "abc":
+            c.store(key, os.urandom(1000))
+        size = sum(s for _, s, _ in c.entries())
+        # make a the most recently used, then shrink the cache to fit two entries
+        for age, key in enumerate("bca"):
+            os.utime(c.entryPath(key), (1000 + age, 1000 + age))
+        c.maxBytes = size * 2 // 3 + 1
+        c.evict()
+        self.assertEqual(sorted(os.path.basename(p) for _, _, p in c.entries()),
+                         ["a" + c.suffix, "c" + c.suffix])
+        c.clear()
+        self.assertEqual(c.entries(), [])
+
+    def test_unwritable(self):
+        c = cache.ObjectCache(os.path.join(self.tmp, "file", "graphs"), 1 << 20)
+        open(os.path.join(self.tmp, "file"), "w").close()
+        # (failing to write an entry is only a warning)
+        with quiet() as stderr:
+            c.store("a", 1)
+        self.assertIn("WARNING!", stderr.getvalue())
+        self.assertEqual(c.load("a"), None)
+
+    def test_digests(self):
+        self.assertNotEqual(cache.contentDigest("ab", "c"), cache.contentDigest("a", "bc"))
+        path = os.path.join(self.tmp, "spec")
+        with open(path, "w") as f:
+            f.write("ab")
+        self.assertEqual(cache.fileDigest(path), cache.contentDigest("ab"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from cncframework.events.dag import DAG
+from cncframework.events.compact import CompactDAG
+from cncframework.events.eventgraph import EventGraph
+from cncframework.tests.logs import quiet, stencil_log
+
+
+class CompactDAGTest(unittest.TestCase):
+    def setUp(self):
+        self.dag = DAG({3: set([5, 9]), 5: set([7]), 9: set([7]), 7: set()})
+        self.dag.set_property(3, 'label', 'init')
+        self.dag.set_property(5, 'color', 'red')
+        self.dag.set_property(9, 'color', 'red')
+        self.dag.set_edge_property(3, 9, 'label', 'x')
+
+    def assertSameGraph(self, compact, dag, extra=()):
+        self.assertEqual(sorted(compact), sorted(dag))
+        self.assertEqual(len(compact), len(dag))
+        self.assertEqual(compact.edge_count(), dag.edge_count())
+        for n in dag:
+            self.assertEqual(list(compact.children(n)), sorted(dag.children(n)))
+            self.assertEqual(compact.parents(n), dag.parents(n))
+            props = compact.properties(n)
+            for k in extra:
+                props.pop(k, None)
+            self.assertEqual(props, dag.properties(n))
+            for c in dag.children(n):
+                self.assertEqual(compact.edge_properties(n, c), dag.edge_properties(n, c))
+
+    def test_freeze(self):
+        compact = self.dag.freeze()
+        self.assertSameGraph(compact, self.dag)
+        self.assertTrue(compact.freeze() is compact)
+        self.assertEqual(compact.property(5, 'color'), 'red')
+        self.assertEqual(compact.property(7, 'color', 'black'), 'black')
+        self.assertEqual(compact.edge_property(3, 9, 'label'), 'x')
+        self.assertEqual(compact.edge_property(3, 5, 'label', ''), '')
+        self.assertEqual(compact.edge_properties(5, 9), {})
+        self.assertEqual(compact.topsort()[0], 3)
+        self.assertEqual(compact.critical_path_length(), self.dag.critical_path_length())
+
+    def test_csr_rows(self):
+        compact = self.dag.freeze()
+        offsets, children = compact.csr()
+        rows = dict((compact.node(r), r) for r in range(len(compact)))
+        for n in self.dag:
+            r = compact.row(n)
+            self.assertEqual(rows[n], r)
+            self.assertEqual(sorted(compact.node(c) for c in children[offsets[r]:offsets[r+1]]),
+                             sorted(self.dag.children(n)))
+        offsets, parents = compact.csr(reverse=True)
+        r = compact.row(7)
+        self.assertEqual(sorted(compact.node(p) for p in parents[offsets[r]:offsets[r+1]]), [5, 9])
+
+    def test_transpose(self):
+        t = self.dag.freeze().transpose()
+        for n in self.dag:
+            self.assertEqual(set(t.children(n)), self.dag.parents(n))
+
+    def test_read_only(self):
+        compact = self.dag.freeze()
+        self.assertRaises(TypeError, compact.add_child, 3, 7)
+        self.assertRaises(TypeError, compact.set_property, 3, 'color', 'blue')
+        self.assertRaises(TypeError, compact.remove_node, 3)
+        self.assertRaises(TypeError, CompactDAG.from_dag, DAG({'a': set()}))
+        self.assertNotIn(4, compact)
+        self.assertNotIn('a', compact)
+        self.assertRaises(KeyError, compact.children, 4)
+
+    def test_event_graph(self):
+        with quiet():
+            graph = EventGraph(stencil_log(3, 4))
+        compact = graph.freeze()
+        self.assertSameGraph(compact, graph, extra=('_kind', '_collection'))
+        self.assertEqual(compact.property(0, '_collection'), 'init')
+        kinds = set(compact.property(n, '_kind') for n in compact)
+        self.assertEqual(kinds, set(['step', 'item']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from cncframework.events.dag import DAG
+
+
+def parent_index(dag):
+    """Recompute the parents of each node from the children."""
+    parents = dict((n, set()) for n in dag)
+    for n in dag:
+        for c in dag.children(n):
+            parents[c].add(n)
+    return parents
+
+
+class DAGTest(unittest.TestCase):
+    def setUp(self):
+        # 1 -> 2 -> 4, 1 -> 3 -> 4 -> 5
+        self.dag = DAG({1: set([2, 3]), 2: set([4]), 3: set([4]), 4: set([5]), 5: set()})
+
+    def assertParentsInSync(self):
+        expected = parent_index(self.dag)
+        for n in self.dag:
+            self.assertEqual(self.dag.parents(n), expected[n], n)
+            self.assertEqual(set(self.dag.iter_parents(n)), expected[n], n)
+            self.assertEqual(self.dag.in_degree(n), len(expected[n]), n)
+
+    def test_parents(self):
+        self.assertEqual(self.dag.parents(4), set([2, 3]))
+        self.assertEqual(self.dag.parents(1), set())
+        self.assertParentsInSync()
+
+    def test_children_missing_from_mapping(self):
+        # (leaf nodes can be left out of the mapping)
+        self.dag = DAG({1: set([2, 3]), 2: set([3])})
+        self.assertEqual(sorted(self.dag), [1, 2, 3])
+        self.assertEqual(self.dag.children(3), set())
+        self.assertEqual(self.dag.parents(3), set([1, 2]))
+        self.assertParentsInSync()
+        self.dag.set_property(3, 'label', "leaf")
+        self.assertEqual(len(self.dag.freeze()), 3)
+
+    def test_edits_keep_parents_in_sync(self):
+        dag = self.dag
+        dag.add_child(5, 6)
+        dag.add_parent(6, 3)
+        dag.add_node_with_parents(7, [1, 8])
+        dag.add_node_with_children(9, [1, 10])
+        self.assertParentsInSync()
+        dag.remove_child(1, 2)
+        dag.remove_all_parents(4)
+        self.assertParentsInSync()
+        dag.remove_all_children(9)
+        dag.remove_node(3)
+        self.assertNotIn(3, dag)
+        self.assertParentsInSync()
+
+    def test_contract(self):
+        self.dag.set_edge_label(2, 4, "x")
+        self.dag.contract(4, 2)
+        self.assertNotIn(2, self.dag)
+        self.assertEqual(self.dag.parents(4), set([1, 3]))
+        self.assertEqual(self.dag.edge_label(1, 4), "")
+        self.assertParentsInSync()
+
+    def test_parents_is_a_copy(self):
+        for p in self.dag.parents(4):
+            self.dag.remove_child(p, 4)
+        self.assertEqual(self.dag.parents(4), set())
+
+    def test_transpose(self):
+        t = self.dag.transpose()
+        for n in self.dag:
+            self.assertEqual(set(t.children(n)), self.dag.parents(n))
+            self.assertEqual(t.parents(n), set(self.dag.children(n)))
+
+    def test_paths(self):
+        order = self.dag.topsort()
+        self.assertEqual(sorted(order), [1, 2, 3, 4, 5])
+        for n in self.dag:
+            for c in self.dag.children(n):
+                self.assertTrue(order.index(n) < order.index(c))
+        self.assertEqual(self.dag.critical_path_length(), 4)
+        self.assertEqual(self.dag.edge_count(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from cncframework.events.dag import DAG, wl_fingerprint
+from cncframework.events.diff import GraphDiff
+from cncframework.events.eventgraph import EventGraph
+from cncframework.tests.logs import quiet, stencil_log
+
+
+def graph(lines):
+    with quiet():
+        return EventGraph(lines).freeze()
+
+def mirrored(lines, width):
+    """The same log with the cells numbered from the other end (so the events come in another order)."""
+    def mirror(line):
+        head, tag = line.rstrip("\n").split(" @ ")
+        parts = tag.split(", ")
+        if len(parts) == 2:
+            parts[1] = str(width - 1 - int(parts[1]))
+        return "%s @ %s\n" % (head, ", ".join(parts))
+    return map(mirror, lines)
+
+
+class FingerprintTest(unittest.TestCase):
+    def diamond(self, ids=(1, 2, 3, 4)):
+        a, b, c, d = ids
+        return DAG({a: set([b, c]), b: set([d]), c: set([d]), d: set()})
+
+    def test_stable(self):
+        # (SHA-1 based, so the same on every run and machine)
+        self.assertEqual(self.diamond().fingerprint(), "17411da99b96dcf1fc89051848587c176ef2af60")
+
+    def test_isomorphic_graphs(self):
+        self.assertEqual(self.diamond(), self.diamond((40, 30, 20, 10)))
+        self.assertEqual(self.diamond(), self.diamond().freeze())
+        chain = DAG({1: set([2]), 2: set([3]), 3: set([4]), 4: set()})
+        self.assertNotEqual(self.diamond(), chain)
+        self.assertNotEqual(self.diamond(), DAG({1: set([2]), 2: set(), 3: set([4]), 4: set()}))
+
+    def test_labels(self):
+        g = self.diamond()
+        g.set_property(2, '_collection', 'A')
+        h = self.diamond()
+        h.set_property(3, '_collection', 'A')
+        # the same up to the (symmetric) choice of node
+        self.assertEqual(g.fingerprint(), h.fingerprint())
+        h.set_property(4, '_collection', 'B')
+        self.assertNotEqual(g.fingerprint(), h.fingerprint())
+        self.assertEqual(g.fingerprint(), wl_fingerprint(g.wl_labels()))
+
+
+class GraphDiffTest(unittest.TestCase):
+    def test_same_shape(self):
+        lines = stencil_log(4, 5)
+        d = GraphDiff(graph(lines), graph(mirrored(lines, 5)))
+        self.assertTrue(d.same_shape)
+        self.assertEqual(d.fingerprints[0], d.fingerprints[1])
+        self.assertEqual(d.changed_collections(), [])
+        # (edges are matched by the tags of their ends, and the finalizer gets the last cell)
+        self.assertEqual(dict(d.edges), {("X", "Stencil_finalize"): [1, 1]})
+        self.assertEqual(d.edge_counts[0], d.edge_counts[1])
+
+    def test_different_shape(self):
+        d = GraphDiff(graph(stencil_log(4, 5)), graph(stencil_log(4, 6)))
+        self.assertFalse(d.same_shape)
+        changed = dict(((c.kind, c.name), c) for c in d.changed_collections())
+        # (init prescribes more steps, so its label changed too)
+        self.assertEqual(sorted(changed), [("item", "X"), ("step", "init"), ("step", "stencil")])
+        self.assertEqual([c.kind for c in d.changed_collections()], ["step", "step", "item"])
+        stencil = changed[("step", "stencil")]
+        self.assertEqual((stencil.before, stencil.after, stencil.change), (15, 18, 3))
+        # one more interior step (with three gets) for each time step
+        self.assertEqual((stencil.unmatched_before, stencil.unmatched_after), (0, 3))
+        self.assertEqual(d.edges[("X", "stencil")], [0, 9])
+        self.assertEqual(d.edges[("stencil", "X")], [0, 3])
+        self.assertTrue(all(sign == "+" for sign, _, _ in d.edge_examples[("X", "stencil")]))
+        self.assertTrue(len(d.edge_examples[("X", "stencil")]) <= d.examples)
+
+
+if __name__ == '__main__':
+    unittest.main()
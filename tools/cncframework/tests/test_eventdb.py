@@ -0,0 +1,115 @@
+import gzip, os, shutil, tempfile, unittest
+from argparse import Namespace
+from cncframework.events.binlog import BinaryLog
+from cncframework.events.eventdb import EventDatabase, normalize_tag, parse_instance
+from cncframework.events.logs import EventReader
+from cncframework.tests.logs import stencil_log, write_binary_log
+
+
+class EventDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "events.db")
+        # 3 time steps of 4 cells, where X @ 1, 1 is never put
+        self.lines = stencil_log(3, 4, stall=(1, 1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_instances(self):
+        self.assertEqual(normalize_tag(" 3,4 "), "3, 4")
+        self.assertEqual(parse_instance("data:3,4"), ("data", "3, 4"))
+        self.assertEqual(parse_instance("data @ 3, 4"), ("data", "3, 4"))
+        self.assertEqual(parse_instance("data@3"), ("data", "3"))
+        self.assertRaises(ValueError, parse_instance, "data")
+
+    def test_index(self):
+        with EventDatabase(self.path) as db:
+            self.assertFalse(db.is_indexed())
+            # (small batches, to write some before the end)
+            self.assertEqual(db.index(EventReader(self.lines), batch_size=7), len(self.lines))
+            self.assertFalse(db.timed())
+        with EventDatabase(self.path) as db:
+            self.assertTrue(db.is_indexed())
+            self.assertEqual(db.query("SELECT COUNT(*) FROM events").fetchone()[0], len(self.lines))
+            # all of time step 1, and the one step of time step 2 that has its cells
+            self.assertEqual(db.query("SELECT COUNT(*) FROM steps WHERE done IS NOT NULL").fetchone()[0],
+                             4 + 1)
+            # every GET-DEP is for a step
+            self.assertEqual(db.query("SELECT COUNT(*) FROM deps").fetchone()[0],
+                             sum(1 for line in self.lines if line.startswith("GET-DEP")))
+
+    def test_interrupted_index(self):
+        def events():
+            for k, event in enumerate(EventReader(self.lines)):
+                if k == 20:
+                    raise KeyboardInterrupt
+                yield event
+        with EventDatabase(self.path) as db:
+            # (after some of the events were written)
+            self.assertRaises(KeyboardInterrupt, db.index, events(), batch_size=7)
+        with EventDatabase(self.path) as db:
+            self.assertFalse(db.is_indexed())
+
+    def test_index_command_cleans_up(self):
+        import event_db
+        log = os.path.join(self.tmp, "log.gz")
+        f = gzip.open(log, "wb")
+        f.write("".join(stencil_log(30, 30)))
+        f.close()
+        with open(log, "rb") as f:
+            data = f.read()
+        # (a truncated log fails its CRC check at the end)
+        with open(log, "wb") as f:
+            f.write(data[:len(data) // 2])
+        args = Namespace(logfile=log, db=self.path, force=False, batch_size=100)
+        self.assertRaises(SystemExit, event_db.index, args)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_queries(self):
+        with EventDatabase(self.path) as db:
+            db.index(EventReader(self.lines))
+            # the environment put the first cells, and the steps the rest
+            [(seq, time, worker, coll, tag)] = db.puts("X", "1, 2")
+            self.assertEqual((time, coll, tag), (None, "stencil", "1, 2"))
+            self.assertEqual(self.lines[seq - 1], "PUT X @ 1, 2\n")
+            self.assertEqual(db.puts("X", "0, 0")[0][3:], (None, None))
+            self.assertEqual(db.puts("X", "1, 1"), [])
+            consumers = db.consumers("X", "1, 2")
+            self.assertEqual([(coll, tag) for coll, tag, _ in consumers],
+                             [("stencil", "2, 1"), ("stencil", "2, 2"), ("stencil", "2, 3")])
+            # only the last one ran
+            self.assertEqual([running is None for _, _, running in consumers], [True, True, False])
+            self.assertEqual(db.waiting(), [("Stencil_finalize", "0", "X", "2, 0"),
+                                            ("stencil", "2, 0", "X", "1, 1"),
+                                            ("stencil", "2, 1", "X", "1, 1"),
+                                            ("stencil", "2, 2", "X", "1, 1")])
+            self.assertEqual(db.waiting("Y"), [])
+            delays = dict(((coll, tag), delay) for coll, tag, delay in db.put_to_run())
+            # (no step that gets X @ 1, 0 ran, and no step gets X @ 2, 3)
+            self.assertNotIn(("X", "1, 0"), delays)
+            self.assertNotIn(("X", "2, 3"), delays)
+            self.assertEqual(delays[("X", "0, 0")], self.lines.index("RUNNING stencil @ 1, 0\n"))
+            self.assertTrue(all(delay > 0 for delay in delays.itervalues()))
+            self.assertEqual(sorted(db.put_to_run("X")), sorted(db.put_to_run()))
+            self.assertEqual(db.put_to_run("Y"), [])
+
+    def test_binary_log(self):
+        prefix = os.path.join(self.tmp, "cnc_events")
+        write_binary_log(prefix, self.lines, workers=2)
+        with EventDatabase(self.path) as db, BinaryLog(prefix) as log:
+            db.index(log)
+            self.assertTrue(db.timed())
+            [(seq, time, worker, coll, tag)] = db.puts("X", "1, 2")
+            self.assertEqual((coll, tag), ("stencil", "1, 2"))
+            # (the events are 1 ns apart, in the order of the text log)
+            self.assertEqual(time, 1000 + self.lines.index("PUT X @ 1, 2\n"))
+            for coll, tag, delay in db.put_to_run():
+                self.assertEqual(delay, min(
+                    self.lines.index("RUNNING %s @ %s\n" % step[:2])
+                    for step in db.consumers(coll, tag) if step[2] is not None)
+                    - self.lines.index("PUT %s @ %s\n" % (coll, tag)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+import os, re, shutil, subprocess, tempfile, unittest
+from distutils.spawn import find_executable
+from cncframework import graph, parser
+from cncframework.graph import packTagWords, packTag, unpackTag
+
+U64 = (1 << 64) - 1
+
+def signed_shift(n):
+    """1LL << n, which is only defined in C for n < 63."""
+    if not 0 <= n < 63:
+        raise ValueError("1LL << %d overflows" % n)
+    return "%d" % (1 << n)
+
+def c_eval(expr, **env):
+    """Evaluate one of the generated C tag expressions (casts, shifts, masks and tests)."""
+    expr = re.sub(r"\((u64|cncTag_t)\)", "", expr)
+    expr = re.sub(r"\b1LL << (\d+)", lambda m: signed_shift(int(m.group(1))), expr)
+    expr = expr.replace("&&", " and ")
+    return eval(expr, {}, env)
+
+def signed(word):
+    word &= U64
+    return word - (1 << 64) if word >> 63 else word
+
+def make_graph(spec, tuning=None):
+    g = graph.CnCGraph("Test", parser.cncGraphSpec.parseString(spec, parseAll=True))
+    if tuning:
+        g.addTunings(parser.cncTuningSpec.parseString(tuning, parseAll=True))
+    return g
+
+
+class PackTagTest(unittest.TestCase):
+    CASES = [[1, 63], [20, 20, 24], [8] * 8 + [64], [64, 1, 31, 32], [33, 33, 33], [64]]
+
+    def round_trip(self, bits, values):
+        names = ["x%d" % k for k in range(len(bits))]
+        words = [c_eval(w, **dict(zip(names, values))) & U64 for w in packTag(bits, names)]
+        return [signed(c_eval(x, w=words)) for x in unpackTag(bits, "w")]
+
+    def test_layout(self):
+        self.assertEqual(packTagWords([20, 20, 24]), ([(0, 0), (0, 20), (0, 40)], 1))
+        self.assertEqual(packTagWords([33, 33, 33]), ([(0, 0), (1, 0), (2, 0)], 3))
+        self.assertEqual(packTagWords([8] * 8 + [64]), ([(0, 8 * k) for k in range(8)] + [(1, 0)], 2))
+        self.assertEqual(packTagWords([64, 1, 31, 32]), ([(0, 0), (1, 0), (1, 1), (1, 32)], 2))
+
+    def test_round_trip_at_field_boundaries(self):
+        for bits in self.CASES:
+            for k, b in enumerate(bits):
+                top = (1 << 63) - 1 if b == 64 else (1 << b) - 1
+                for value in (0, 1, top - 1, top):
+                    # the field at its boundary, with every other field all ones
+                    values = [(1 << 63) - 1 if c == 64 else (1 << c) - 1 for c in bits]
+                    values[k] = value
+                    self.assertEqual(self.round_trip(bits, values), values, (bits, values))
+
+    def test_components_are_masked(self):
+        # an out-of-range component doesn't spill into its neighbors
+        self.assertEqual(self.round_trip([8, 8, 48], [1, 0x1ff, 2]), [1, 0xff, 2])
+        self.assertEqual(self.round_trip([8, 8, 48], [1, -1, 2]), [1, 0xff, 2])
+        # (a full word keeps any value)
+        self.assertEqual(self.round_trip([64, 8], [-1, 3]), [-1, 3])
+        self.assertEqual(self.round_trip([64], [-(1 << 63)]), [-(1 << 63)])
+
+
+CC = find_executable("cc") or find_executable("gcc")
+
+@unittest.skipUnless(CC, "no C compiler")
+class PackTagCTest(unittest.TestCase):
+    """The generated packing, unpacking and range checks, compiled as C."""
+    CASES = PackTagTest.CASES
+    PROGRAM = """
+#include <stdio.h>
+#include <stdint.h>
+typedef uint64_t u64;
+typedef int64_t cncTag_t;
+int main(void) {
+    int k;
+    long long v[16];
+    while (scanf("%%d", &k) == 1) {
+        switch (k) {
+%s
+        }
+        printf("\\n");
+    }
+    return 0;
+}
+"""
+    CASE = """
+        case %d: {
+            int n;
+            for (n = 0; n < %d; n++) scanf("%%lld", &v[n]);
+            { %s
+              u64 w[] = { %s };
+              %s }
+            break;
+        }"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def compile(self):
+        cases = []
+        g = graph.CnCGraph("Test", parser.cncGraphSpec.parseString(TuningTest.SPEC, parseAll=True))
+        for k, bits in enumerate(self.CASES):
+            names = ["x%d" % i for i in range(len(bits))]
+            decls = " ".join("cncTag_t x%d = v[%d];" % (i, i) for i in range(len(bits)))
+            prints = " ".join('printf("%%lld %%d ", (long long)%s, (int)(%s));' % (x, cond)
+                              for x, (_, cond) in zip(unpackTag(bits, "w"), g.tagBitsChecks(bits, names)))
+            cases.append(self.CASE % (k, len(bits), decls, ", ".join(packTag(bits, names)), prints))
+        source = os.path.join(self.tmp, "tags.c")
+        with open(source, "w") as f:
+            f.write(self.PROGRAM % "".join(cases))
+        program = os.path.join(self.tmp, "tags")
+        subprocess.check_call([CC, "-O2", "-Wall", "-Werror", "-o", program, source])
+        return program
+
+    def test_compiled(self):
+        inputs, expected = [], []
+        for k, bits in enumerate(self.CASES):
+            for b in set(bits):
+                top = (1 << 63) - 1 if b == 64 else (1 << b) - 1
+                for value in (-1, 0, top, top + 1):
+                    if value > (1 << 63) - 1:
+                        continue
+                    values = [value if c == b else 1 for c in bits]
+                    inputs.append(" ".join(map(str, [k] + values)))
+                    out = []
+                    for v, c in zip(values, bits):
+                        fits = 0 <= v and (c >= 63 or v < (1 << c))
+                        out.append((v if c == 64 else v & ((1 << c) - 1), int(fits)))
+                    expected.append(out)
+        proc = subprocess.Popen([self.compile()], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        output, _ = proc.communicate("\n".join(inputs) + "\n")
+        self.assertEqual(proc.returncode, 0)
+        results = []
+        for line in output.splitlines():
+            fields = map(int, line.split())
+            results.append(zip(fields[::2], fields[1::2]))
+        self.assertEqual(results, expected)
+
+
+class TuningTest(unittest.TestCase):
+    SPEC = """
+        [ int A: i, j ];
+        [ double *B: i ];
+        [ float C: i ];
+        [ int D: i = A: i, i ];
+        [ int *E: i = A: i, 0 ];
+        ( $initialize: () ) -> [ A: 0, 0 ], ( s: 0, 0 );
+        ( s: i, j ) <- [ a @ A: i, j ] -> [ C: i ];
+        ( $finalize: () ) <- [ C: 0 ];
+    """
+
+    def test_tag_bits_checks(self):
+        g = make_graph(self.SPEC, "[ A ]: { tagBits: [4, 60] }; ( s ): { tagBits: [64, 8] };")
+        self.assertEqual(g.itemTagBits("A"), [4, 60])
+        self.assertEqual(g.itemTagBits("C"), None)
+        self.assertEqual(g.stepTagBits("s"), [64, 8])
+        self.assertEqual(g.itemTagWords("A", ["i", "j"]), packTag([4, 60], ["i", "j"]))
+        self.assertEqual(g.itemTagWords("C", ["i"]), ["i"])
+        for bits, tag in ((g.itemTagBits("A"), ["i", "j"]), (g.stepTagBits("s"), ["i", "j"]),
+                          ([63, 1], ["i", "j"])):
+            for (x, cond), b in zip(g.tagBitsChecks(bits, tag), bits):
+                top = (1 << 63) - 1 if b == 64 else (1 << b) - 1
+                for value, ok in ((-1, False), (0, True), (top, True), (top + 1, b == 64)):
+                    if value <= (1 << 63) - 1:
+                        self.assertEqual(bool(c_eval(cond, **{x: value})), ok, (cond, value))
+
+    def test_tag_bits_errors(self):
+        for tuning in ("[ A ]: { tagBits: [4] };", "[ A ]: { tagBits: [0, 8] };",
+                       "[ A ]: { tagBits: [8, 65] };", "[ A ]: { tagBits: 8 };"):
+            g = make_graph(self.SPEC, tuning)
+            self.assertRaises(AssertionError, g.itemTagBits, "A")
+
+    def test_item_is_scalar(self):
+        g = make_graph(self.SPEC)
+        self.assertTrue(g.itemIsScalar("A"))
+        self.assertFalse(g.itemIsScalar("B"))
+        self.assertTrue(g.itemIsScalar("C"))
+        # virtual collections go by their target collection
+        self.assertTrue(g.itemIsScalar("D"))
+        self.assertFalse(g.itemIsScalar("E"))
+
+
+class StepInputsTest(unittest.TestCase):
+    SPEC = """
+        [ double X: i ];
+        ( $initialize: () ) -> [ X: 0 ], ( s: 0 );
+        ( s: i ) <- [ a @ X: i ], $if (i > 0) { [ b @ X: i-1 ], [ c @ X: $range(0, i) ] },
+                    [ d @ X: i+1 ] $when(i < #n)
+                 -> [ X: i+1 ];
+        ( $finalize: () ) <- [ X: 0 ];
+    """
+
+    def test_enabled_conditions(self):
+        step = make_graph(self.SPEC).stepFunctions["s"]
+        conds = dict((x.binding, x.enabledCond) for x in step.inputItems)
+        self.assertEqual(conds, {"a": None, "b": "i > 0", "c": "i > 0", "d": "i < ctx->n"})
+
+    def test_enabled_input_count(self):
+        step = make_graph(self.SPEC).stepFunctions["s"]
+        self.assertEqual(step.inputCountExpr, "1 + 1 + i + 1")
+        # (the profiled gets only count the inputs that were fetched)
+        for i, n, expected in ((0, 5, 2), (3, 5, 6), (3, 3, 5), (0, 0, 1)):
+            self.assertEqual(eval(self.ternary(step.enabledInputCountExpr), {}, {"i": i, "n": n}), expected)
+
+    def ternary(self, expr):
+        """Turn the C conditional expressions ((c) ? (a) : 0) into Python."""
+        return re.sub(r"\(\((.*?)\) \? \((.*?)\) : 0\)", r"((\2) if (\1) else 0)", expr).replace("ctx->", "")
+
+
+if __name__ == '__main__':
+    unittest.main()
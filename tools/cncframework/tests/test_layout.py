@@ -0,0 +1,68 @@
+import json
+import random
+import unittest
+from cncframework.events.dag import DAG
+from cncframework.events.eventgraph import EventGraph
+from cncframework.events.layout import LayeredLayout, _inversions
+from cncframework.tests.logs import quiet, stencil_log
+
+
+def stencil(steps, width):
+    with quiet():
+        return EventGraph(stencil_log(steps, width)).freeze()
+
+def tangled():
+    """Two levels whose rows (in the order Kahn's algorithm finds them) have two crossings."""
+    return DAG({0: set([4]), 1: set([3]), 2: set([3, 4]), 3: set(), 4: set()})
+
+
+class LayeredLayoutTest(unittest.TestCase):
+    def test_inversions(self):
+        rng = random.Random(7)
+        for n in (0, 1, 2, 5, 40):
+            values = [rng.randint(0, 9) for _ in range(n)]
+            expected = sum(1 for i in range(n) for j in range(i+1, n) if values[i] > values[j])
+            self.assertEqual(_inversions(list(values)), expected)
+
+    def test_untangle(self):
+        self.assertEqual(LayeredLayout(tangled(), sweeps=0).crossings(), 2)
+        layout = LayeredLayout(tangled())
+        self.assertEqual(layout.crossings(), 0)
+        x = dict((layout.graph.node(row), layout.x[row]) for row in xrange(5))
+        # (each level is centered, one unit apart)
+        self.assertEqual(sorted(x[node] for node in (0, 1, 2)), [-1.0, 0.0, 1.0])
+        self.assertEqual(sorted(x[node] for node in (3, 4)), [-0.5, 0.5])
+        # the node with both children goes between the other two
+        self.assertEqual(x[2], 0.0)
+
+    def test_stencil(self):
+        g = stencil(4, 5)
+        layout = LayeredLayout(g)
+        self.assertEqual([len(rows) for rows in layout.rows], [1] + [5] * 7 + [1])
+        for level, rows in enumerate(layout.rows):
+            for row in rows:
+                self.assertEqual(layout.y[row], level)
+        self.assertTrue(layout.crossings() <= LayeredLayout(g, sweeps=0).crossings())
+
+    def test_json(self):
+        with quiet():
+            g = EventGraph(stencil_log(3, 3))
+        g.set_property(0, 'label', "</script>")
+        g = g.freeze()
+        layout = LayeredLayout(g)
+        text = layout.to_json()
+        self.assertNotIn("</", text)
+        data = json.loads(text)
+        n = len(g)
+        for key in ('ids', 'x', 'y', 'labels', 'color', 'item', 'running'):
+            self.assertEqual(len(data[key]), n)
+        self.assertEqual(data['labels'][0], "</script>")
+        self.assertEqual(len(data['edges']), 2 * sum(len(g.children(node)) for node in g))
+        self.assertEqual(sum(data['item']), sum(1 for node in g if g.property(node, '_kind') == "item"))
+        # the prescribe edges (from init to the steps) are listed by index
+        self.assertEqual(len(data['prescribe']), sum(1 for node in g
+                                                     if g.property(node, '_kind') == "step") - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
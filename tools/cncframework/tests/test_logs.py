@@ -0,0 +1,122 @@
+import bz2, gzip, os, shutil, tempfile, unittest
+from distutils.spawn import find_executable
+from cncframework.events.logs import (Event, EventReader, open_events, open_log, parse_event,
+                                      tail_lines, _event_re)
+from cncframework.tests.logs import stencil_log
+
+# well-formed lines (the fast path), and everything else
+LINES = [
+    "PUT X @ 1, 2\n",
+    "PRESCRIBED stencil @ 0\n",
+    "GET-DEP X @ 3",
+    "DONE s @ -1, 2, 3 \n",
+    "RUNNING\ts @ 4\n",
+    "PUT  X @ 1\n",
+    " PUT X @ 1\n",
+    "PUT X@1\n",
+    "PUT X @ \n",
+    "PUT X @\n",
+    "PUT X Y @ 1\n",
+    "PUT X @ 1 @ 2\n",
+    "hello world\n",
+    "\n",
+    "PUT X @ 1\r\n",
+]
+
+def regex_event(line):
+    """Parse a line with the regex alone."""
+    match = _event_re.match(line)
+    return Event(*match.groups()) if match else None
+
+
+class EventReaderTest(unittest.TestCase):
+    def test_fast_path_matches_regex(self):
+        for line in LINES:
+            self.assertEqual(parse_event(line), regex_event(line), repr(line))
+        reader = EventReader(LINES)
+        expected = [e for e in map(regex_event, LINES) if e]
+        self.assertEqual(list(reader), expected)
+        self.assertEqual((reader.line_count, reader.event_count), (len(LINES), len(expected)))
+        self.assertEqual(expected[0], ("PUT", "X", "1, 2", None, None))
+        self.assertEqual(expected[3], ("DONE", "s", "-1, 2, 3 ", None, None))
+
+    def test_counts_accumulate(self):
+        lines = stencil_log(3, 3)
+        reader = EventReader(iter(lines))
+        events = list(reader)
+        self.assertEqual(len(events), len(lines))
+        self.assertEqual(reader.event_count, len(lines))
+        # (the counts are kept if the iteration stops early)
+        reader = EventReader(lines)
+        for k, _ in enumerate(reader):
+            if k == 4:
+                break
+        self.assertEqual(reader.event_count, 5)
+
+
+class OpenLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.lines = stencil_log(4, 5, stall=(2, 2))
+        self.text = "".join(self.lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, path):
+        with open_events(path) as events:
+            return [(e.action, e.label, e.tag) for e in events]
+
+    def expected(self):
+        return [(e.action, e.label, e.tag) for e in EventReader(self.lines)]
+
+    def test_plain(self):
+        path = os.path.join(self.tmp, "log.txt")
+        with open(path, "w") as f:
+            f.write(self.text)
+        self.assertTrue(isinstance(open_log(path), file))
+        self.assertEqual(self.read(path), self.expected())
+
+    def test_gzip(self):
+        # (detected by the contents, not the name)
+        path = os.path.join(self.tmp, "log.txt")
+        f = gzip.open(path, "wb")
+        f.write(self.text)
+        f.close()
+        self.assertEqual(self.read(path), self.expected())
+
+    def test_bzip2(self):
+        path = os.path.join(self.tmp, "log.bz2")
+        with open(path, "wb") as f:
+            f.write(bz2.compress(self.text))
+        self.assertEqual(self.read(path), self.expected())
+
+    @unittest.skipUnless(find_executable("xz"), "no xz")
+    def test_xz(self):
+        import subprocess
+        path = os.path.join(self.tmp, "log.xz")
+        with open(path, "wb") as f:
+            proc = subprocess.Popen(["xz", "-c"], stdin=subprocess.PIPE, stdout=f)
+            proc.communicate(self.text)
+        self.assertEqual(self.read(path), self.expected())
+
+    def test_tail(self):
+        path = os.path.join(self.tmp, "log.txt")
+        out = open(path, "w")
+        # the log grows a piece (ending mid-line) each time the reader is idle
+        pieces = ["PUT X @ 1\nPUT X", " @ 2\n", "", "PUT X @ 3\n"]
+        def idle():
+            if pieces:
+                out.write(pieces.pop(0))
+                out.flush()
+        lines = []
+        for line in tail_lines(open(path), poll=0, idle=idle):
+            lines.append(line)
+            if len(lines) == 3:
+                break
+        out.close()
+        self.assertEqual(lines, ["PUT X @ 1\n", "PUT X @ 2\n", "PUT X @ 3\n"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os, shutil, tempfile, unittest
+from cncframework.events.profile import (MAGIC, RECORD_FORMAT, SUFFIX, ENQUEUE, STEP,
+                                         read_profile, summarize, percentile)
+from cncframework.tests.logs import write_record_log
+
+NAMES = ["X", "stencil", "Stencil_finalize"]
+TAG_MAX = 2
+
+def enqueue(time, coll, worker, tag):
+    return (time, 0, coll, worker, ENQUEUE, len(tag), 0, 0) + tag + (0,) * (TAG_MAX - len(tag))
+
+def step(start, end, coll, worker, tag, puts, gets):
+    return (start, end, coll, worker, STEP, len(tag), puts, gets) + tag + (0,) * (TAG_MAX - len(tag))
+
+
+class ProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.tmp, "cnc_profile")
+        # the steps are enqueued on worker 0, and run on both workers
+        write_record_log("%s.0.%s" % (self.prefix, SUFFIX), MAGIC, RECORD_FORMAT, TAG_MAX, 0, 1, NAMES, [
+            enqueue(100, 1, 0, (1, 0)),
+            enqueue(110, 1, 0, (1, 1)),
+            step(120, 170, 1, 0, (1, 0), 1, 2),
+            step(200, 210, 2, 0, (0,), 0, 1),
+        ])
+        write_record_log("%s.1.%s" % (self.prefix, SUFFIX), MAGIC, RECORD_FORMAT, TAG_MAX, 1, 1, NAMES, [
+            step(130, 160, 1, 1, (1, 1), 1, 3),
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        profiles = read_profile(self.prefix)
+        self.assertEqual([(p.label, p.tag, p.worker, p.start, p.end, p.puts, p.gets) for p in profiles], [
+            ("stencil", (1, 0), 0, 120, 170, 1, 2),
+            ("stencil", (1, 1), 1, 130, 160, 1, 3),
+            ("Stencil_finalize", (0,), 0, 200, 210, 0, 1),
+        ])
+        # enqueue records are matched up across the workers' files
+        self.assertEqual([p.wait for p in profiles], [20, 20, None])
+        self.assertEqual([p.duration for p in profiles], [50, 30, 10])
+        self.assertEqual(read_profile(self.prefix + ".1." + SUFFIX), profiles)
+
+    def test_summarize(self):
+        summaries = summarize(read_profile(self.prefix))
+        self.assertEqual([s.label for s in summaries], ["stencil", "Stencil_finalize"])
+        stencil, final = summaries
+        self.assertEqual((stencil.count, stencil.total, stencil.mean, stencil.max), (2, 80, 40.0, 50))
+        self.assertEqual((stencil.puts, stencil.gets, stencil.wait), (2, 5, 20.0))
+        self.assertEqual(final.wait, None)
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([7], 90), 7)
+        self.assertEqual(percentile([], 50), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
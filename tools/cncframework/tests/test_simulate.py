@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+from cncframework.events.dag import DAG
+from cncframework.events.eventgraph import EventGraph
+from cncframework.events.simulate import Simulator, POLICIES, spec_priorities
+from cncframework.tests.logs import quiet, stencil_log
+
+
+def stencil(steps, width):
+    with quiet():
+        return EventGraph(stencil_log(steps, width)).freeze()
+
+def fork():
+    """A short step (1) enabling a long one (2), and two medium steps (3, 4)."""
+    return DAG({1: set([2]), 2: set(), 3: set(), 4: set()})
+
+FORK_COSTS = {1: 1.0, 2: 4.0, 3: 2.0, 4: 2.0}
+
+STENCIL_SPEC = """
+    [ int X: t, i ];
+    ( $initialize: () ) -> [ X: 0, 0 ], ( stencil: 1, 0 );
+    ( stencil: t, i ) <- [ x @ X: t-1, i ] -> [ X: t, i ];
+    ( $finalize: () ) <- [ X: 0, 0 ];
+"""
+
+
+class SimulatorTest(unittest.TestCase):
+    def test_bounds(self):
+        sim = Simulator(stencil(6, 8))
+        self.assertFalse(sim.timed)
+        self.assertEqual(sim.work, 1 + 5 * 8 + 1)
+        for policy in POLICIES:
+            # one worker does all the work, and enough workers only wait for the critical path
+            self.assertEqual(sim.run(1, policy), sim.work)
+            self.assertEqual(sim.run(8, policy), 7)
+            for workers in (2, 3, 5):
+                makespan = sim.run(workers, policy)
+                # (Graham's bound for greedy schedules)
+                self.assertTrue(7 <= makespan <= sim.work / float(workers) + 7)
+
+    def test_priority(self):
+        sim = Simulator(fork(), cost=FORK_COSTS.get, priority={1: 1, 2: 1, 3: 0, 4: 0}.get)
+        self.assertTrue(sim.timed)
+        self.assertEqual(sim.work, 9.0)
+        # the long step starts at 1, while the others share the second worker
+        self.assertEqual(sim.run(2, 'priority'), 5.0)
+        sim = Simulator(fork(), cost=FORK_COSTS.get, priority={1: 0, 2: 0, 3: 1, 4: 1}.get)
+        self.assertEqual(sim.run(2, 'priority'), 7.0)
+
+    def test_free_nodes(self):
+        # nodes that cost nothing (e.g. items) don't take a worker
+        sim = Simulator(fork(), cost={1: 1.0, 2: 4.0, 3: 0.0, 4: 0.0}.get)
+        self.assertEqual(sim.run(1), 5.0)
+        self.assertEqual(Simulator(DAG({1: set(), 2: set()}), cost=lambda n: 0).run(2), 0.0)
+
+    def test_cycle(self):
+        sim = Simulator(DAG({1: set([2]), 2: set([3]), 3: set([2])}), cost=lambda n: 1)
+        for policy in POLICIES:
+            self.assertRaises(ValueError, sim.run, 2, policy)
+
+
+class SpecPrioritiesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def priorities(self, tuning):
+        g = stencil(3, 4)
+        spec = self.write("Stencil.cnc", STENCIL_SPEC)
+        priority = spec_priorities(g, spec, [self.write("Stencil.tuning.cnc", tuning)])
+        return dict((g.property(n, 'label'), priority(n)) for n in g)
+
+    def test_priorities(self):
+        p = self.priorities("( stencil ): { priority: i + 10 * t - $RANKS };")
+        self.assertEqual(p["stencil: 1,0"], 9)
+        self.assertEqual(p["stencil: 2,3"], 22)
+        self.assertEqual((p["init"], p["X: 1,0"], p["Stencil_finalize: 0"]), (0, 0, 0))
+        p = self.priorities("( stencil ): { priority: t == 2 && !(i > 1) };")
+        self.assertEqual([p["stencil: 2,%d" % i] for i in range(4)], [True, True, False, False])
+        self.assertFalse(p["stencil: 1,0"])
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, self.priorities, "( stencil ): { priority: i > 1 ? 1 : 0 };")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os, shutil, sys, tempfile, threading, unittest
+from cncframework.events.logs import EventReader
+from cncframework.events.stalls import (StallState, StallTracker, find_stalls, follow_stalls,
+                                        stall_report, _chunk_jobs)
+from cncframework.tests.logs import stencil_log
+
+
+def single_pass(lines):
+    return StallState(start=True).read(EventReader(lines))
+
+def chunked(lines, size):
+    """Read the lines in chunks of size lines, and merge the chunks' states in order."""
+    state = StallState(start=True)
+    for start in range(0, len(lines), size):
+        state.merge(StallState().read(EventReader(lines[start:start+size])))
+    return state
+
+
+class StallStateTest(unittest.TestCase):
+    def setUp(self):
+        self.lines = stencil_log(4, 5, stall=(2, 3))
+        # cut off in the middle of a step, so it's still running
+        self.unfinished = self.lines[:-1]
+
+    def test_finds_stalled_steps(self):
+        report = single_pass(self.lines).report()
+        self.assertEqual(report[0], "*** STALLED STEPS ***")
+        stalled = report[1:report.index("")]
+        self.assertEqual(stalled, ["stencil (3, 2) [('X', (2, 3))]",
+                                   "stencil (3, 3) [('X', (2, 3))]",
+                                   "stencil (3, 4) [('X', (2, 3))]"])
+        self.assertEqual(report[report.index("") + 1:], ["*** RUNNING STEPS ***"])
+        report = single_pass(self.unfinished).report()
+        self.assertEqual(report[report.index("") + 1:],
+                         ["*** RUNNING STEPS ***", "Stencil_finalize (0,)"])
+
+    def test_chunked_merge_matches_single_pass(self):
+        for lines in (self.lines, self.unfinished):
+            expected = single_pass(lines).report()
+            for size in (1, 2, 3, 5, 7, 16, len(lines)):
+                self.assertEqual(chunked(lines, size).report(), expected,
+                                 "chunks of %d lines" % size)
+
+    def test_chunk_jobs_split_by_bytes(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "events.log")
+            with open(path, "w") as f:
+                f.writelines(self.unfinished)
+            expected = single_pass(self.unfinished).report()
+            for size in (1, 10, 100, 1000):
+                with open(path) as log:
+                    fn, jobs = _chunk_jobs(log, size)
+                    state = StallState(start=True)
+                    for job in jobs:
+                        state.merge(fn(job))
+                self.assertEqual(state.report(), expected, "chunks of %d bytes" % size)
+            self.assertEqual(find_stalls(path, jobs=2, chunk_size=64).report(), expected)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_chunk_jobs_batch_unseekable_logs(self):
+        expected = single_pass(self.unfinished).report()
+        fn, jobs = _chunk_jobs(iter(self.unfinished), 50)
+        state = StallState(start=True)
+        for job in jobs:
+            state.merge(fn(job))
+        self.assertEqual(state.report(), expected)
+
+
+class StallTrackerTest(unittest.TestCase):
+    def test_matches_stall_state(self):
+        lines = stencil_log(4, 5, stall=(2, 3))[:-1]
+        tracker = StallTracker()
+        for event in EventReader(lines):
+            tracker.process(event)
+        self.assertEqual(stall_report(tracker.stalled(), tracker.running()),
+                         single_pass(lines).report())
+        self.assertEqual(tracker.missing_items(), {"X": 1})
+
+    def test_missing_items_of_stalled_steps_only(self):
+        tracker = StallTracker()
+        for event in EventReader(["GET-DEP X @ 1\n", "GET-DEP X @ 2\n", "PRESCRIBED s @ 1\n",
+                                  "GET-DEP X @ 3\n", "PRESCRIBED s @ 2\n",
+                                  "GET-DEP X @ 2\n", "PRESCRIBED s @ 3\n"]):
+            tracker.process(event)
+        self.assertEqual(tracker.missing_items(), {"X": 3})
+        # the items that steps which have since run (or been prescribed again
+        # without them) were waiting on don't count
+        for event in EventReader(["RUNNING s @ 1\n", "PRESCRIBED s @ 2\n"]):
+            tracker.process(event)
+        self.assertEqual(tracker.missing_items(), {"X": 1})
+        tracker.process(next(iter(EventReader(["DONE s @ 3\n"]))))
+        self.assertEqual(tracker.missing_items(), {})
+
+    def test_follow_idle_stdin(self):
+        # a run that stalls and then stops writing (but doesn't close the pipe)
+        read_fd, write_fd = os.pipe()
+        snapshots = []
+        def snapshot(tracker):
+            snapshots.append(tracker.stalled())
+            if len(snapshots) == 3:
+                os.close(write_fd)
+        stdin, sys.stdin = sys.stdin, os.fdopen(read_fd)
+        try:
+            os.write(write_fd, "".join(stencil_log(3, 3, stall=(1, 1))))
+            thread = threading.Thread(target=follow_stalls, args=("-", snapshot, 0.02, 0.01))
+            thread.daemon = True
+            thread.start()
+            thread.join(10)
+            self.assertFalse(thread.is_alive())
+        finally:
+            sys.stdin.close()
+            sys.stdin = stdin
+        self.assertEqual(len(snapshots), 3)
+        self.assertTrue(all(stalled for stalled in snapshots))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import json, os, shutil, tempfile, unittest
+from collections import defaultdict
+from StringIO import StringIO
+from cncframework.events.binlog import BinaryLog
+from cncframework.events.logs import EventReader
+from cncframework.events.trace import write_trace
+from cncframework.tests.logs import stencil_log, write_binary_log
+
+
+def trace(events):
+    out = StringIO()
+    writer = write_trace(events, out)
+    return writer, json.loads(out.getvalue())
+
+
+class TraceWriterTest(unittest.TestCase):
+    def check_slices(self, events):
+        """Check that the B/E events of each thread nest (in time order); return the B count."""
+        tracks = defaultdict(list)
+        for e in events:
+            if e["ph"] in "BE":
+                tracks[(e["pid"], e["tid"])].append(e)
+        count = 0
+        for track in tracks.itervalues():
+            depth = 0
+            # (B before E at the same time)
+            for e in sorted(track, key=lambda e: (e["ts"], e["ph"] == "E")):
+                depth += 1 if e["ph"] == "B" else -1
+                self.assertTrue(depth >= 0)
+                count += e["ph"] == "B"
+            self.assertEqual(depth, 0)
+        return count
+
+    def check_flows(self, events):
+        """Check that each flow has one start and one (later) finish; return the flow count."""
+        flows = defaultdict(dict)
+        for e in events:
+            if e["ph"] in "sf":
+                self.assertNotIn(e["ph"], flows[e["id"]])
+                flows[e["id"]][e["ph"]] = e
+        for flow in flows.itervalues():
+            self.assertEqual(sorted(flow), ["f", "s"])
+            self.assertEqual(flow["s"]["name"], flow["f"]["name"])
+            self.assertTrue(flow["s"]["ts"] <= flow["f"]["ts"])
+        return len(flows)
+
+    def test_text_log(self):
+        lines = stencil_log(4, 5, stall=(2, 2))
+        writer, data = trace(EventReader(lines))
+        events = data["traceEvents"]
+        self.assertEqual(writer.event_count, len(lines))
+        ran = sum(1 for line in lines if line.startswith("RUNNING"))
+        self.assertEqual(self.check_slices(events), ran)
+        # a flow for each item a step that ran got
+        flows = self.check_flows(events)
+        self.assertEqual(flows, writer.flow_count)
+        ran_steps = set(line.split(" ", 1)[1] for line in lines if line.startswith("RUNNING"))
+        gets, step_gets = 0, []
+        for line in lines:
+            if line.startswith("GET-DEP"):
+                step_gets.append(line)
+            elif line.startswith("PRESCRIBED"):
+                if line.split(" ", 1)[1] in ran_steps:
+                    gets += len(step_gets)
+                step_gets = []
+        self.assertEqual(flows, gets)
+        puts = sum(1 for line in lines if line.startswith("PUT"))
+        self.assertEqual(sum(1 for e in events if e["ph"] == "i"), puts)
+        # (one microsecond per event, all on worker 0)
+        self.assertEqual(max(e.get("ts", 0) for e in events), len(lines))
+        self.assertEqual(set(e["tid"] for e in events if "tid" in e), set([0]))
+
+    def test_binary_log(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            prefix = os.path.join(tmp, "cnc_events")
+            lines = stencil_log(4, 5)
+            write_binary_log(prefix, lines, workers=3)
+            with BinaryLog(prefix) as log:
+                writer, data = trace(log)
+        finally:
+            shutil.rmtree(tmp)
+        events = data["traceEvents"]
+        self.assertEqual(data["displayTimeUnit"], "ns")
+        self.assertEqual(self.check_slices(events), 3 * 5 + 1)
+        self.assertEqual(self.check_flows(events), writer.flow_count)
+        threads = [e for e in events if e["ph"] == "M" and e["name"] == "thread_name"]
+        self.assertEqual(sorted(e["tid"] for e in threads), [0, 1, 2])
+        # (the times start at 0, in microseconds)
+        self.assertEqual(min(e["ts"] for e in events if "ts" in e), 0)
+        self.assertEqual(max(e["ts"] for e in events if "ts" in e), (len(lines) - 1) / 1000.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
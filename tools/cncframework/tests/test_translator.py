@@ -0,0 +1,316 @@
+import json, os, shutil, socket, sys, tempfile, threading, time, unittest
+from contextlib import contextmanager
+from StringIO import StringIO
+import unified_translator
+from unified_translator import UnifiedTranslator
+
+SPEC = """
+[ int X: () ];
+[ int Y: () ];
+( $initialize: () ) -> ( SX: 1 ), ( SY: 2 );
+( SX: x ) -> [ X: () ];
+( SY: y ) -> [ Y: () ];
+( $finalize: () ) <- [ X: () ], [ Y: () ];
+"""
+
+@contextmanager
+def captured():
+    """Capture what's printed on stdout and stderr."""
+    streams = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = StringIO(), StringIO()
+    try:
+        yield sys.stdout, sys.stderr
+    finally:
+        sys.stdout, sys.stderr = streams
+
+def read_tree(root):
+    """Return {relative path: contents} for the files under root."""
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if not os.path.islink(path):
+                with open(path, 'rb') as f:
+                    files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def absolute_paths():
+    """
+    Make sys.path and the paths of the loaded modules absolute. The
+    translator changes directory (see translate), and the tests may have
+    been started with relative paths (e.g. python -m unittest puts "" first
+    in sys.path), unlike the translator script.
+    """
+    sys.path[:] = [os.path.abspath(p) for p in sys.path]
+    for module in sys.modules.values():
+        path = getattr(module, '__file__', None)
+        if path and not os.path.isabs(path):
+            module.__file__ = os.path.abspath(path)
+        if hasattr(module, '__path__'):
+            module.__path__[:] = [os.path.abspath(p) for p in module.__path__]
+
+
+class TranslatorTestCase(unittest.TestCase):
+    """Runs the translator on a small spec, in a new directory for each test."""
+    @classmethod
+    def setUpClass(cls):
+        absolute_paths()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmp, "cache")
+        self.work = self.project("work")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def project(self, name, spec=SPEC):
+        path = os.path.join(self.tmp, name)
+        os.mkdir(path)
+        self.write_spec(path, spec)
+        return path
+
+    def write_spec(self, path, spec):
+        with open(os.path.join(path, "Simple.cnc"), "w") as f:
+            f.write(spec)
+
+    def translate(self, *args, **kwargs):
+        """Return (exit status, stdout, stderr) of translating the spec in cwd (default: work)."""
+        argv = ["--cache-dir", self.cacheDir] + list(args) + ["Simple.cnc"]
+        with captured() as (out, err):
+            status = unified_translator.translate("ucnc_t", argv, kwargs.get('cwd', self.work))
+        return status, out.getvalue(), err.getvalue()
+
+    def assertTranslates(self, *args, **kwargs):
+        status, out, err = self.translate(*args, **kwargs)
+        self.assertEqual(status, 0, err)
+        return out
+
+
+class GraphCacheTest(TranslatorTestCase):
+    def setUp(self):
+        super(GraphCacheTest, self).setUp()
+        # count the times the specs are parsed
+        self.parses = 0
+        parse = UnifiedTranslator.parse_graph
+        def counted(translator):
+            self.parses += 1
+            return parse(translator)
+        UnifiedTranslator.parse_graph = counted
+        self.addCleanup(setattr, UnifiedTranslator, 'parse_graph', parse)
+
+    def entries(self):
+        return sorted(os.listdir(os.path.join(self.cacheDir, "graphs")))
+
+    def test_hit(self):
+        self.assertTranslates()
+        self.assertEqual(self.parses, 1)
+        self.assertEqual(len(self.entries()), 1)
+        first = read_tree(self.work)
+        self.assertTranslates()
+        self.assertEqual(self.parses, 1)
+        # (the same spec in another directory hits too)
+        other = self.project("other")
+        self.assertTranslates(cwd=other)
+        self.assertEqual(self.parses, 1)
+        self.assertEqual(read_tree(self.work), first)
+        self.assertEqual(read_tree(other), first)
+
+    def test_spec_change(self):
+        self.assertTranslates()
+        self.write_spec(self.work, SPEC.replace("[ int Y: () ]", "[ double Y: () ]"))
+        self.assertTranslates()
+        self.assertEqual(self.parses, 2)
+        self.assertEqual(len(self.entries()), 2)
+        with open(os.path.join(self.work, "cnc_support", "x86", "Simple.h")) as f:
+            self.assertIn("cncPutValue_Y(double _value", f.read())
+
+    def test_no_cache(self):
+        self.assertTranslates("--no-cache")
+        self.assertTranslates("--no-cache")
+        self.assertEqual(self.parses, 2)
+        self.assertFalse(os.path.exists(self.cacheDir))
+
+
+class IncrementalTest(TranslatorTestCase):
+    def support_files(self):
+        """Return the paths of the generated support files, marked with an old mtime."""
+        support = os.path.join(self.work, "cnc_support", "x86")
+        paths = [os.path.join(support, name) for name in os.listdir(support)]
+        for path in paths:
+            os.utime(path, (1000, 1000))
+        return paths
+
+    def rewritten(self, paths):
+        return sorted(os.path.basename(p) for p in paths if os.stat(p).st_mtime != 1000)
+
+    def test_skips_unchanged_files(self):
+        self.assertTranslates()
+        paths = self.support_files()
+        out = self.assertTranslates("--incremental")
+        self.assertEqual(self.rewritten(paths), [])
+        self.assertIn("Wrote 0 file(s), skipped %d unchanged" % len(paths), out)
+        # only the files that depend on the changed collection are written
+        self.write_spec(self.work, SPEC.replace("[ int Y: () ]", "[ double Y: () ]"))
+        out = self.assertTranslates("--incremental")
+        changed = self.rewritten(paths)
+        self.assertIn("Simple.h", changed)
+        self.assertNotIn("cncocr.c", changed)
+        self.assertIn("Wrote %d file(s)" % len(changed), out)
+
+    def test_rewrites_without_incremental(self):
+        self.assertTranslates()
+        paths = self.support_files()
+        self.assertTranslates()
+        self.assertEqual(len(self.rewritten(paths)), len(paths))
+
+
+class PlatformsAndJobsTest(TranslatorTestCase):
+    def test_parallel_matches_serial(self):
+        self.assertTranslates("-p", "ocr", "-p", "icnc")
+        serial = read_tree(self.work)
+        parallel = self.project("parallel")
+        self.assertTranslates("-j", "4", "-p", "ocr", "-p", "icnc", cwd=parallel)
+        self.assertEqual(read_tree(parallel), serial)
+
+    def test_several_platforms(self):
+        out = self.assertTranslates("-p", "ocr/x86", "-p", "icnc", "-p", "ocr/x86")
+        both = read_tree(self.work)
+        self.assertTrue(os.path.isdir(os.path.join(self.work, "cnc_support", "icnc")))
+        # the same files as translating for each platform on its own
+        alone = {}
+        for platform in ("icnc", "ocr/x86"):
+            path = self.project(platform.replace("/", "-"))
+            self.assertTranslates("-p", platform, cwd=path)
+            alone.update(read_tree(path))
+        self.assertEqual(both, alone)
+        # (the shared user files are only written once, and the Makefile
+        # link goes to the first platform's makefile)
+        self.assertEqual(out.count("Writing file: ./Simple.c\n"), 1)
+        self.assertEqual(os.readlink(os.path.join(self.work, "Makefile")), "Makefile.x86")
+
+    def test_bad_jobs(self):
+        status, _, err = self.translate("-j", "0")
+        self.assertEqual(status, 1)
+        self.assertIn("ERROR! Number of jobs must be positive", err)
+
+
+class TemplateCacheTest(TranslatorTestCase):
+    def setUp(self):
+        super(TemplateCacheTest, self).setUp()
+        self.addCleanup(unified_translator._templateEnvs.clear)
+
+    def entries(self):
+        """Return the paths of the cached templates, marked with an old mtime."""
+        cacheDir = os.path.join(self.cacheDir, "templates")
+        paths = sorted(os.path.join(cacheDir, name) for name in os.listdir(cacheDir))
+        for path in paths:
+            os.utime(path, (1000, 1000))
+        return paths
+
+    def translate(self, *args, **kwargs):
+        # (start each run with new template environments, as a new process
+        # would, so the templates come from the disk cache)
+        unified_translator._templateEnvs.clear()
+        return super(TemplateCacheTest, self).translate(*args, **kwargs)
+
+    def test_precompile(self):
+        out = self.assertTranslates("--precompile-templates")
+        self.assertIn("Compiled", out)
+        entries = self.entries()
+        self.assertTrue(entries)
+        # translating only loads the precompiled templates, and gives the same files
+        self.assertTranslates("-p", "ocr", "-p", "ocr/tg", "-p", "icnc/tcp")
+        self.assertEqual([p for p in entries if os.stat(p).st_mtime != 1000], [])
+        self.assertEqual(self.entries(), entries)
+        fresh = self.project("fresh")
+        self.assertTranslates("--no-cache", "-p", "ocr", "-p", "ocr/tg", "-p", "icnc/tcp", cwd=fresh)
+        self.assertEqual(read_tree(self.work), read_tree(fresh))
+
+    def test_corrupt_entries(self):
+        self.assertTranslates()
+        expected = read_tree(self.work)
+        entries = self.entries()
+        for path in entries:
+            with open(path, "wb") as f:
+                f.write("junk")
+        other = self.project("other")
+        self.assertTranslates(cwd=other)
+        self.assertEqual(read_tree(other), expected)
+        # (and the entries are compiled again)
+        for path in entries:
+            with open(path, "rb") as f:
+                self.assertNotEqual(f.read(), "junk")
+
+    def test_precompile_without_cache(self):
+        status, _, err = self.translate("--precompile-templates", "--no-cache")
+        self.assertEqual(status, 1)
+        self.assertIn("ERROR! Can't precompile templates with caching disabled", err)
+
+
+class BatchAndServeTest(TranslatorTestCase):
+    def test_batch_reports_failures(self):
+        self.project("good2")
+        self.project("bad", SPEC.replace("->", "=>", 1))
+        manifest = os.path.join(self.tmp, "specs.txt")
+        with open(manifest, "w") as f:
+            f.write("# specs to translate\n"
+                    "work Simple.cnc\n"
+                    "bad Simple.cnc\n"
+                    "missing Simple.cnc\n"
+                    "\n"
+                    "good2 -p icnc Simple.cnc\n")
+        with captured() as (out, err):
+            status = unified_translator.main("ucnc_t", ["--batch", manifest, "--cache-dir", self.cacheDir])
+        self.assertEqual(status, 1)
+        out = out.getvalue()
+        self.assertIn("Translated 4 spec(s), 2 failed.", out)
+        failed = [line.split(None, 1)[1] for line in out.splitlines() if line.startswith("FAILED:")]
+        self.assertEqual(failed, [os.path.join(self.tmp, "bad"), os.path.join(self.tmp, "missing")])
+        self.assertIn("Can't change to directory", err.getvalue())
+        # the entries after the failures were still translated (with their own args)
+        self.assertTrue(os.path.isfile(os.path.join(self.work, "cnc_support", "x86", "Simple.h")))
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp, "good2", "cnc_support", "icnc", "Simple.h")))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "bad", "cnc_support")))
+
+    def request(self, path, request):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(path)
+            stream = conn.makefile('rw')
+            stream.write(json.dumps(request) + "\n")
+            stream.flush()
+            return json.loads(stream.readline())
+        finally:
+            conn.close()
+
+    def test_serve(self):
+        path = os.path.join(self.tmp, "server.sock")
+        status = []
+        def run():
+            status.append(unified_translator.serve("ucnc_t", path, ["--cache-dir", self.cacheDir]))
+        with captured():
+            server = threading.Thread(target=run)
+            server.daemon = True
+            server.start()
+            for _ in range(500):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.01)
+            reply = self.request(path, {'cwd': self.work, 'args': ["-p", "icnc", "Simple.cnc"]})
+            self.assertEqual(reply['status'], 0, reply['stderr'])
+            self.assertIn("Wrote", reply['stdout'])
+            self.assertTrue(os.path.isfile(os.path.join(self.work, "cnc_support", "icnc", "Simple.h")))
+            # a failed request gets its error, and the server keeps going
+            reply = self.request(path, {'cwd': self.work, 'args': ["Missing.cnc"]})
+            self.assertEqual(reply['status'], 1)
+            self.assertIn("Missing.cnc", reply['stderr'])
+            self.assertEqual(self.request(path, {'shutdown': True}), {'status': 0})
+            server.join(10)
+        self.assertEqual(status, [0])
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,68 +1,89 @@
 #!/usr/bin/env python
-import sys, os, os.path
-from collections import defaultdict
+import sys, os, os.path, time
+from argparse import ArgumentParser, ArgumentTypeError
+from multiprocessing import cpu_count
+from cncframework.events.stalls import find_stalls, follow_stalls, stall_report
 
-def die_with_usage():
-    bin_name = os.environ['BIN_NAME'] or sys.argv[0]
-    sys.exit("Usage: {0} LOG_FILE".format(bin_name))
+def positive_int(value):
+    try:
+        n = int(value)
+    except ValueError:
+        n = 0
+    if n <= 0:
+        raise ArgumentTypeError("expected a positive integer, got %r" % value)
+    return n
 
-argc = len(sys.argv)
-if argc == 2:
-    infile = sys.argv[1]
-else:
-    die_with_usage()
+bin_name = os.environ.get('BIN_NAME') or sys.argv[0]
+arg_parser = ArgumentParser(prog=bin_name,
+        description="Report the steps that were stalled or still running in a CnC event log.")
+arg_parser.add_argument('infile', metavar='LOG_FILE', help="CnC log file to process "
+        "(may be compressed with gzip, bzip2 or xz; - reads stdin), "
+        "or the prefix of a binary (CNC_DEBUG_BINLOG) log")
+arg_parser.add_argument('-j', '--jobs', type=positive_int, nargs='?', const=cpu_count(), default=1,
+        help="Parse the log in chunks, with this many processes (default: number of CPUs)")
+arg_parser.add_argument('--chunk-size', type=positive_int, default=64, metavar='MB',
+        help="Size of the chunks to parse in parallel (default: %(default)s MB)")
+arg_parser.add_argument('--mem-limit', type=positive_int, metavar='MB',
+        help="Limit the memory (address space) of each process to this many MB")
+arg_parser.add_argument('-f', '--follow', action="store_true",
+        help="Follow a (text) log that's still being written, and print the stalled steps "
+             "every --interval seconds, until interrupted (or until stdin is closed)")
+arg_parser.add_argument('--interval', type=float, default=10, metavar='SECONDS',
+        help="Time between snapshots when following a log (default: %(default)s)")
+arg_parser.add_argument('--snapshot', metavar='FILE',
+        help="When following a log, write each snapshot to this file (replacing the "
+             "last one) instead of printing it")
+args = arg_parser.parse_args()
 
-if not os.path.exists(infile):
-    print "ERROR! File not found:", infile
-    die_with_usage()
+def snapshot(tracker, last_count=[None]):
+    header = "=== %s: %d events" % (time.strftime("%Y-%m-%d %H:%M:%S"), tracker.event_count)
+    if tracker.event_count == last_count[0]:
+        # nothing's changed (which is worth knowing, if steps are stalled)
+        if not args.snapshot:
+            print header + ", no new events ==="
+            sys.stdout.flush()
+        return
+    last_count[0] = tracker.event_count
+    stalled = tracker.stalled()
+    lines = [header + ", %d stalled steps, %d running ===" % (
+            len(stalled), len(tracker.steps) - len(stalled))]
+    missing = tracker.missing_items()
+    if missing:
+        lines.append("Missing items: " + ", ".join("%s (%d)" % c for c in sorted(missing.iteritems())))
+    lines.extend(stall_report(stalled))
+    if args.snapshot:
+        # (write a new file and rename it, so it's never seen half written)
+        with open(args.snapshot + ".tmp", 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.rename(args.snapshot + ".tmp", args.snapshot)
+    else:
+        print "\n".join(lines)
+        print
+        sys.stdout.flush()
 
-items = defaultdict(set)
-steps = defaultdict(dict)
-deps = []
+if args.follow:
+    try:
+        tracker = follow_stalls(args.infile, snapshot, args.interval)
+    except IOError as e:
+        arg_parser.error(e)
+    for cmd in tracker.unknown:
+        print "Unknown command", cmd
+    for line in stall_report(tracker.stalled(), tracker.running()):
+        print line
+    sys.exit(0)
 
 # Parse the file
-with open(infile, 'r') as f:
-    for line in f:
-        # parse line
-        lhs, rhs = line.split(" @ ")
-        cmd, coll = lhs.split(" ")
-        tag = tuple(map(int, rhs.split(", ")))
-        # handle
-        if cmd == 'PUT':
-            items[coll].add(tag)
-        elif cmd == 'GET-DEP':
-            deps.append((coll, tag))
-        elif cmd == 'PRESCRIBED':
-            steps[coll][tag] = deps
-            deps = []
-        elif cmd == 'RUNNING':
-            steps[coll][tag] = []
-        elif cmd == 'DONE':
-            del steps[coll][tag]
-        else:
-            print "Unknown command", cmd
+try:
+    state = find_stalls(args.infile, args.jobs, args.chunk_size << 20,
+                        args.mem_limit and args.mem_limit << 20)
+except IOError as e:
+    arg_parser.error(e)
+except MemoryError:
+    sys.exit("ERROR! Out of memory (try a smaller --chunk-size, or fewer --jobs)")
 
-def withFinalizerLast(x):
-    collName = x[0]
-    return (collName.endswith("_finalize"), x)
+for cmd in state.unknown:
+    print "Unknown command", cmd
 
-# Which steps are stuck?
-running = []
-print "*** STALLED STEPS ***"
-for collname, coll in sorted(steps.iteritems(), key=withFinalizerLast):
-    for tag, stepdeps in sorted(coll.iteritems()):
-        missing = []
-        for dep in sorted(stepdeps):
-            icoll, itag = dep
-            if not itag in items[icoll]:
-                missing.append(dep)
-        if missing:
-            print collname, tag, missing
-        else:
-            running.append((collname, tag))
-
-# Which steps were still running at exit?
-print
-print "*** RUNNING STEPS ***"
-for collname, tag in sorted(running):
-    print collname, tag
+# Which steps are stuck? Which steps were still running at exit?
+for line in state.report():
+    print line
@@ -0,0 +1,245 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os, sys, gzip
+from argparse import ArgumentParser
+from cncframework.events.eventgraph import EventGraph
+from cncframework.events.logs import open_events
+from cncframework.events.analysis import LevelAnalysis, WorkSpan
+from cncframework.events.profile import read_profile, summarize
+from cncframework.events.trace import write_trace
+from cncframework.events.simulate import Simulator, POLICIES, spec_priorities
+from cncframework.events.diff import GraphDiff
+
+def load_graph(args, logfile=None):
+    """Build the (frozen) event graph for a log file."""
+    with open_events(logfile or args.logfile) as events:
+        return EventGraph(events, not args.no_prescribe).freeze()
+
+def node_label(graph, node):
+    return graph.property(node, 'label', str(node))
+
+def summary(args):
+    graph = load_graph(args)
+    analysis = LevelAnalysis(graph)
+    kinds = [graph.property(n, '_kind') for n in graph]
+    profile = analysis.profile()
+    widest = max(xrange(len(profile)), key=profile.__getitem__) if profile else 0
+    print "Nodes: %d (%d steps, %d items)" % (len(graph), kinds.count("step"), kinds.count("item"))
+    print "Edges: %d" % graph.edge_count()
+    print "Levels (longest path): %d" % analysis.depth
+    print "Parallelism: max %d (level %d), average %.2f" % (
+            profile[widest] if profile else 0, widest, analysis.average_parallelism())
+
+def profile(args):
+    analysis = LevelAnalysis(load_graph(args))
+    print "# level\twidth"
+    for level, width in enumerate(analysis.profile()):
+        print "%d\t%d" % (level, width)
+
+def critical_path(args):
+    graph = load_graph(args)
+    length, path = LevelAnalysis(graph).longest_path()
+    print "Critical path (%d nodes):" % length
+    for node in path:
+        print "  %s" % node_label(graph, node)
+
+def work_span(args):
+    ws = WorkSpan(load_graph(args))
+    if ws.timed:
+        unit = "us"
+        fmt = lambda cost: "%.1f us" % (cost / 1000.0)
+    else:
+        unit = "steps"
+        fmt = lambda cost: "%d steps" % cost
+    print "Work: %s" % fmt(ws.work)
+    print "Span: %s" % fmt(ws.span)
+    print "Average parallelism: %.2f" % ws.parallelism
+    print
+    print "Critical path steps by collection:"
+    for name, steps, cost in ws.critical_collections():
+        print "  %-30s %6d  %s (%.1f%%)" % (name, steps, fmt(cost),
+                100.0 * cost / ws.span if ws.span else 0.0)
+    width, histogram = ws.histogram(args.buckets)
+    print
+    print "# start (%s)\tparallelism" % unit
+    scale = 1000.0 if ws.timed else 1.0
+    for i, p in enumerate(histogram):
+        print "%.1f\t%.2f" % (i * width / scale, p)
+
+def simulate(args):
+    graph = load_graph(args)
+    priority = None
+    if args.spec:
+        try:
+            priority = spec_priorities(graph, args.spec, args.tuning_spec or [])
+        except ValueError as e:
+            raise SystemExit("ERROR! %s" % e)
+    sim = Simulator(graph, priority=priority)
+    policies = args.policy or sorted(POLICIES)
+    scale, unit = (1000.0, "us") if sim.timed else (1, "steps")
+    print "# Work: %g %s" % (sim.work / scale, unit)
+    print "# workers\t" + "\t".join("%s (%s)\tspeedup" % (p, unit) for p in policies)
+    for workers in xrange(1, args.workers + 1):
+        row = [str(workers)]
+        for policy in policies:
+            makespan = sim.run(workers, policy)
+            row.append("%g\t%.2f" % (makespan / scale, sim.work / makespan if makespan else 0.0))
+        print "\t".join(row)
+
+def trace(args):
+    if args.output == "-":
+        out = sys.stdout
+    elif args.output.endswith(".gz"):
+        out = gzip.open(args.output, 'wb')
+    else:
+        out = open(args.output, 'wb')
+    try:
+        with open_events(args.logfile) as events:
+            writer = write_trace(events, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if out is not sys.stdout:
+        print "Wrote %d events and %d flows to %s" % (writer.event_count, writer.flow_count, args.output)
+
+def timing(args):
+    def us(ns):
+        return "-" if ns is None else "%.1f" % (ns / 1000.0)
+    try:
+        profiles = read_profile(args.profile)
+    except IOError as e:
+        raise SystemExit("ERROR! %s" % e)
+    print "# collection\tcount\ttotal\tmean\tp50\tp90\tp99\tmax\tputs\tgets\twait (times in us)"
+    for s in summarize(profiles):
+        print "\t".join([s.label, str(s.count), us(s.total), us(s.mean), us(s.p50),
+                         us(s.p90), us(s.p99), us(s.max), str(s.puts), str(s.gets), us(s.wait)])
+    if args.top > 0:
+        print
+        print "Slowest steps:"
+        for p in sorted(profiles, key=lambda p: p.duration, reverse=True)[:args.top]:
+            print "  %10s us  %s @ %s (worker %d)" % (us(p.duration), p.label,
+                    ", ".join(map(str, p.tag)) or "0", p.worker)
+
+def diff(args):
+    d = GraphDiff(load_graph(args, args.before), load_graph(args, args.after),
+                  examples=args.examples)
+    if d.timed:
+        fmt = lambda cost: "%.1f us" % (cost / 1000.0)
+    else:
+        fmt = lambda cost: "%d steps" % cost
+    def change(before, after):
+        return "%+.1f%%" % (100.0 * (after - before) / before) if before else "new"
+    before, after = d.work_span
+    if d.same_shape:
+        print "Same shape (fingerprint %s)" % d.fingerprints[0]
+    else:
+        print "Different shapes (fingerprints %s -> %s)" % d.fingerprints
+    print "Nodes: %d -> %d" % (len(d.before), len(d.after))
+    print "Edges: %d -> %d" % d.edge_counts
+    print "Work: %s -> %s (%s)" % (fmt(before.work), fmt(after.work), change(before.work, after.work))
+    print "Span: %s -> %s (%s)" % (fmt(before.span), fmt(after.span), change(before.span, after.span))
+    print "Average parallelism: %.2f -> %.2f" % (before.parallelism, after.parallelism)
+    collections = d.changed_collections()
+    if collections:
+        print
+        print "# collection\tkind\tbefore\tafter\tchange\treshaped\t%s before\tafter\tchange" % (
+                "time (us)" if d.timed else "steps")
+        scale = 1000.0 if d.timed else 1
+        for c in collections:
+            print "%s\t%s\t%d\t%d\t%+d\t%d\t%g\t%g\t%s" % (c.name, c.kind, c.before, c.after,
+                    c.change, max(c.unmatched_before, c.unmatched_after),
+                    c.cost_before / scale, c.cost_after / scale,
+                    change(c.cost_before, c.cost_after) if c.kind == "step" else "-")
+    if d.edges:
+        print
+        print "Edges changed (removed, added) by collections:"
+        for (fr, to), (removed, added) in sorted(d.edges.iteritems()):
+            print "  %s -> %s: -%d +%d" % (fr, to, removed, added)
+            for sign, fr_label, to_label in d.edge_examples[(fr, to)]:
+                print "    %s %s -> %s" % (sign, fr_label, to_label)
+    print
+    print "Critical path steps by collection (before -> after):"
+    for name, (steps0, cost0), (steps1, cost1) in d.critical_path_shift():
+        print "  %-30s %6d -> %-6d %s -> %s" % (name, steps0, steps1, fmt(cost0), fmt(cost1))
+    if args.check and not d.same_shape:
+        sys.exit(1)
+
+def main():
+    bin_name = os.environ.get('BIN_NAME') or "cncframework_ea"
+    arg_parser = ArgumentParser(prog=bin_name,
+            description="Analyze the dynamic graphs of CnC event logs.")
+    # arguments common to all the subcommands
+    log_parser = ArgumentParser(add_help=False)
+    log_parser.add_argument('logfile', help="CnC log file to process "
+            "(may be compressed with gzip, bzip2 or xz; - reads stdin), "
+            "or the prefix of a binary (CNC_DEBUG_BINLOG) log")
+    log_parser.add_argument('--no-prescribe', action="store_true",
+            help="Do not add prescribe edges to the graph.")
+    subparsers = arg_parser.add_subparsers(title="commands")
+    cmd = subparsers.add_parser('summary', parents=[log_parser],
+            help="Print the size, depth and parallelism of the graph.")
+    cmd.set_defaults(run=summary)
+    cmd = subparsers.add_parser('profile', parents=[log_parser],
+            help="Print the number of nodes in each topological level.")
+    cmd.set_defaults(run=profile)
+    cmd = subparsers.add_parser('critical-path', parents=[log_parser],
+            help="Print the nodes on a longest path through the graph.")
+    cmd.set_defaults(run=critical_path)
+    cmd = subparsers.add_parser('work-span', parents=[log_parser],
+            help="Print the total work, span and average parallelism, the parallelism "
+                 "over time, and the step collections on the critical path "
+                 "(using the step running times from binary logs, or 1 per step otherwise).")
+    cmd.add_argument('--buckets', type=int, default=20, metavar='N',
+            help="Number of time buckets for the parallelism histogram (default: %(default)s)")
+    cmd.set_defaults(run=work_span)
+    cmd = subparsers.add_parser('simulate', parents=[log_parser],
+            help="Replay the graph on 1..N virtual workers under different scheduling "
+                 "policies, and print the predicted makespan and speedup.")
+    cmd.add_argument('-n', '--workers', type=int, default=16, metavar='N',
+            help="Largest number of workers to simulate (default: %(default)s)")
+    cmd.add_argument('-p', '--policy', action='append', choices=sorted(POLICIES),
+            help="Scheduling policy (may be repeated; default: all). lifo is like "
+                 "work-stealing, and priority uses the priority tunings from --spec.")
+    cmd.add_argument('--spec', metavar='CNC_FILE',
+            help="CnC graph spec, for the step priorities")
+    cmd.add_argument('-t', '--tuning-spec', action='append', metavar='TUNING_FILE',
+            help="Tuning spec with step priorities (may be repeated)")
+    cmd.set_defaults(run=simulate)
+    cmd = subparsers.add_parser('trace',
+            help="Write the log as Chrome trace-event JSON (for chrome://tracing or Perfetto), "
+                 "with a track for each worker and the item puts -> gets as flows.")
+    cmd.add_argument('logfile', help="CnC log file to process "
+            "(may be compressed with gzip, bzip2 or xz; - reads stdin), "
+            "or the prefix of a binary (CNC_DEBUG_BINLOG) log, which has the times and workers")
+    cmd.add_argument('-o', '--output', default="-",
+            help="File to write the trace to (gzipped if it ends in .gz; default: stdout)")
+    cmd.set_defaults(run=trace)
+    cmd = subparsers.add_parser('timing',
+            help="Print the step timings from a CNC_PROFILE run, per collection "
+                 "and for the slowest step instances.")
+    cmd.add_argument('profile',
+            help="CNC_PROFILE prefix (or any of the per-worker .prof files)")
+    cmd.add_argument('--top', type=int, default=10, metavar='N',
+            help="Number of slowest step instances to list (default: %(default)s)")
+    cmd.set_defaults(run=timing)
+    cmd = subparsers.add_parser('diff',
+            help="Compare the graphs of two runs (e.g. before and after a spec or tuning "
+                 "change): their shape (by Weisfeiler-Lehman fingerprints), the instances "
+                 "and edges per collection, the work and span, the step time per "
+                 "collection, and the critical path.")
+    cmd.add_argument('before', help="CnC log file (or binary log prefix) of the first run")
+    cmd.add_argument('after', help="CnC log file (or binary log prefix) of the second run")
+    cmd.add_argument('--no-prescribe', action="store_true",
+            help="Do not add prescribe edges to the graphs.")
+    cmd.add_argument('--examples', type=int, default=3, metavar='N',
+            help="Number of changed edges to list for each pair of collections "
+                 "(default: %(default)s)")
+    cmd.add_argument('--check', action="store_true",
+            help="Exit with status 1 if the graphs have different shapes")
+    cmd.set_defaults(run=diff)
+    args = arg_parser.parse_args()
+    args.run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os
+from argparse import ArgumentParser
+from cncframework.events.logs import open_events
+from cncframework.events.eventdb import EventDatabase, parse_instance
+from cncframework.events.profile import percentile
+
+def open_db(args):
+    if not os.path.exists(args.db):
+        raise SystemExit("ERROR! No such database: %s (make it with the index command)" % args.db)
+    db = EventDatabase(args.db)
+    if not db.is_indexed():
+        raise SystemExit("ERROR! Not a (completely) indexed event log: %s" % args.db)
+    return db
+
+def instance(spec):
+    try:
+        return parse_instance(spec)
+    except ValueError as e:
+        raise SystemExit("ERROR! %s" % e)
+
+def index(args):
+    if os.path.exists(args.db):
+        if not args.force:
+            raise SystemExit("ERROR! %s already exists (use -f to replace it)" % args.db)
+        os.remove(args.db)
+    try:
+        events = open_events(args.logfile)
+    except IOError as e:
+        raise SystemExit("ERROR! %s" % e)
+    try:
+        with events, EventDatabase(args.db) as db:
+            count = db.index(events, args.batch_size)
+    except BaseException as e:
+        # don't leave a partly indexed database behind
+        if os.path.exists(args.db):
+            os.remove(args.db)
+        if isinstance(e, IOError):
+            raise SystemExit("ERROR! %s" % e)
+        raise
+    print "Indexed %d events into %s" % (count, args.db)
+
+def who_put(args):
+    collection, tag = instance(args.item)
+    with open_db(args) as db:
+        puts = db.puts(collection, tag)
+        if not puts:
+            print "%s @ %s was never put" % (collection, tag)
+        for seq, time, worker, producer, producer_tag in puts:
+            by = "%s @ %s" % (producer, producer_tag) if producer else "the environment"
+            where = "event %d" % seq
+            if time is not None:
+                where += ", worker %d, %d ns" % (worker, time)
+            print "%s @ %s was put by %s (%s)" % (collection, tag, by, where)
+        consumers = db.consumers(collection, tag)
+        if consumers:
+            print "Got by:"
+        for step, step_tag, running in consumers:
+            print "  %s @ %s%s" % (step, step_tag, "" if running else " (never ran)")
+
+def waiting(args):
+    with open_db(args) as db:
+        last = None
+        for step, step_tag, item, item_tag in db.waiting(args.collection):
+            if (step, step_tag) != last:
+                print "%s @ %s" % (step, step_tag)
+                last = (step, step_tag)
+            print "  waiting on %s @ %s" % (item, item_tag)
+
+def latency(args):
+    with open_db(args) as db:
+        timed = db.timed()
+        if timed:
+            unit, fmt = "us", lambda d: "%.1f" % (d / 1000.0)
+        else:
+            unit, fmt = "events", lambda d: "%.0f" % d
+        delays = {}
+        for collection, tag, delay in db.put_to_run(args.collection):
+            delays.setdefault(collection, []).append((delay, tag))
+    print "# collection\tcount\tmean\tp50\tp90\tp99\tmax (%s from PUT to the first RUNNING of a consumer)" % unit
+    for collection, items in sorted(delays.iteritems()):
+        values = sorted(delay for delay, _ in items)
+        print "\t".join([collection, str(len(values)), fmt(sum(values) / float(len(values))),
+                         fmt(percentile(values, 50)), fmt(percentile(values, 90)),
+                         fmt(percentile(values, 99)), fmt(values[-1])])
+    if args.top > 0:
+        slowest = sorted(((delay, collection, tag) for collection, items in delays.iteritems()
+                          for delay, tag in items), reverse=True)[:args.top]
+        print
+        print "Slowest items:"
+        for delay, collection, tag in slowest:
+            print "  %10s %s  %s @ %s" % (fmt(delay), unit, collection, tag)
+
+def sql(args):
+    with open_db(args) as db:
+        try:
+            cursor = db.query(args.query)
+        except Exception as e:
+            raise SystemExit("ERROR! %s" % e)
+        if cursor.description:
+            print "# " + "\t".join(column[0] for column in cursor.description)
+        for row in cursor:
+            print "\t".join("" if value is None else str(value) for value in row)
+
+def main():
+    bin_name = os.environ.get('BIN_NAME') or "cncframework_db"
+    arg_parser = ArgumentParser(prog=bin_name,
+            description="Index CnC event logs in a SQLite database, and query them.")
+    # arguments common to the query commands
+    db_parser = ArgumentParser(add_help=False)
+    db_parser.add_argument('db', help="Database made by the index command")
+    subparsers = arg_parser.add_subparsers(title="commands")
+    cmd = subparsers.add_parser('index',
+            help="Read an event log into a new database (with tables of the events, "
+                 "steps, items and item dependences of the steps).")
+    cmd.add_argument('logfile', help="CnC log file to process "
+            "(may be compressed with gzip, bzip2 or xz; - reads stdin), "
+            "or the prefix of a binary (CNC_DEBUG_BINLOG) log")
+    cmd.add_argument('db', help="Database file to write")
+    cmd.add_argument('-f', '--force', action="store_true",
+            help="Replace the database if it already exists")
+    cmd.add_argument('--batch-size', type=int, default=50000, metavar='N',
+            help="Number of events to insert at a time (default: %(default)s)")
+    cmd.set_defaults(run=index)
+    cmd = subparsers.add_parser('who-put', parents=[db_parser],
+            help="Print the step that put an item, and the steps that got it.")
+    cmd.add_argument('item', help="Item instance, as COLLECTION:TAG (e.g. data:3,4)")
+    cmd.set_defaults(run=who_put)
+    cmd = subparsers.add_parser('waiting', parents=[db_parser],
+            help="Print the unfinished steps that get items that were never put.")
+    cmd.add_argument('collection', nargs='?',
+            help="Only list the steps waiting on this item collection")
+    cmd.set_defaults(run=waiting)
+    cmd = subparsers.add_parser('latency', parents=[db_parser],
+            help="Print the time from each PUT to the first RUNNING of a step that gets "
+                 "the item, per item collection (in events, for text logs).")
+    cmd.add_argument('collection', nargs='?', help="Only report this item collection")
+    cmd.add_argument('--top', type=int, default=10, metavar='N',
+            help="Number of slowest items to list (default: %(default)s)")
+    cmd.set_defaults(run=latency)
+    cmd = subparsers.add_parser('sql', parents=[db_parser],
+            help="Run an SQL query on the database, and print the rows as TSV.")
+    cmd.add_argument('query', help="e.g. \"SELECT * FROM steps WHERE done IS NULL\"")
+    cmd.set_defaults(run=sql)
+    args = arg_parser.parse_args()
+    args.run(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8 -*-
 
-import subprocess, os
+import subprocess, os, sys, time
 from argparse import ArgumentParser
 from base64 import b64encode
 from os.path import join
 from jinja2 import Environment, PackageLoader, Markup
 from cncframework.events.eventgraph import EventGraph
+from cncframework.events.aggregate import AggregateGraph, bucket_function
+from cncframework.events.logs import open_events
+from cncframework.events.layout import LayeredLayout
 
 loader = PackageLoader('cncframework.events.eventgraph')
 templateEnv = Environment(loader = loader)
@@ -27,22 +30,60 @@ templateEnv.globals['embed_b64'] = embed_b64
 templateEnv.globals['include_raw'] = include_raw
 
 def main():
-    bin_name = os.environ['BIN_NAME'] or "cncframework_eg"
+    bin_name = os.environ.get('BIN_NAME') or "cncframework_eg"
     arg_parser = ArgumentParser(prog=bin_name,
             description="Turn CnC event logs into graphs.")
-    arg_parser.add_argument('logfile', help="CnC log file to process")
+    arg_parser.add_argument('logfile', help="CnC log file to process "
+            "(may be compressed with gzip, bzip2 or xz; - reads stdin), "
+            "or the prefix of a binary (CNC_DEBUG_BINLOG) log")
     arg_parser.add_argument('--html', action="store_true",
-            help="Write to stdout as HTML. Requires dot to be installed.")
+            help="Write to stdout as HTML, with the graph laid out and drawn natively "
+                 "(or by dot, with --dot or --aggregate).")
+    arg_parser.add_argument('--dot', action="store_true",
+            help="With --html, lay out the graph with Graphviz (requires dot to be installed).")
     arg_parser.add_argument('--no-prescribe', action="store_true",
             help="Do not add prescribe edges to the graph produced.")
     arg_parser.add_argument('--horizontal', action="store_true",
-            help="Set rankdir=LR for horizontal graph layout.")
+            help="Set rankdir=LR for horizontal graph layout (dot layouts only).")
+    arg_parser.add_argument('--aggregate', action="store_true",
+            help="Draw one node per step/item collection, with instance and edge counts "
+                 "(for logs too big to draw in full).")
+    arg_parser.add_argument('--bucket', metavar='EXPR',
+            help="With --aggregate, split each collection into a node per value of this "
+                 "Python expression of c (the collection name) and t (the tag, a tuple "
+                 "of ints), e.g. \"t[0] // 16\".")
+    arg_parser.add_argument('--stats', action="store_true",
+            help="Print log processing statistics to stderr.")
     args = arg_parser.parse_args()
+    if args.bucket and not args.aggregate:
+        arg_parser.error("--bucket requires --aggregate")
+    try:
+        bucket = args.bucket and bucket_function(args.bucket)
+    except ValueError as e:
+        arg_parser.error(e)
 
     rankdir = "LR" if args.horizontal else "TB"
-    with open(args.logfile, 'r') as log:
-        graph = EventGraph(log.readlines(), not args.no_prescribe, args.html)
-        if args.html:
+    with open_events(args.logfile) as events:
+        start = time.time()
+        if args.aggregate:
+            try:
+                graph = AggregateGraph(events, not args.no_prescribe, bucket)
+            except ValueError as e:
+                raise SystemExit("ERROR! %s" % e)
+        else:
+            graph = EventGraph(events, not args.no_prescribe, args.html)
+        if args.stats:
+            elapsed = max(time.time() - start, 1e-6)
+            print >>sys.stderr, "Read %d lines (%d events) in %.2fs: %.0f lines/s, %d nodes" % (
+                    events.line_count, events.event_count, elapsed,
+                    events.line_count / elapsed, len(graph))
+        if args.html and not (args.dot or args.aggregate):
+            template = templateEnv.get_template("index.html")
+            print template.render({
+                    'graph_title': args.logfile,
+                    'layout_data': Markup(LayeredLayout(graph).to_json()),
+                }).encode('utf-8')
+        elif args.html:
             template = templateEnv.get_template("index.html")
             gv = subprocess.Popen(['dot', '-Tsvg'], stdin=subprocess.PIPE,
                     stdout=subprocess.PIPE)
@@ -66,5 +66,12 @@ EOF
     exit 1
 fi
 
+# Compile the code-generation templates ahead of time
+# (translator startup then just loads the cached bytecode)
+echo "Precompiling translator templates..."
+(   source venv/bin/activate \
+    && python $ROOT/tools/unified_translator.py --precompile-templates
+) || echo "WARNING: Failed to precompile templates (they will be compiled on first use)."
+
 echo $PATH | fgrep -q "$ROOT" || echo "NOTE: You should add UCNC_ROOT to your PATH."
 echo 'Installation complete!'
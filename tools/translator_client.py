@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# Client for the translator server (ucnc_t --serve SOCKET).
+# Sends the translator args and the current directory to the server,
+# then relays the translator output and exit status. Only uses the
+# standard library, so it starts up much faster than the translator.
+
+import sys, os, json, socket
+from argparse import ArgumentParser
+
+def main():
+    bin_name = os.environ.get('BIN_NAME') or "translator_client"
+    parser = ArgumentParser(prog=bin_name, add_help=False,
+            description="Send a translation request to a running translator server (ucnc_t --serve SOCKET). Any other arguments are passed on to the translator.")
+    parser.add_argument("--socket", default=os.environ.get('UCNC_SERVER'), help="server socket path (default: $UCNC_SERVER)")
+    parser.add_argument("--shutdown", action='store_true', default=False, help="stop the server")
+    parser.add_argument("--client-help", action='help', help="show this help message and exit")
+    args, translatorArgs = parser.parse_known_args()
+    if not args.socket:
+        sys.exit("ERROR! No server socket given (use --socket or set UCNC_SERVER)")
+    if args.shutdown:
+        request = {'shutdown': True}
+    else:
+        request = {'cwd': os.getcwd(), 'args': translatorArgs}
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(args.socket)
+        stream = conn.makefile('rw')
+        stream.write(json.dumps(request) + "\n")
+        stream.flush()
+        reply = json.loads(stream.readline())
+    except (socket.error, ValueError) as e:
+        sys.exit("ERROR! No reply from translator server at {0}: {1}".format(args.socket, e))
+    finally:
+        conn.close()
+    sys.stdout.write(reply.get('stdout', "").encode('utf-8'))
+    sys.stderr.write(reply.get('stderr', "").encode('utf-8'))
+    sys.exit(reply['status'])
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
-import argparse, re, sys, os, glob
+import argparse, re, sys, os, glob, hashlib, multiprocessing
+import json, shlex, socket, traceback
+from StringIO import StringIO
 
-from cncframework import graph, parser
+from cncframework import graph, parser, cache
 
 from jinja2 import Environment, ChoiceLoader, PackageLoader, contextfilter
 
@@ -30,31 +32,60 @@ def makeLink(target, name):
         print "Creating link: {0} -> {1}".format(name, target)
         os.symlink(target, name)
 
+def fileMatches(path, data):
+    """Check if the file at path already holds exactly data (compared by hash)."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).digest() == hashlib.sha1(data).digest()
+    except IOError:
+        return False
+
 def set_exec(path):
     mode = os.stat(path).st_mode
     xbits = (mode & 0444) >> 2
     os.chmod(path, mode | xbits)
 
+# translator whose queued templates are being rendered by a worker pool
+# (the workers are forked, so they inherit it instead of unpickling it)
+_activeTranslator = None
+
+def _render_job(index):
+    return _activeTranslator.render_job(index)
+
+# template environments, keyed on their template paths and bytecode cache
+# (reused across translator runs in batch and server modes)
+_templateEnvs = {}
+
 
 ################################
 ## Unified translator class
 ################################
 
 class UnifiedTranslator(object):
-    def __init__(self, prog_name):
+    def __init__(self, prog_name, argv=None):
         self.prog_name = prog_name
         self.runtime_name = None
         self.cnc_type = None
         self.template_env = None
+        self.template_cache = None
         self.args = None
         self.support_dir = None
         self.makefile = None
+        self.ocr_pure = False
+        # output file counts
+        self.written_count = 0
+        self.unchanged_count = 0
+        self.kept_count = 0
         # templates
-        self.loaders = []
+        self.template_paths = []
         self.support_files = []
         self.user_files = []
+        # queued output files (for all target platforms)
+        self.render_jobs = []
+        self.queued_paths = set()
+        self.makefiles = []
         # all supported platforms
-        platforms = OrderedDict([
+        self.platforms = OrderedDict([
             ("ocr", self.ocr_x86_init),
             ("ocr/x86", self.ocr_x86_init),
             ("ocr/mpi", self.ocr_x86_mpi_init),
@@ -65,34 +96,66 @@ class UnifiedTranslator(object):
             ("icnc/tcp", self.icnc_x86_tcp_init)
         ])
         # argument parsing
-        self.args_init(platforms)
+        self.args_init(self.platforms, argv)
+        # compiled templates are cached on disk (shared by all platforms)
+        if not self.args.no_cache:
+            self.template_cache = cache.TemplateCache(os.path.join(self.args.cache_dir, "templates"))
+        # load the graph model (parsing the specs if needed)
+        # the model is shared by all of the target platforms
+        if not self.args.precompile_templates:
+            self.graph_init()
+
+    def platform_init(self, platform):
+        # reset the per-platform state
+        self.runtime_name = None
+        self.cnc_type = None
+        self.makefile = None
+        self.ocr_pure = self.args.ocr_pure
+        self.template_paths = []
+        self.support_files = []
+        self.user_files = []
         # platform-specific setup
-        platforms[self.args.platform]()
-        # parse graph spec
-        graphAst = parser.cncGraphSpec.parseFile(self.args.specfile, parseAll=True)
-        self.g = graph.CnCGraph(self.graph_name, graphAst)
-        # parse tuning specs
-        for tuningSpec in (self.args.tuning_spec or []):
-            tuningAst = parser.cncTuningSpec.parseFile(tuningSpec, parseAll=True)
-            self.g.addTunings(tuningAst)
+        self.platforms[platform]()
         # set up template environment
         self.templates_init()
 
-    def args_init(self, platforms):
+    def args_init(self, platforms, argv):
         # args setup
         desc="CnC unified C API graph translator tool, version {0}. Parses a CnC graph specification, and generates a project from the specification.".format(__version__)
         self.arg_parser = argparse.ArgumentParser(prog=self.prog_name, description=desc)
         self.arg_parser.add_argument('--version', action='version', version='%(prog)s v{0}'.format(__version__))
-        self.arg_parser.add_argument("-p", "--platform", choices=platforms.keys(), default="ocr", help="target code generation platform")
+        self.arg_parser.add_argument("-p", "--platform", action='append', choices=platforms.keys(), help="target code generation platform (can be repeated to generate several platforms at once)")
         self.arg_parser.add_argument("--ocr-pure", action='store_true', default=False, help="use pure OCR implementation (no platform-specific code)")
         self.arg_parser.add_argument("-t", "--tuning-spec", action='append', help="CnC tuning spec file")
+        self.arg_parser.add_argument("-j", "--jobs", type=int, nargs='?', default=1, const=multiprocessing.cpu_count(), help="number of worker processes for rendering templates (default: %(default)s, or the number of CPUs if no count is given)")
+        self.arg_parser.add_argument("--incremental", action='store_true', default=False, help="only rewrite generated files whose contents changed")
+        self.arg_parser.add_argument("--cache-dir", default=cache.defaultCacheDir(), help="directory for cached graph models and compiled templates (default: %(default)s)")
+        self.arg_parser.add_argument("--cache-size", type=int, default=64, metavar="MB", help="maximum size of the graph model cache (default: %(default)s)")
+        self.arg_parser.add_argument("--no-cache", action='store_true', default=False, help="always re-parse the graph and tuning specs, and recompile the templates")
+        self.arg_parser.add_argument("--precompile-templates", action='store_true', default=False, help="compile the templates for all platforms into the cache, then exit")
+        self.arg_parser.add_argument("--batch", metavar="MANIFEST", help="translate each spec listed in MANIFEST (one directory and optional arguments per line, or '-' for stdin) in a single process")
+        self.arg_parser.add_argument("--serve", metavar="SOCKET", help="run as a server, translating specs for requests sent to the given Unix socket")
         self.arg_parser.add_argument("specfile", nargs='?', default="", help="CnC graph spec file")
         # parse the args
-        self.args = self.arg_parser.parse_args()
-        # check platform name
+        self.args = self.arg_parser.parse_args(argv)
+        if self.args.batch or self.args.serve:
+            # (only reachable from within a batch or server request)
+            self.die("ERROR! Can't use --batch or --serve in a batch entry or server request")
+        # check platform names (dropping duplicates)
         #if not re.match(r'^(?P<runtime>[^/]+)(?:/(?P<conduit>.+))?$', self.args.platform):
-        if not self.args.platform in platforms:
-            die("ERROR! Invalid platform name: " + self.args.platform)
+        targets = OrderedDict()
+        for platform in (self.args.platform or ["ocr"]):
+            if not platform in platforms:
+                self.die("ERROR! Invalid platform name: " + platform)
+            targets[platform] = True
+        self.args.platform = targets.keys()
+        if self.args.jobs < 1:
+            self.die("ERROR! Number of jobs must be positive: {0}".format(self.args.jobs))
+        # no spec file needed for precompiling
+        if self.args.precompile_templates:
+            if self.args.no_cache:
+                self.die("ERROR! Can't precompile templates with caching disabled")
+            return
         # find default spec file
         if not self.args.specfile:
             specs = glob.glob("*.cnc")
@@ -110,9 +173,34 @@ class UnifiedTranslator(object):
             print "WARNING! Spec file name does not end with '.cnc' extension:", self.args.specfile
         self.graph_name = nameMatch.group('name')
 
+    def graph_init(self):
+        specs = [self.args.specfile] + (self.args.tuning_spec or [])
+        if self.args.no_cache:
+            self.g = self.parse_graph()
+            return
+        # cache key covers the spec contents, the translator version, and the
+        # code for the graph model (since that's what we're pickling)
+        specCache = cache.ObjectCache(os.path.join(self.args.cache_dir, "graphs"), self.args.cache_size << 20)
+        key = cache.contentDigest(__version__, self.graph_name,
+                cache.moduleDigest(graph, parser), cache.fileDigest(*specs))
+        self.g = specCache.load(key)
+        if self.g is None:
+            self.g = self.parse_graph()
+            specCache.store(key, self.g)
+
+    def parse_graph(self):
+        # parse graph spec
+        graphAst = parser.cncGraphSpec.parseFile(self.args.specfile, parseAll=True)
+        g = graph.CnCGraph(self.graph_name, graphAst)
+        # parse tuning specs
+        for tuningSpec in (self.args.tuning_spec or []):
+            tuningAst = parser.cncTuningSpec.parseFile(tuningSpec, parseAll=True)
+            g.addTunings(tuningAst)
+        return g
+
     def templates_init(self):
-        # the loaders were specified in reverse
-        self.loaders = self.loaders[::-1]
+        # the template paths were specified in reverse
+        self.template_paths = self.template_paths[::-1]
         # templates shared by all implemenations using the unified C api
         self.add_template_path("common")
         # this last-level path lets you refer to a specific template by
@@ -124,15 +212,20 @@ class UnifiedTranslator(object):
             'cncRuntimeName': self.runtime_name,
             'exit': exit
         }
-        # set up template environment
-        loader = ChoiceLoader(self.loaders)
-        self.template_env = Environment(loader=loader, extensions=['jinja2.ext.with_','jinja2.ext.do'], keep_trailing_newline=True)
-        self.template_env.filters['macro'] = dispatch_macro
+        # set up template environment (or reuse one from an earlier run)
+        cacheDir = self.template_cache and self.template_cache.directory
+        envKey = (tuple(self.template_paths), cacheDir)
+        self.template_env = _templateEnvs.get(envKey)
+        if not self.template_env:
+            loader = ChoiceLoader([PackageLoader("cncframework.templates.unified_c_api", p) for p in self.template_paths])
+            self.template_env = Environment(loader=loader, extensions=['jinja2.ext.with_','jinja2.ext.do'], keep_trailing_newline=True, bytecode_cache=self.template_cache)
+            self.template_env.filters['macro'] = dispatch_macro
+            _templateEnvs[envKey] = self.template_env
         # support dir
         self.support_dir = "./cnc_support/" + self.cnc_type
 
     def add_template_path(self, path):
-        self.loaders.append(PackageLoader("cncframework.templates.unified_c_api", path))
+        self.template_paths.append(path)
 
     def add_support_file(self, path):
         self.support_files.append(path)
@@ -144,35 +237,84 @@ class UnifiedTranslator(object):
         note="\nRun '{0} -h' for usage information.".format(self.arg_parser.prog)
         sys.exit(msg+note)
 
+    def render_template(self, templatepath, params=None, env=None):
+        params = params or self.template_params
+        env = env or self.template_env
+        template = env.get_template(templatepath)
+        contentsRaw = template.render(g=self.g, **params)
+        # strips out whitespace errors (caused by lines with indented template commands)
+        return re.sub(r"[ \t]+(?=[\r\n]|$)", "", contentsRaw).encode('utf-8')
+
+    def render_job(self, index):
+        env, templatepath, params, _, _, _ = self.render_jobs[index]
+        return self.render_template(templatepath, params, env)
+
     def write_template(self, templatepath, filename=None, overwrite=True, destdir=None, executable=False, params=None):
         templatename = os.path.basename(templatepath)
         filename = filename or templatename
         destdir = destdir or self.support_dir
-        params = params or self.template_params
         # prepend graph name to files starting with "_"
         if filename[0] == '_':
             filename = self.graph_name + filename
         outpath = os.path.join(destdir, filename)
+        # user files shared by several target platforms are generated once
+        if outpath in self.queued_paths:
+            return
+        self.queued_paths.add(outpath)
         # don't overwrite user files
-        if overwrite or not os.path.isfile(outpath):
-            template = self.template_env.get_template(templatepath)
-            contentsRaw = template.render(g=self.g, **params)
-            # strips out whitespace errors (caused by lines with indented template commands)
-            contents = re.sub(r"[ \t]+(?=[\r\n]|$)", "", contentsRaw)
-            try:
-                os.remove(filename)
-            except OSError:
-                pass
-            with open(outpath, 'w') as outfile:
-                outfile.write(contents)
-                outfile.close()
-            print "Writing file:", outpath
-            if executable:
-                set_exec(outpath)
-        elif not overwrite:
-            print "Skipping file (already exists):", outpath
-
-    def write_files(self):
+        render = overwrite or not os.path.isfile(outpath)
+        # the template is rendered later (see write_queued)
+        params = dict(params or self.template_params)
+        self.render_jobs.append((self.template_env, templatepath, params, outpath, executable, render))
+
+    def write_output(self, outpath, contents, executable):
+        # leave unchanged files alone (keeps their mtimes for make)
+        if self.args.incremental and fileMatches(outpath, contents):
+            self.unchanged_count += 1
+            return
+        try:
+            os.remove(os.path.basename(outpath))
+        except OSError:
+            pass
+        with open(outpath, 'w') as outfile:
+            outfile.write(contents)
+            outfile.close()
+        print "Writing file:", outpath
+        self.written_count += 1
+        if executable:
+            set_exec(outpath)
+
+    def write_queued(self):
+        pending = [i for i, job in enumerate(self.render_jobs) if job[5]]
+        pool = None
+        if self.args.jobs > 1 and len(pending) > 1:
+            # load all of the templates before forking, so that the
+            # workers share the compiled templates rather than each
+            # worker compiling its own copy
+            for i in pending:
+                env, templatepath = self.render_jobs[i][:2]
+                env.get_template(templatepath)
+            global _activeTranslator
+            _activeTranslator = self
+            pool = multiprocessing.Pool(min(self.args.jobs, len(pending)))
+            results = pool.imap(_render_job, pending)
+        else:
+            results = (self.render_job(i) for i in pending)
+        try:
+            # write the files in order, as their contents become available
+            for _, templatepath, _, outpath, executable, render in self.render_jobs:
+                if render:
+                    self.write_output(outpath, next(results), executable)
+                else:
+                    print "Skipping file (already exists):", outpath
+                    self.kept_count += 1
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+        self.render_jobs = []
+
+    def queue_files(self):
         # set up support dir
         makeDirP(self.support_dir)
         # support files
@@ -195,9 +337,55 @@ class UnifiedTranslator(object):
         self.write_template("Main.c", overwrite=False, destdir=".")
         for f in self.user_files:
             self.write_template(f, overwrite=False, destdir=".")
-        # default makefile link
         if self.makefile:
-            makeLink(self.makefile, "Makefile")
+            self.makefiles.append(self.makefile)
+
+    def check_tunings(self, platform):
+        # some tunings are only implemented on some platforms
+        if self.runtime_name == "cncocr" and self.ocr_pure:
+            counted = [ i.collName for i in self.g.concreteItems if self.g.itemGetCount(i.collName) ]
+            if counted:
+                sys.exit("ERROR! The getCount tuning isn't supported with pure OCR ({0}): {1}".format(platform, ", ".join(counted)))
+            dense = [ i.collName for i in self.g.denseItems() ]
+            if dense:
+                print "WARNING! Dense item collections use hashed tables with pure OCR ({0}):".format(platform), ", ".join(dense)
+
+    def write_files(self):
+        # queue up the files for each target platform
+        for platform in self.args.platform:
+            self.platform_init(platform)
+            self.check_tunings(platform)
+            self.queue_files()
+        # render and write everything
+        self.write_queued()
+        # default makefile link (to the first platform's makefile)
+        if self.makefiles:
+            makeLink(self.makefiles[0], "Makefile")
+        self.report_counts()
+
+    def precompile_templates(self):
+        # the templates are cached by name and path, so we load them with
+        # the same loader setup as the translator for each platform
+        isTemplate = lambda name: not name.endswith((".py", ".pyc", ".pyo"))
+        count = 0
+        for pure in (False, True):
+            self.args.ocr_pure = pure
+            for platform in self.platforms.keys():
+                self.platform_init(platform)
+                for name in self.template_env.list_templates(filter_func=isTemplate):
+                    self.template_env.get_template(name)
+                    count += 1
+        print "Compiled {0} template(s) into {1}".format(count, self.template_cache.directory)
+
+    def run(self):
+        if self.args.precompile_templates:
+            self.precompile_templates()
+        else:
+            self.write_files()
+
+    def report_counts(self):
+        print "Wrote {0} file(s), skipped {1} unchanged and {2} existing user file(s).".format(
+                self.written_count, self.unchanged_count, self.kept_count)
 
     ################################
     ## OCR
@@ -210,7 +398,7 @@ class UnifiedTranslator(object):
         # platform-specific templates
         self.add_template_path("ocr-" + self.cnc_type)
         # override with "pure" implementation, if requested
-        if self.args.ocr_pure:
+        if self.ocr_pure:
             self.add_template_path("ocr-pure")
         # add runtime files
         self.add_support_file("cncocr_platform.h")
@@ -243,7 +431,7 @@ class UnifiedTranslator(object):
     def ocr_tg_init(self):
         # TG always uses pure OCR implementation
         self.cnc_type = "tg"
-        self.args.ocr_pure = True
+        self.ocr_pure = True
         self.ocr_base_init()
         self.add_user_file("config.cfg")
         self.add_user_file("Makefile.tg-x86")
@@ -283,8 +471,137 @@ class UnifiedTranslator(object):
         self.add_user_file(self.makefile)
 
 
+################################
+## Batch and server modes
+################################
+
+def translate(prog_name, argv, cwd="."):
+    """Run the translator with the given arguments in the directory cwd.
+       Returns the exit status (errors are reported on stderr)."""
+    oldCwd = os.getcwd()
+    try:
+        os.chdir(cwd)
+    except OSError as e:
+        print >>sys.stderr, "ERROR! Can't change to directory:", e
+        return 1
+    try:
+        UnifiedTranslator(prog_name, argv).run()
+        return 0
+    except SystemExit as e:
+        # die() exits with a message; argparse exits with a status
+        if isinstance(e.code, basestring):
+            print >>sys.stderr, e.code
+            return 1
+        return e.code or 0
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        os.chdir(oldCwd)
+
+def run_batch(prog_name, manifest, commonArgs):
+    """Translate each entry in the manifest. Entries are lines of the form
+       DIR [ARGS...], where DIR is relative to the manifest's directory, and
+       the common args are added before each entry's own args."""
+    if manifest == "-":
+        lines, baseDir = sys.stdin.readlines(), "."
+    else:
+        with open(manifest) as f:
+            lines, baseDir = f.readlines(), os.path.dirname(manifest)
+    failed = []
+    count = 0
+    for line in lines:
+        entry = shlex.split(line, comments=True)
+        if not entry:
+            continue
+        specDir = os.path.join(baseDir, entry[0])
+        print "Translating in {0}:".format(specDir)
+        sys.stdout.flush()
+        count += 1
+        if translate(prog_name, commonArgs + entry[1:], specDir) != 0:
+            failed.append(specDir)
+    print "Translated {0} spec(s), {1} failed.".format(count, len(failed))
+    for specDir in failed:
+        print "FAILED:", specDir
+    return 1 if failed else 0
+
+def serve(prog_name, socketPath, commonArgs):
+    """Serve translation requests on a Unix socket, one at a time.
+       Each request is a line of JSON with the client's working directory
+       and translator arguments: {"cwd": DIR, "args": [ARGS...]}.
+       The reply holds the exit status and the output of the translator:
+       {"status": N, "stdout": TEXT, "stderr": TEXT}.
+       The request {"shutdown": true} stops the server."""
+    if os.path.exists(socketPath):
+        # clean up after a server that didn't exit cleanly
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socketPath)
+            sys.exit("ERROR! A server is already listening on " + socketPath)
+        except socket.error:
+            os.remove(socketPath)
+        finally:
+            probe.close()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socketPath)
+    server.listen(16)
+    print "Serving translation requests on", socketPath
+    sys.stdout.flush()
+    try:
+        while True:
+            conn, _ = server.accept()
+            try:
+                stream = conn.makefile('rw')
+                try:
+                    request = json.loads(stream.readline())
+                except ValueError:
+                    continue
+                if request.get('shutdown'):
+                    stream.write(json.dumps({'status': 0}) + "\n")
+                    stream.flush()
+                    break
+                # capture the translator output for the reply
+                realStreams = sys.stdout, sys.stderr
+                sys.stdout, sys.stderr = StringIO(), StringIO()
+                try:
+                    args = commonArgs + [str(a) for a in request.get('args', [])]
+                    status = translate(prog_name, args, request.get('cwd', "."))
+                    reply = {'status': status, 'stdout': sys.stdout.getvalue(), 'stderr': sys.stderr.getvalue()}
+                finally:
+                    sys.stdout, sys.stderr = realStreams
+                stream.write(json.dumps(reply) + "\n")
+                stream.flush()
+            except socket.error as e:
+                print >>sys.stderr, "WARNING! Lost connection to client:", e
+            finally:
+                conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socketPath)
+    return 0
+
+def main(prog_name, argv):
+    # the batch and server modes are handled here; the rest of the args
+    # are passed on to the translator (for each spec being translated)
+    modeParser = argparse.ArgumentParser(prog=prog_name, add_help=False)
+    modeGroup = modeParser.add_mutually_exclusive_group()
+    modeGroup.add_argument("--batch")
+    modeGroup.add_argument("--serve")
+    mode, rest = modeParser.parse_known_args(argv)
+    if mode.batch:
+        return run_batch(prog_name, mode.batch, rest)
+    elif mode.serve:
+        return serve(prog_name, mode.serve, rest)
+    else:
+        UnifiedTranslator(prog_name, argv).run()
+        return 0
+
+
 ################################
 ## Invoke the translator
 ################################
 
-UnifiedTranslator("ucnc_t").write_files()
+if __name__ == '__main__':
+    sys.exit(main("ucnc_t", sys.argv[1:]))